@@ -0,0 +1,79 @@
+import os
+import re
+import statistics
+import time
+
+import duckdb
+import sqlglot
+
+# Times every sql_queries/*.sql analysis on an in-process DuckDB over the curated Parquet
+# written by bench_transforms. The Athena (Trino) dialect is transpiled with sqlglot;
+# intermediates are materialized first as tables named after their file, as the query
+# runner does with its CTAS step, and are timed like the analyses.
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sql_queries")
+INTERMEDIATE_DIR = "intermediates"
+# Same header the query runner reads its dependencies from
+DEPENDS_ON_PATTERN = re.compile(r"^--\s*depends_on:\s*(.+)$", re.MULTILINE)
+
+
+def load_queries(sql_dir=SQL_DIR):
+    """Return [(name, kind, sql, depends_on)], intermediates first, every query after its dependencies."""
+    queries = []
+    for kind, directory in (("intermediate", os.path.join(sql_dir, INTERMEDIATE_DIR)), ("analysis", sql_dir)):
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith(".sql"):
+                with open(os.path.join(directory, file_name)) as f:
+                    sql_text = f.read()
+                depends_on = [name.strip() for line in DEPENDS_ON_PATTERN.findall(sql_text)
+                              for name in line.split(",") if name.strip()]
+                queries.append((file_name[:-len(".sql")], kind, sql_text, depends_on))
+
+    ordered, placed = [], set()
+    while queries:
+        ready = [q for q in queries if all(d in placed for d in q[3])]
+        if not ready:
+            raise ValueError(f"Unresolved dependencies between: {', '.join(q[0] for q in queries)}")
+        for query in ready:
+            ordered.append(query)
+            placed.add(query[0])
+            queries.remove(query)
+    return ordered
+
+
+def register_curated(con, curated_dir):
+    # One view per curated table; hive partition directories become columns, as in the catalog
+    for table_name in sorted(os.listdir(curated_dir)):
+        table_dir = os.path.join(curated_dir, table_name)
+        if os.path.isdir(table_dir):
+            con.execute(f"CREATE OR REPLACE VIEW {table_name} AS "
+                        f"SELECT * FROM read_parquet('{table_dir}/**/*.parquet', hive_partitioning = true)")
+
+
+def transpile(sql_text):
+    return sqlglot.transpile(sql_text.strip().rstrip(";"), read="trino", write="duckdb")[0]
+
+
+def run(curated_dir, repeat=3, sql_dir=SQL_DIR):
+    """Run every query repeat times and return {name: {"seconds": median, "rows": n}}."""
+    con = duckdb.connect()
+    register_curated(con, curated_dir)
+    results = {}
+    for name, kind, sql_text, _ in load_queries(sql_dir):
+        statement = transpile(sql_text)
+        if kind == "intermediate":
+            statement = f"CREATE OR REPLACE TABLE {name} AS {statement}"
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = con.execute(statement)
+            rows = None if kind == "intermediate" else result.fetch_arrow_table().num_rows
+            timings.append(time.perf_counter() - started)
+        if kind == "intermediate":
+            rows = con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+        key = f"{INTERMEDIATE_DIR}/{name}" if kind == "intermediate" else name
+        results[key] = {"seconds": round(statistics.median(timings), 4), "rows": rows}
+    con.close()
+    return results
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from pyspark.sql import SparkSession
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "glue_jobs", "data_transformation"))
+
+from spark_transforms import (  # noqa: E402
+    ORDER_DATE_PARTITION_KEYS, DIM_APP_SCHEMA, transform_date_dim, parse_order_items, new_order_items,
+    options_for_order_items, unseen_app_names, number_new_apps, build_fact_orders, build_fact_items,
+    build_fact_item_options, build_fact_order_totals, build_agg_revenue_daily, build_agg_revenue_weekly,
+    build_agg_revenue_monthly,
+)
+
+# Times the transformation job's stages on a local SparkSession, as a first (full) run over
+# the synthetic landing tables. Each stage writes its table to curated_dir as Parquet, so
+# the timings include the same lazy plan the Glue job executes when it writes, and the
+# output doubles as the curated zone for bench_queries.
+
+# Curated tables and the partition columns they are written with
+CURATED_TABLES = {
+    "date_dim": [],
+    "dim_app": [],
+    "fact_orders": ORDER_DATE_PARTITION_KEYS,
+    "fact_items": ORDER_DATE_PARTITION_KEYS,
+    "fact_items_options": ORDER_DATE_PARTITION_KEYS,
+    "fact_order_totals": ORDER_DATE_PARTITION_KEYS,
+    "agg_revenue_daily": ORDER_DATE_PARTITION_KEYS,
+    "agg_revenue_weekly": ["week_start"],
+    "agg_revenue_monthly": ["month_start"],
+}
+
+
+def spark_session(shuffle_partitions=8):
+    return (SparkSession.builder
+            .master("local[*]")
+            .appName("data-transformation-benchmark")
+            .config("spark.sql.shuffle.partitions", str(shuffle_partitions))
+            .config("spark.sql.session.timeZone", "UTC")
+            .config("spark.ui.enabled", "false")
+            .getOrCreate())
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - started, 3)
+
+
+def write(df, curated_dir, table_name):
+    writer = df.write.mode("overwrite")
+    partition_keys = CURATED_TABLES[table_name]
+    if partition_keys:
+        writer = writer.partitionBy(*partition_keys)
+    writer.parquet(os.path.join(curated_dir, table_name))
+
+
+def run(spark, landing_dir, curated_dir):
+    """Run every transformation stage and return {stage: seconds}."""
+    timer = StageTimer()
+
+    def read(table_name):
+        return spark.read.parquet(os.path.join(landing_dir, table_name))
+
+    def curated(table_name):
+        return spark.read.parquet(os.path.join(curated_dir, table_name))
+
+    with timer.stage("dim_date"):
+        write(transform_date_dim(read("date_dim")), curated_dir, "date_dim")
+
+    with timer.stage("incremental_filter"):
+        order_item_df = new_order_items(parse_order_items(read("order_items")), None).cache()
+        order_item_df.agg({"creation_time_utc": "max"}).collect()
+
+    order_item_options_df = options_for_order_items(read("order_item_options"), order_item_df).cache()
+
+    with timer.stage("dim_app"):
+        existing_dim_app_df = spark.createDataFrame([], schema=DIM_APP_SCHEMA)
+        new_dim_app_df = number_new_apps(spark, unseen_app_names(order_item_df, existing_dim_app_df), 0)
+        dim_app_lookup_df = existing_dim_app_df.unionByName(new_dim_app_df)
+        write(new_dim_app_df, curated_dir, "dim_app")
+
+    fact_orders_df = build_fact_orders(order_item_df, dim_app_lookup_df)
+    fact_items_df = build_fact_items(order_item_df)
+    fact_item_options_df = build_fact_item_options(order_item_options_df)
+    with timer.stage("fact_orders"):
+        write(fact_orders_df, curated_dir, "fact_orders")
+    with timer.stage("fact_items"):
+        write(fact_items_df, curated_dir, "fact_items")
+    with timer.stage("fact_items_options"):
+        write(fact_item_options_df, curated_dir, "fact_items_options")
+    with timer.stage("fact_order_totals"):
+        write(build_fact_order_totals(fact_orders_df, fact_items_df, fact_item_options_df),
+              curated_dir, "fact_order_totals")
+
+    # The rollups read the written facts back, as the job reads them from the catalog
+    with timer.stage("agg_revenue_daily"):
+        write(build_agg_revenue_daily(curated("fact_orders"), curated("fact_items")), curated_dir, "agg_revenue_daily")
+    with timer.stage("agg_revenue_weekly"):
+        write(build_agg_revenue_weekly(curated("agg_revenue_daily")), curated_dir, "agg_revenue_weekly")
+    with timer.stage("agg_revenue_monthly"):
+        write(build_agg_revenue_monthly(curated("agg_revenue_daily")), curated_dir, "agg_revenue_monthly")
+
+    for cached_df in (order_item_df, order_item_options_df):
+        cached_df.unpersist()
+    return timer.stages
@@ -0,0 +1,147 @@
+"""Check that the Polars and Spark transformation engines write the same curated tables.
+
+Both engines transform the same seeded synthetic landing data: Spark through
+bench_transforms, Polars through polars_transforms in memory. Every curated table must
+have the same column types on both sides and is then compared row by row, ignoring row
+order. Doubles may differ in the last bits, because the engines sum in different orders.
+
+Parity covers rows and types, not the file layout. Both engines sort the clustered fact
+files by the same keys. Only data-transformation-job adds bloom filters on those keys and
+writes PARQUET_BLOCK_SIZE_MB row groups. The Polars job runs on a Python 3.9 pythonshell,
+whose pyarrow cannot write bloom filters, so it keeps min/max statistics and pyarrow's
+default row groups. Athena prunes a partition written by Polars on min/max only.
+
+    python benchmarks/parity.py --scale small
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import bench_transforms
+import synthetic_data
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "glue_jobs", "data_transformation"))
+
+import polars_transforms as pt  # noqa: E402
+
+RELATIVE_TOLERANCE = 1e-9
+# Partition columns are not stored in the files; Athena reads them with these catalog types
+PARTITION_TYPES = {"year": pa.int32(), "month": pa.int32(), "day": pa.int32(),
+                   "week_start": pa.date32(), "month_start": pa.date32()}
+
+
+def polars_tables(landing_dir):
+    """Run the Polars transforms as a first run of data-transformation-polars-job would."""
+    def read(table_name):
+        return pl.from_arrow(ds.dataset(os.path.join(landing_dir, table_name), format="parquet").to_table())
+
+    order_item_df = pt.new_order_items(pt.parse_order_items(read("order_items")), None)
+    order_item_options_df = pt.options_for_order_items(read("order_item_options"), order_item_df)
+    dim_app_df = pt.number_new_apps(pt.unseen_app_names(order_item_df, pl.DataFrame(schema=pt.DIM_APP_SCHEMA)), 0)
+
+    fact_orders_df = pt.build_fact_orders(order_item_df, dim_app_df)
+    fact_items_df = pt.build_fact_items(order_item_df)
+    fact_item_options_df = pt.build_fact_item_options(order_item_options_df)
+    agg_revenue_daily_df = pt.build_agg_revenue_daily(fact_orders_df, fact_items_df)
+    return {
+        "date_dim": pt.transform_date_dim(read("date_dim")),
+        "dim_app": dim_app_df,
+        "fact_orders": fact_orders_df,
+        "fact_items": fact_items_df,
+        "fact_items_options": fact_item_options_df,
+        "fact_order_totals": pt.build_fact_order_totals(fact_orders_df, fact_items_df, fact_item_options_df),
+        "agg_revenue_daily": agg_revenue_daily_df,
+        "agg_revenue_weekly": pt.build_agg_revenue_weekly(agg_revenue_daily_df),
+        "agg_revenue_monthly": pt.build_agg_revenue_monthly(agg_revenue_daily_df),
+    }
+
+
+def read_curated(curated_dir, table_name, files=None):
+    """A curated table as written, or only the given files of it (paths relative to the table)."""
+    partition_keys = bench_transforms.CURATED_TABLES[table_name]
+    table_dir = os.path.join(curated_dir, table_name)
+    # Spark writes INT96 timestamps; Spark timestamps have microsecond precision, so reading them
+    # as microseconds loses nothing
+    parquet_format = ds.ParquetFileFormat(read_options={"coerce_int96_timestamp_unit": "us"})
+    partitioning = ds.partitioning(pa.schema([(k, PARTITION_TYPES[k]) for k in partition_keys]), flavor="hive")
+    if files is None:
+        dataset = ds.dataset(table_dir, format=parquet_format, partitioning=partitioning)
+    else:
+        dataset = ds.dataset([os.path.join(table_dir, f) for f in files], format=parquet_format,
+                             partitioning=partitioning, partition_base_dir=table_dir)
+    return pl.from_arrow(dataset.to_table())
+
+
+def differences(spark_df, polars_df):
+    """Describe how spark_df differs from polars_df; an empty list means the tables match.
+
+    Column types are compared first and must match exactly: a type that drifts between the
+    engines changes what Athena reads, so it is reported rather than cast away.
+    """
+    if set(spark_df.columns) != set(polars_df.columns):
+        return [f"columns {sorted(spark_df.columns)} != {sorted(polars_df.columns)}"]
+    type_problems = [f"{column}: {spark_df.schema[column]} != {dtype}"
+                     for column, dtype in polars_df.schema.items() if spark_df.schema[column] != dtype]
+    if type_problems:
+        return type_problems
+    if spark_df.height != polars_df.height:
+        return [f"{spark_df.height} rows != {polars_df.height} rows"]
+
+    spark_df = spark_df.select(polars_df.columns)
+    keys = [c for c, dtype in polars_df.schema.items() if not dtype.is_float()]
+    spark_df = spark_df.sort(keys, nulls_last=True)
+    polars_df = polars_df.sort(keys, nulls_last=True)
+
+    problems = []
+    for column, dtype in polars_df.schema.items():
+        left, right = spark_df.get_column(column), polars_df.get_column(column)
+        if dtype.is_float():
+            scale = right.abs().clip(lower_bound=1.0)
+            mismatched = (((left - right).abs() / scale) > RELATIVE_TOLERANCE) | (left.is_null() != right.is_null())
+        else:
+            mismatched = ~left.eq_missing(right)
+        if mismatched.any():
+            problems.append(f"{column}: {mismatched.sum()} rows differ")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(synthetic_data.SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", help="where landing and curated data are written (default: a temp dir)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="gp-parity-") as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        landing_dir = os.path.join(work_dir, "landing")
+        curated_dir = os.path.join(work_dir, "curated")
+        synthetic_data.write_landing(synthetic_data.generate(synthetic_data.SCALES[args.scale], args.seed), landing_dir)
+
+        spark = bench_transforms.spark_session()
+        try:
+            spark_seconds = sum(bench_transforms.run(spark, landing_dir, curated_dir).values())
+        finally:
+            spark.stop()
+        started = time.perf_counter()
+        expected = polars_tables(landing_dir)
+        polars_seconds = time.perf_counter() - started
+
+        failed = False
+        for table_name, polars_df in expected.items():
+            problems = differences(read_curated(curated_dir, table_name), polars_df)
+            failed = failed or bool(problems)
+            print(f"{table_name:<22} {'OK' if not problems else 'MISMATCH: ' + '; '.join(problems)}")
+
+    print(f"Spark {spark_seconds:.2f}s (incl. writes), Polars {polars_seconds:.2f}s (in memory)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
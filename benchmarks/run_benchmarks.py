@@ -0,0 +1,156 @@
+"""Offline benchmark of the transformation job and the Athena analyses.
+
+Generates a seeded synthetic landing zone, runs the transformation stages on a local
+SparkSession and every sql_queries/*.sql on DuckDB, then appends the timings to a JSON
+history keyed by git commit and compares them with the last run at the same scale.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/run_benchmarks.py --scale small
+    python benchmarks/run_benchmarks.py --scale medium --orders-per-day 5000 --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from dataclasses import replace
+from datetime import datetime, timezone
+
+import duckdb
+import pyspark
+import sqlglot
+
+import bench_queries
+import bench_transforms
+import synthetic_data
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_PATH = os.path.join(BENCHMARK_DIR, "history.json")
+# Differences below this many seconds are noise on a laptop and never count as regressions
+MIN_DELTA_SECONDS = 0.05
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BENCHMARK_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    with open(path, "w") as f:
+        json.dump(history, f, indent=2)
+        f.write("\n")
+
+
+def timings(entry):
+    """Flatten an entry's timings to {"transforms/<stage>": s, "queries/<name>": s}."""
+    flat = {f"transforms/{stage}": seconds for stage, seconds in entry["transforms"].items()}
+    flat.update({f"queries/{name}": result["seconds"] for name, result in entry["queries"].items()})
+    return flat
+
+
+def compare(previous, current, tolerance):
+    """Return the (metric, before, after) that got slower than tolerance allows."""
+    before, after = timings(previous), timings(current)
+    return [
+        (metric, before[metric], seconds)
+        for metric, seconds in after.items()
+        if metric in before
+        and seconds - before[metric] > MIN_DELTA_SECONDS
+        and seconds > before[metric] * (1 + tolerance)
+    ]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(synthetic_data.SCALES), default="small")
+    # Overrides of individual scale fields
+    for field in ("users", "restaurants", "apps", "days", "orders_per_day", "items_per_order", "options_per_item"):
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field, type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query, the median is recorded")
+    parser.add_argument("--shuffle-partitions", type=int, default=8)
+    parser.add_argument("--work-dir", help="where landing and curated data are written (default: a temp dir)")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative slowdown against the previous run that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    overrides = {field: value for field, value in vars(args).items()
+                 if field in synthetic_data.Scale.__dataclass_fields__ and value is not None}
+    scale = replace(synthetic_data.SCALES[args.scale], **overrides)
+
+    with tempfile.TemporaryDirectory(prefix="gp-benchmark-") as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        landing_dir = os.path.join(work_dir, "landing")
+        curated_dir = os.path.join(work_dir, "curated")
+
+        print(f"Generating {args.scale} landing data (seed {args.seed}): {scale.as_dict()}")
+        row_counts = synthetic_data.write_landing(synthetic_data.generate(scale, args.seed), landing_dir)
+        print(f"Landing rows: {row_counts}")
+
+        spark = bench_transforms.spark_session(args.shuffle_partitions)
+        try:
+            transform_timings = bench_transforms.run(spark, landing_dir, curated_dir)
+        finally:
+            spark.stop()
+        query_results = bench_queries.run(curated_dir, repeat=args.repeat)
+
+    entry = {
+        "commit": git("rev-parse", "HEAD"),
+        # Uncommitted changes make the commit alone an unreliable label for the timings
+        "dirty": bool(git("status", "--porcelain")),
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "scale_name": args.scale,
+        "scale": scale.as_dict(),
+        "seed": args.seed,
+        "landing_rows": row_counts,
+        "environment": {
+            "python": platform.python_version(),
+            "pyspark": pyspark.__version__,
+            "duckdb": duckdb.__version__,
+            "sqlglot": sqlglot.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "transforms": transform_timings,
+        "queries": query_results,
+    }
+
+    for metric, seconds in timings(entry).items():
+        print(f"{metric:<55} {seconds:>9.3f}s")
+
+    history = load_history(args.history)
+    previous = next((e for e in reversed(history)
+                     if e["scale"] == entry["scale"] and e["seed"] == entry["seed"]), None)
+    history.append(entry)
+    save_history(args.history, history)
+    print(f"Recorded run of {entry['commit']} in {args.history}")
+
+    if previous is None:
+        print("No earlier run at this scale to compare with.")
+        return 0
+    regressions = compare(previous, entry, args.tolerance)
+    print(f"Compared with {previous['commit']} ({previous['recorded_at']}): "
+          f"{len(regressions)} regression(s) above {args.tolerance:.0%}")
+    for metric, before, after in regressions:
+        print(f"  {metric}: {before:.3f}s -> {after:.3f}s")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
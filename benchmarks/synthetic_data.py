@@ -0,0 +1,143 @@
+import os
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Seeded stand-in for the landing zone: order_items, order_item_options and date_dim with
+# the columns and string encodings the ingestion job lands from the source database.
+# The same seed and scale always produce the same rows, so timings are comparable
+# between commits.
+
+ITEM_CATEGORIES = ["Burgers", "Sides", "Drinks", "Desserts", "Salads", "Breakfast", "Kids Meals", "Sandwiches"]
+OPTIONS = [
+    ("Size", "Small"), ("Size", "Medium"), ("Size", "Large"),
+    ("Extras", "Cheese"), ("Extras", "Bacon"), ("Extras", "Avocado"), ("Extras", "Extra Sauce"),
+    ("Promotions", "Coupon"), ("Promotions", "Loyalty Reward"),
+]
+CURRENCIES = ["USD", "CAD"]
+# Fixed-date public holidays as (month, day)
+HOLIDAYS = {(1, 1), (7, 4), (11, 11), (12, 25), (12, 31)}
+
+
+@dataclass
+class Scale:
+    users: int = 2_000
+    restaurants: int = 20
+    apps: int = 5
+    days: int = 90
+    orders_per_day: int = 500
+    items_per_order: int = 4     # upper bound, each order gets 1..items_per_order line items
+    options_per_item: int = 2    # upper bound, each line item gets 0..options_per_item options
+    start_date: str = "2024-01-01"
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# Named presets for run_benchmarks --scale; individual fields can still be overridden
+SCALES = {
+    "small": Scale(),
+    "medium": Scale(users=20_000, restaurants=100, apps=8, days=365, orders_per_day=2_000),
+    "large": Scale(users=200_000, restaurants=500, apps=12, days=730, orders_per_day=10_000),
+}
+
+
+def order_items(scale, rng):
+    start = np.datetime64(scale.start_date, "ms")
+    num_orders = scale.days * scale.orders_per_day
+
+    # Order level attributes, repeated over each order's line items below
+    order_day = np.repeat(np.arange(scale.days), scale.orders_per_day)
+    created = start + (order_day * 86_400_000 + rng.integers(0, 86_400_000, num_orders)).astype("timedelta64[ms]")
+    user = rng.integers(0, scale.users, num_orders)
+    user_id = np.char.add("U", user.astype(str)).astype(object)
+    # Guest checkouts have no user; the transformation fills them in as UNKNOWN
+    user_id[rng.random(num_orders) < 0.02] = None
+    restaurant_id = np.char.add("R", rng.integers(0, scale.restaurants, num_orders).astype(str))
+    app_name = np.char.add("App ", rng.integers(1, scale.apps + 1, num_orders).astype(str))
+    is_loyalty = (user % 3) == 0
+    printed_card_number = np.where(is_loyalty, np.char.add("C", user.astype(str)), None)
+    currency = np.array(CURRENCIES)[(rng.random(num_orders) < 0.1).astype(int)]
+
+    items = rng.integers(1, scale.items_per_order + 1, num_orders)
+    order_index = np.repeat(np.arange(num_orders), items)
+    num_items = len(order_index)
+    category = rng.integers(0, len(ITEM_CATEGORIES), num_items)
+    categories = np.array(ITEM_CATEGORIES)
+
+    return pa.table({
+        "order_id": pa.array(order_index, pa.int64()),
+        "lineitem_id": pa.array(np.arange(num_items), pa.int64()),
+        "app_name": pa.array(app_name[order_index]),
+        "restaurant_id": pa.array(restaurant_id[order_index]),
+        "user_id": pa.array(user_id[order_index], pa.string()),
+        "printed_card_number": pa.array(printed_card_number[order_index], pa.string()),
+        "is_loyalty": pa.array(is_loyalty[order_index]),
+        # ISO 8601 strings, parsed to timestamps by the transformation
+        "creation_time_utc": pa.array(np.char.add(np.datetime_as_string(created[order_index], unit="ms"), "Z")),
+        "currency": pa.array(currency[order_index]),
+        "item_category": pa.array(categories[category]),
+        "item_name": pa.array(np.char.add(np.char.add(categories[category], " #"),
+                                          rng.integers(1, 11, num_items).astype(str))),
+        "item_quantity": pa.array(rng.integers(1, 4, num_items), pa.int32()),
+        "item_price": pa.array(np.round(rng.uniform(1.5, 25.0, num_items), 2)),
+    })
+
+
+def order_item_options(scale, items, rng):
+    options = rng.integers(0, scale.options_per_item + 1, items.num_rows)
+    item_index = np.repeat(np.arange(items.num_rows), options)
+    num_options = len(item_index)
+
+    option = rng.integers(0, len(OPTIONS), num_options)
+    groups = np.array([group for group, _ in OPTIONS])[option]
+    names = np.array([name for _, name in OPTIONS])[option]
+    price = np.round(rng.uniform(0.0, 3.0, num_options), 2)
+    # Promotions are the discounts: negative option prices
+    price = np.where(groups == "Promotions", -np.round(rng.uniform(0.5, 5.0, num_options), 2), price)
+
+    return pa.table({
+        "order_id": items.column("order_id").take(item_index),
+        "lineitem_id": items.column("lineitem_id").take(item_index),
+        "option_group_name": pa.array(groups),
+        "option_name": pa.array(names),
+        "option_quantity": pa.array(rng.integers(1, 3, num_options), pa.int32()),
+        "option_price": pa.array(price),
+    })
+
+
+def date_dim(scale):
+    start = date.fromisoformat(scale.start_date)
+    days = [start + timedelta(days=offset) for offset in range(scale.days)]
+    return pa.table({
+        # dd-MM-yyyy strings and a string year, as landed from the source
+        "date_key": [d.strftime("%d-%m-%Y") for d in days],
+        "day_name": [d.strftime("%A") for d in days],
+        "week": [d.isocalendar()[1] for d in days],
+        "month": [d.month for d in days],
+        "year": [str(d.year) for d in days],
+        "is_weekend": [d.weekday() >= 5 for d in days],
+        "is_holiday": [(d.month, d.day) in HOLIDAYS for d in days],
+    })
+
+
+def generate(scale, seed=42):
+    """Return the three landing tables as pyarrow Tables."""
+    rng = np.random.default_rng(seed)
+    items = order_items(scale, rng)
+    return {
+        "date_dim": date_dim(scale),
+        "order_items": items,
+        "order_item_options": order_item_options(scale, items, rng),
+    }
+
+
+def write_landing(tables, landing_dir):
+    """Write each table as Parquet under landing_dir/<table>/ and return the row counts."""
+    for table_name, table in tables.items():
+        os.makedirs(os.path.join(landing_dir, table_name), exist_ok=True)
+        pq.write_table(table, os.path.join(landing_dir, table_name, "part-00000.parquet"))
+    return {table_name: table.num_rows for table_name, table in tables.items()}
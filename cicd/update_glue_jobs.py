@@ -9,6 +9,8 @@ glue = boto3.client("glue")
 with open("glue_jobs/glue_job_configs/jobs.json") as f:
     jobs = json.load(f)
 
+# Workers and Spark settings of the sized jobs are chosen per run by
+# glue_jobs/data_transformation/glue_job_sizing.py; the definitions keep the jobs.json values
 for job in jobs:
     try:
         # Check if the job already exists
@@ -34,6 +36,9 @@ for job in jobs:
         # Add Python version if it's a Python shell job
         if job["Type"] == "pythonshell":
             job_update["Command"]["PythonVersion"] = job.get("PythonVersion", "3.9")
+            # 0.0625 (the default) or 1 DPU
+            if "MaxCapacity" in job:
+                job_update["MaxCapacity"] = job["MaxCapacity"]
 
         # Update the job
         glue.update_job(JobName=job["Name"], JobUpdate=job_update)
@@ -60,6 +65,8 @@ for job in jobs:
 
             if job["Type"] == "pythonshell":
                 create_args["Command"]["PythonVersion"] = job.get("PythonVersion", "3.9")
+                if "MaxCapacity" in job:
+                    create_args["MaxCapacity"] = job["MaxCapacity"]
 
             glue.create_job(**create_args)
             print(f"Created Glue job: {job['Name']}")
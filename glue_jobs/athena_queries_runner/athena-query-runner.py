@@ -1,45 +1,659 @@
 import boto3, time
+import hashlib
+import json
 import os
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from botocore.exceptions import ClientError
 
 athena = boto3.client("athena")
 s3 = boto3.client("s3")
+glue = boto3.client("glue")
 
 DATABASE = "curated_zone_db"
 OUTPUT = "s3://global-partners-de-project2/athena-query-results/"
 QUERY_BUCKET = "global-partners-de-project2"
+RESULTS_PREFIX = "athena-query-results/"
+# Written after each successful run; the dashboards resolve their data from it
+MANIFEST_NAME = "latest.json"
 QUERY_PREFIX = "athena-sql-scripts/"
+# Shared CTAS tables, built once per run before the analyses that declare them
+INTERMEDIATE_PREFIX = f"{QUERY_PREFIX}intermediates/"
+INTERMEDIATE_OUTPUT = "s3://global-partners-de-project2/athena-intermediates/"
 
-def run_query(query, output_folder):
-    response = athena.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={'Database': DATABASE},
-        ResultConfiguration={'OutputLocation': output_folder}
-    )
-    qid = response['QueryExecutionId']
+DEPENDS_ON_PATTERN = re.compile(r"^--\s*depends_on:\s*(.+)$", re.MULTILINE)
+# Results of analyses whose SQL and input tables are unchanged are reused from this file
+CACHE_KEY = "athena-query-cache/cache.json"
+# Queries reading the clock give a different answer every day even on unchanged tables
+CLOCK_PATTERN = re.compile(r"\b(current_date|current_timestamp|now\s*\()", re.IGNORECASE)
+# Append-only execution statistics, one Parquet file per run under run_date=YYYY-MM-DD/
+METRICS_PREFIX = "athena-metrics/"
+
+
+def get_job_arg(name, default):
+    # Glue passes job arguments as "--NAME value" pairs
+    flag = f"--{name}"
+    if flag in sys.argv and sys.argv.index(flag) + 1 < len(sys.argv):
+        return sys.argv[sys.argv.index(flag) + 1]
+    return default
+
+
+# 1 keeps the historical one-query-at-a-time behaviour
+MAX_CONCURRENT_QUERIES = int(get_job_arg("MAX_CONCURRENT_QUERIES", "1"))
+POLL_MIN_SECONDS = float(get_job_arg("POLL_MIN_SECONDS", "0.5"))
+POLL_MAX_SECONDS = float(get_job_arg("POLL_MAX_SECONDS", "8"))
+# "drop" removes the intermediate tables and their data after the run, "keep" leaves them
+# queryable until the next run replaces them
+INTERMEDIATE_RETENTION = get_job_arg("INTERMEDIATE_RETENTION", "drop")
+# "disabled" re-runs every analysis regardless of the cache
+RESULT_CACHE = get_job_arg("RESULT_CACHE", "enabled")
+# "parquet" UNLOADs each analysis as typed, Snappy-compressed Parquet under
+# <name>/parquet/<run_id>/ instead of the <qid>.csv Athena writes by default
+RESULT_FORMAT = get_job_arg("RESULT_FORMAT", "csv")
+# Superseded results are kept this long so dashboards that read the previous manifest can finish
+RESULT_RETENTION_HOURS = float(get_job_arg("RESULT_RETENTION_HOURS", "24"))
+
+TERMINAL_STATES = ("SUCCEEDED", "FAILED", "CANCELLED")
+# batch_get_query_execution accepts at most 50 ids per call
+BATCH_SIZE = 50
+
+
+@dataclass
+class QueryTask:
+    name: str
+    sql: str
+    output_folder: str
+    kind: str = "analysis"
+    depends_on: list = field(default_factory=list)
+    query_execution_id: str = None
+    state: str = "PENDING"
+    reason: str = ""
+    submitted_at: float = None
+    finished_at: float = None
+    statistics: dict = field(default_factory=dict)
+    cache_key: str = None
+    cache_hit: bool = False
+    result_location: str = None
+    sql_file: str = None
+    sql_hash: str = None
+    row_count: int = None
+
+    @property
+    def elapsed_seconds(self):
+        if self.submitted_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.submitted_at
+
+
+def start_query(task, athena_client, clock=time.monotonic, sleep=time.sleep):
+    """Submit one query, backing off while Athena throttles new submissions."""
+    delay = POLL_MIN_SECONDS
     while True:
-        status = athena.get_query_execution(QueryExecutionId=qid)
-        state = status['QueryExecution']['Status']['State']
-        if state in ["SUCCEEDED", "FAILED", "CANCELLED"]:
+        try:
+            response = athena_client.start_query_execution(
+                QueryString=task.sql,
+                QueryExecutionContext={'Database': DATABASE},
+                ResultConfiguration={'OutputLocation': task.output_folder}
+            )
             break
-        time.sleep(2)
-    return qid, state
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TooManyRequestsException":
+                task.state, task.reason = "FAILED", str(e)
+                task.finished_at = clock()
+                return False
+            sleep(delay)
+            delay = min(delay * 2, POLL_MAX_SECONDS)
+    task.query_execution_id = response['QueryExecutionId']
+    task.state = "QUEUED"
+    task.submitted_at = clock()
+    return True
+
+
+def topological_order(tasks):
+    """Order tasks so every task follows its dependencies, keeping the input order otherwise."""
+    by_name = {task.name: task for task in tasks}
+    for task in tasks:
+        missing = [d for d in task.depends_on if d not in by_name]
+        if missing:
+            raise ValueError(f"{task.name} depends on unknown queries: {', '.join(missing)}")
+
+    ordered, placed = [], set()
+    remaining = list(tasks)
+    while remaining:
+        ready = [t for t in remaining if all(d in placed for d in t.depends_on)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between: {', '.join(t.name for t in remaining)}")
+        for task in ready:
+            ordered.append(task)
+            placed.add(task.name)
+            remaining.remove(task)
+    return ordered
+
+
+def run_queries(tasks, max_concurrent=None, athena_client=None, clock=time.monotonic, sleep=time.sleep):
+    """Run tasks in dependency order with at most max_concurrent queries in flight.
+
+    A task starts once everything it depends on has succeeded; independent tasks run in
+    parallel, and tasks downstream of a failure are skipped. All in-flight executions are
+    polled together through batch_get_query_execution. The poll interval doubles while
+    nothing changes and drops back to the minimum whenever a query finishes. The client,
+    clock and sleep are injectable so the scheduler can run against a fake Athena client
+    offline.
+    """
+    athena_client = athena_client or athena
+    max_concurrent = max(1, max_concurrent or MAX_CONCURRENT_QUERIES)
+    by_name = {task.name: task for task in tasks}
+    pending = topological_order(tasks)
+    in_flight = {}
+    delay = POLL_MIN_SECONDS
+
+    while pending or in_flight:
+        for task in list(pending):
+            failed = [d for d in task.depends_on if by_name[d].state in ("FAILED", "CANCELLED", "SKIPPED")]
+            if failed:
+                task.state = "SKIPPED"
+                task.reason = f"dependency {failed[0]} {by_name[failed[0]].state.lower()}"
+                pending.remove(task)
+
+        ready = [t for t in pending if all(by_name[d].state == "SUCCEEDED" for d in t.depends_on)]
+        for task in ready[:max(0, max_concurrent - len(in_flight))]:
+            pending.remove(task)
+            if start_query(task, athena_client, clock, sleep):
+                in_flight[task.query_execution_id] = task
+
+        if not in_flight:
+            # Either everything left was just skipped or a start failed; re-evaluate
+            continue
+
+        sleep(delay)
+        finished = 0
+        execution_ids = list(in_flight)
+        for start in range(0, len(execution_ids), BATCH_SIZE):
+            response = athena_client.batch_get_query_execution(
+                QueryExecutionIds=execution_ids[start:start + BATCH_SIZE]
+            )
+            for execution in response.get("QueryExecutions", []):
+                task = in_flight.get(execution["QueryExecutionId"])
+                status = execution["Status"]
+                task.state = status["State"]
+                if task.state in TERMINAL_STATES:
+                    task.reason = status.get("StateChangeReason", "")
+                    task.statistics = execution.get("Statistics", {})
+                    task.finished_at = clock()
+                    del in_flight[task.query_execution_id]
+                    finished += 1
+        delay = POLL_MIN_SECONDS if finished else min(delay * 2, POLL_MAX_SECONDS)
+
+    return tasks
+
+
+def run_query(query, output_folder):
+    task = QueryTask(name=output_folder, sql=query, output_folder=output_folder)
+    run_queries([task], max_concurrent=1)
+    return task.query_execution_id, task.state
+
+
+def print_summary(tasks, wall_seconds, max_concurrent=None):
+    print("Query summary:")
+    print(f"{'query':<40} {'state':<10} {'seconds':>8}  execution id")
+    for task in tasks:
+        elapsed = f"{task.elapsed_seconds:.1f}" if task.elapsed_seconds is not None else "-"
+        state = "CACHED" if task.cache_hit else task.state
+        print(f"{task.name:<40} {state:<10} {elapsed:>8}  {task.query_execution_id or '-'}")
+        if task.state != "SUCCEEDED" and task.reason:
+            print(f"    reason: {task.reason}")
+    total_query_seconds = sum(t.elapsed_seconds or 0 for t in tasks)
+    succeeded = sum(t.state == "SUCCEEDED" for t in tasks)
+    print(f"{succeeded}/{len(tasks)} succeeded in {wall_seconds:.1f}s wall time "
+          f"({total_query_seconds:.1f}s of summed query time, max {max_concurrent or MAX_CONCURRENT_QUERIES} in flight)")
+
+
+def parse_depends_on(sql_text):
+    """Names listed in "-- depends_on: a, b" header lines."""
+    return [name.strip() for line in DEPENDS_ON_PATTERN.findall(sql_text) for name in line.split(",") if name.strip()]
+
+
+def ctas_statement(task, run_id):
+    """Wrap an intermediate's SELECT in a Parquet CTAS named after the file."""
+    select = task.sql.strip().rstrip(";")
+    return (f"CREATE TABLE {task.name}\n"
+            f"WITH (format = 'PARQUET', write_compression = 'SNAPPY', "
+            f"external_location = '{INTERMEDIATE_OUTPUT}{run_id}/{task.name}/')\n"
+            f"AS\n{select}")
+
+
+def unload_statement(task, location):
+    """Wrap an analysis in an UNLOAD writing Parquet data files to location."""
+    select = task.sql.strip().rstrip(";")
+    return (f"UNLOAD (\n{select}\n)\n"
+            f"TO '{location}'\n"
+            f"WITH (format = 'PARQUET', compression = 'SNAPPY')")
+
+
+def delete_prefix(bucket, prefix):
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+        if keys:
+            s3.delete_objects(Bucket=bucket, Delete={"Objects": keys, "Quiet": True})
+
+
+def drop_intermediates(names, run_id=None):
+    """Drop the intermediate tables and delete their CTAS data, of run_id or of every run."""
+    drops = [QueryTask(name=f"drop {name}", sql=f"DROP TABLE IF EXISTS {name}",
+                       output_folder=f"{OUTPUT}intermediates/{name}/")
+             for name in names]
+    run_queries(drops)
+    failed = [t for t in drops if t.state != "SUCCEEDED"]
+    if failed:
+        raise RuntimeError(f"Could not drop intermediates: {', '.join(t.name for t in failed)}")
+
+    data_bucket, data_prefix = INTERMEDIATE_OUTPUT.replace("s3://", "").split("/", 1)
+    if run_id is None:
+        # Also clears the data of runs that failed before their own drop
+        paginator = s3.get_paginator("list_objects_v2")
+        run_prefixes = [p["Prefix"] for page in paginator.paginate(Bucket=data_bucket, Prefix=data_prefix, Delimiter="/")
+                        for p in page.get("CommonPrefixes", [])]
+    else:
+        run_prefixes = [f"{data_prefix}{run_id}/"]
+    for run_prefix in run_prefixes:
+        for name in names:
+            delete_prefix(data_bucket, f"{run_prefix}{name}/")
+
+
+# --------------------------
+# Result cache
+# --------------------------
+def load_cache():
+    try:
+        return json.loads(s3.get_object(Bucket=QUERY_BUCKET, Key=CACHE_KEY)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return {}
+
+
+def save_cache(cache):
+    s3.put_object(Bucket=QUERY_BUCKET, Key=CACHE_KEY, Body=json.dumps(cache, indent=2))
+
+
+def catalog_tables():
+    """Name -> root location of every table in the curated database."""
+    paginator = glue.get_paginator("get_tables")
+    return {
+        table["Name"]: table["StorageDescriptor"]["Location"]
+        for page in paginator.paginate(DatabaseName=DATABASE)
+        for table in page["TableList"]
+        # Views have no storage of their own
+        if table.get("StorageDescriptor", {}).get("Location")
+    }
+
+
+def table_marker(name, location):
+    """Version marker for a curated table: its partition locations plus a listing of its root prefix.
+
+    Appends land under the root prefix and change the listing; compaction relocates whole
+    partitions and changes the partition locations.
+    """
+    digest = hashlib.sha256()
+    paginator = glue.get_paginator("get_partitions")
+    partitions = sorted(
+        (partition["Values"], partition["StorageDescriptor"]["Location"])
+        for page in paginator.paginate(DatabaseName=DATABASE, TableName=name)
+        for partition in page["Partitions"]
+    )
+    for values, partition_location in partitions:
+        digest.update(f"{'/'.join(values)}={partition_location}\n".encode())
+    bucket, prefix = location.replace("s3://", "").split("/", 1)
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix.rstrip("/") + "/"):
+        for obj in page.get("Contents", []):
+            digest.update(f"{obj['Key']}:{obj['Size']}:{obj['ETag']}\n".encode())
+    return digest.hexdigest()
+
+
+def referenced_tables(task, by_name, tables):
+    """Curated tables a task reads, directly or through the intermediates it depends on."""
+    sql = re.sub(r"--.*$", "", task.sql, flags=re.MULTILINE)
+    names = {t for t in tables if t not in by_name and re.search(rf"\b{re.escape(t)}\b", sql, re.IGNORECASE)}
+    for dependency in task.depends_on:
+        names |= referenced_tables(by_name[dependency], by_name, tables)
+    return names
+
+
+def reads_clock(task, by_name):
+    return bool(CLOCK_PATTERN.search(task.sql)) or any(reads_clock(by_name[d], by_name) for d in task.depends_on)
+
+
+def apply_cache(tasks, cache):
+    """Mark analyses whose key matches a cached result as done; return the tasks still to run.
+
+    The key hashes the SQL of the analysis and of every intermediate it depends on, the
+    marker of each curated table those read and, for queries using the clock, today's date.
+    Intermediates are only kept when a cache miss still needs them.
+    """
+    by_name = {task.name: task for task in tasks}
+    tables = catalog_tables()
+    markers = {}
+    today = datetime.now(timezone.utc).date().isoformat()
+
+    def dependency_sql(task):
+        return [task.sql] + [sql for d in task.depends_on for sql in dependency_sql(by_name[d])]
+
+    misses = []
+    for task in tasks:
+        if task.kind != "analysis":
+            continue
+        inputs = sorted(referenced_tables(task, by_name, tables))
+        for table in inputs:
+            if table not in markers:
+                markers[table] = table_marker(table, tables[table])
+        key_source = {
+            "sql": dependency_sql(task),
+            "tables": {table: markers[table] for table in inputs},
+            "date": today if reads_clock(task, by_name) else None,
+            "format": RESULT_FORMAT,
+        }
+        task.cache_key = hashlib.sha256(json.dumps(key_source, sort_keys=True).encode()).hexdigest()
+
+        entry = cache.get(task.name)
+        hit = entry is not None and entry["key"] == task.cache_key and result_exists(entry["result_location"])
+        if hit:
+            task.query_execution_id = entry["query_execution_id"]
+            task.result_location = entry["result_location"]
+            task.state = "SUCCEEDED"
+            task.cache_hit = True
+            print(f"Cache hit: {task.name} reuses {task.query_execution_id} (inputs: {', '.join(inputs) or 'none'})")
+        else:
+            misses.append(task)
+            reason = "no cached result" if entry is None else "inputs or SQL changed"
+            print(f"Cache miss: {task.name} ({reason})")
+
+    needed = set()
+
+    def require(task):
+        for dependency in task.depends_on:
+            if dependency not in needed:
+                needed.add(dependency)
+                require(by_name[dependency])
+
+    for task in misses:
+        require(task)
+    return [t for t in tasks if t in misses or t.name in needed]
+
+
+def result_exists(result_location):
+    bucket, key = result_location.replace("s3://", "").split("/", 1)
+    if not key.endswith("/"):
+        try:
+            s3.head_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+    # UNLOAD results are a prefix of data files
+    return s3.list_objects_v2(Bucket=bucket, Prefix=key, MaxKeys=1).get("KeyCount", 0) > 0
+
+
+def update_cache(cache, tasks):
+    for task in tasks:
+        if task.kind == "analysis" and task.state == "SUCCEEDED" and not task.cache_hit:
+            cache[task.name] = {
+                "key": task.cache_key,
+                "query_execution_id": task.query_execution_id,
+                "result_location": task.result_location,
+                "data_scanned_bytes": task.statistics.get("DataScannedInBytes", 0),
+                "cached_at": datetime.now(timezone.utc).isoformat(),
+            }
+
+
+# --------------------------
+# Result manifests
+# --------------------------
+def list_keys(bucket, prefix):
+    paginator = s3.get_paginator("list_objects_v2")
+    return [obj for page in paginator.paginate(Bucket=bucket, Prefix=prefix) for obj in page.get("Contents", [])]
+
+
+def result_manifest(task):
+    """Describe a finished analysis: where its data files are, how many rows and which columns."""
+    bucket, key = task.result_location.replace("s3://", "").split("/", 1)
+    if key.endswith("/"):
+        # Parquet footers carry the row counts and schema; pyarrow comes with the analytics library set
+        import pyarrow.parquet as pq
+        from pyarrow import fs
+
+        s3_fs = fs.S3FileSystem(region=s3.meta.region_name)
+        keys = [obj["Key"] for obj in list_keys(bucket, key)]
+        footers = []
+        for data_key in keys:
+            with s3_fs.open_input_file(f"{bucket}/{data_key}") as f:
+                footers.append(pq.read_metadata(f))
+        row_count = sum(footer.num_rows for footer in footers)
+        schema = [{"name": field.name, "type": str(field.type)} for field in footers[0].schema.to_arrow_schema()] if footers else []
+        result_format = "parquet"
+    else:
+        keys = [key]
+        columns = athena.get_query_results(QueryExecutionId=task.query_execution_id, MaxResults=1)["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+        schema = [{"name": c["Name"], "type": c["Type"]} for c in columns]
+        # None when Athena kept no runtime statistics for the execution
+        row_count = output_rows(task)
+        result_format = "csv"
+    return {
+        "query_execution_id": task.query_execution_id,
+        "format": result_format,
+        "bucket": bucket,
+        "keys": keys,
+        "row_count": row_count,
+        "schema": schema,
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def publish_manifest(task):
+    """Point <name>/latest.json at the task's result; a single PUT, so readers never see a partial manifest."""
+    manifest_key = f"{RESULTS_PREFIX}{task.name}/{MANIFEST_NAME}"
+    try:
+        current = json.loads(s3.get_object(Bucket=QUERY_BUCKET, Key=manifest_key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        current = None
+    if current and current["query_execution_id"] == task.query_execution_id:
+        # Cache hit on a result that is already published
+        return current
+    manifest = result_manifest(task)
+    s3.put_object(Bucket=QUERY_BUCKET, Key=manifest_key, Body=json.dumps(manifest, indent=2),
+                  ContentType="application/json")
+    return manifest
+
+
+def sweep_results(prefix, keep, cutoff):
+    """Delete objects under prefix older than cutoff, except the keys matched by keep."""
+    stale = [obj["Key"] for obj in list_keys(QUERY_BUCKET, prefix)
+             if obj["LastModified"] < cutoff and not keep(obj["Key"])]
+    for start in range(0, len(stale), 1000):
+        s3.delete_objects(Bucket=QUERY_BUCKET,
+                          Delete={"Objects": [{"Key": k} for k in stale[start:start + 1000]], "Quiet": True})
+    return len(stale)
+
+
+def publish_results(tasks):
+    """Publish a manifest for every successful analysis and prune the results it supersedes."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=RESULT_RETENTION_HOURS)
+    for task in tasks:
+        if task.kind != "analysis" or task.state != "SUCCEEDED":
+            continue
+        manifest = publish_manifest(task)
+        task.row_count = manifest["row_count"]
+        current = set(manifest["keys"])
+        qid = manifest["query_execution_id"]
+        removed = sweep_results(
+            f"{RESULTS_PREFIX}{task.name}/",
+            # Keeps the manifest, the data it points at and Athena's metadata files for that execution
+            lambda key: key in current or key.endswith(f"/{MANIFEST_NAME}") or qid in key,
+            cutoff,
+        )
+        print(f"Published {task.name}: {manifest['row_count']} rows in {len(manifest['keys'])} file(s), "
+              f"swept {removed} superseded object(s)")
+    # CTAS and DROP metadata of intermediates is never read back
+    sweep_results(f"{RESULTS_PREFIX}intermediates/", lambda key: False, cutoff)
+
+
+# --------------------------
+# Telemetry
+# --------------------------
+def output_rows(task):
+    """Rows written by a finished execution, from Athena's runtime statistics."""
+    try:
+        return athena.get_query_runtime_statistics(
+            QueryExecutionId=task.query_execution_id
+        )["QueryRuntimeStatistics"]["Rows"]["OutputRows"]
+    except (ClientError, KeyError):
+        # Statistics are not kept for every statement type and expire after a while
+        return None
+
+
+def metrics_records(tasks, run_id, recorded_at):
+    """One record per execution started in this run; cache hits start none."""
+    records = []
+    for task in tasks:
+        if not task.query_execution_id:
+            continue
+        stats = task.statistics
+        row_count = task.row_count
+        if row_count is None and task.state == "SUCCEEDED":
+            row_count = output_rows(task)
+        records.append({
+            "run_id": run_id,
+            "recorded_at": recorded_at,
+            "query_name": task.name,
+            "kind": task.kind,
+            "sql_file": task.sql_file,
+            "sql_hash": task.sql_hash,
+            "query_execution_id": task.query_execution_id,
+            "state": task.state,
+            "result_format": RESULT_FORMAT if task.kind == "analysis" else "ctas",
+            "data_scanned_bytes": stats.get("DataScannedInBytes"),
+            "engine_execution_ms": stats.get("EngineExecutionTimeInMillis"),
+            "queue_ms": stats.get("QueryQueueTimeInMillis"),
+            "planning_ms": stats.get("QueryPlanningTimeInMillis"),
+            "service_processing_ms": stats.get("ServiceProcessingTimeInMillis"),
+            "total_execution_ms": stats.get("TotalExecutionTimeInMillis"),
+            "reused_previous_result": stats.get("ResultReuseInformation", {}).get("ReusedPreviousResult"),
+            "row_count": row_count,
+        })
+    return records
+
+
+def write_metrics(tasks, run_id):
+    """Append this run's execution statistics as a new Parquet file; earlier files are never rewritten."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import fs
+
+    recorded_at = datetime.now(timezone.utc)
+    records = metrics_records(tasks, run_id, recorded_at)
+    if not records:
+        return None
+    schema = pa.schema([
+        ("run_id", pa.string()),
+        ("recorded_at", pa.timestamp("ms", tz="UTC")),
+        ("query_name", pa.string()),
+        ("kind", pa.string()),
+        ("sql_file", pa.string()),
+        ("sql_hash", pa.string()),
+        ("query_execution_id", pa.string()),
+        ("state", pa.string()),
+        ("result_format", pa.string()),
+        ("data_scanned_bytes", pa.int64()),
+        ("engine_execution_ms", pa.int64()),
+        ("queue_ms", pa.int64()),
+        ("planning_ms", pa.int64()),
+        ("service_processing_ms", pa.int64()),
+        ("total_execution_ms", pa.int64()),
+        ("reused_previous_result", pa.bool_()),
+        ("row_count", pa.int64()),
+    ])
+    key = f"{METRICS_PREFIX}run_date={recorded_at.date().isoformat()}/{run_id}.parquet"
+    pq.write_table(pa.Table.from_pylist(records, schema=schema), f"{QUERY_BUCKET}/{key}",
+                   filesystem=fs.S3FileSystem(region=s3.meta.region_name))
+    return key
+
+
+def load_query_tasks():
+    # Read all SQL files from S3; files under intermediates/ become shared CTAS tables
+    tasks = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=QUERY_BUCKET, Prefix=QUERY_PREFIX):
+        for f in page.get("Contents", []):
+            if f["Key"].endswith(".sql"):
+                print(f"File being processed: {f['Key']}")
+                sql_text = s3.get_object(Bucket=QUERY_BUCKET, Key=f["Key"])["Body"].read().decode("utf-8")
+
+                # Create a unique folder per SQL file
+                filename = os.path.basename(f["Key"]).replace(".sql","")
+                kind = "intermediate" if f["Key"].startswith(INTERMEDIATE_PREFIX) else "analysis"
+                output_folder = f"{OUTPUT}intermediates/{filename}/" if kind == "intermediate" else f"{OUTPUT}{filename}/"
+
+                print(f"SQL Text: {sql_text}")
+                tasks.append(QueryTask(name=filename, sql=sql_text, output_folder=output_folder,
+                                       kind=kind, depends_on=parse_depends_on(sql_text), sql_file=f["Key"],
+                                       # Hash of the file as written, before any CTAS or UNLOAD wrapping
+                                       sql_hash=hashlib.sha256(sql_text.encode("utf-8")).hexdigest()))
+    return tasks
+
 
 def main():
-    # Read all SQL files from S3
-    files = s3.list_objects_v2(Bucket=QUERY_BUCKET, Prefix=QUERY_PREFIX)
-    for f in files.get("Contents", []):
-        if f["Key"].endswith(".sql"):
-            print(f"File being processed: {f['Key']}")
-            sql_text = s3.get_object(Bucket=QUERY_BUCKET, Key=f["Key"])["Body"].read().decode("utf-8")
-
-            # Create a unique folder per SQL file
-            filename = os.path.basename(f["Key"]).replace(".sql","")
-            output_folder = f"{OUTPUT}{filename}/"
-
-            print(f"SQL Text: {sql_text}")
-            qid, state = run_query(sql_text, output_folder)
-            print(f"Query ran with status: {state}, id: {qid}")
-            print(f"{f['Key']} → {state}, results at {output_folder}{qid}.csv")
+    tasks = load_query_tasks()
+    # Fail on unknown dependencies or cycles before anything is dropped or started
+    topological_order(tasks)
+
+    cache = load_cache() if RESULT_CACHE == "enabled" else {}
+    to_run = apply_cache(tasks, cache) if RESULT_CACHE == "enabled" else tasks
+    hits = [t for t in tasks if t.cache_hit]
+    if RESULT_CACHE == "enabled":
+        saved = sum(cache[t.name].get("data_scanned_bytes", 0) for t in hits)
+        print(f"Result cache: {len(hits)} hits, {sum(t.kind == 'analysis' for t in to_run)} misses, "
+              f"~{saved / 1024 ** 2:.1f} MiB of scanning avoided")
+
+    run_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    # Only the intermediates a cache miss needs are rebuilt; the others are left as they are
+    intermediates = [t.name for t in to_run if t.kind == "intermediate"]
+    if intermediates:
+        # Clears tables kept by the previous run, or left behind by a failed one
+        drop_intermediates(intermediates)
+        for task in to_run:
+            if task.kind == "intermediate":
+                task.sql = ctas_statement(task, run_id)
+    if RESULT_FORMAT == "parquet":
+        for task in to_run:
+            if task.kind == "analysis":
+                task.result_location = f"{task.output_folder}parquet/{run_id}/"
+                task.sql = unload_statement(task, task.result_location)
+
+    started = time.monotonic()
+    try:
+        run_queries(to_run)
+    finally:
+        if RESULT_FORMAT != "parquet":
+            for task in to_run:
+                if task.kind == "analysis" and task.query_execution_id:
+                    task.result_location = f"{task.output_folder}{task.query_execution_id}.csv"
+        if intermediates and INTERMEDIATE_RETENTION == "drop":
+            drop_intermediates(intermediates, run_id)
+        if RESULT_CACHE == "enabled":
+            update_cache(cache, to_run)
+            save_cache(cache)
+    publish_results(tasks)
+    try:
+        metrics_key = write_metrics(to_run, run_id)
+        if metrics_key:
+            print(f"Execution statistics written to s3://{QUERY_BUCKET}/{metrics_key}")
+    except Exception as e:
+        # Telemetry never fails a run whose results are already published
+        print(f"Could not write execution statistics: {str(e)}")
+    for task in tasks:
+        if task.kind == "analysis":
+            print(f"{task.name} → {task.state}, results at {task.result_location}")
+    print_summary([t for t in tasks if t in to_run or t.cache_hit], time.monotonic() - started)
 
 if __name__ == "__main__":
     main()
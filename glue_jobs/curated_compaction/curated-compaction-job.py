@@ -0,0 +1,251 @@
+import sys
+from awsglue.transforms import *
+from awsglue.utils import getResolvedOptions
+from pyspark.context import SparkContext
+from awsglue.context import GlueContext
+from awsglue.job import Job
+from datetime import date, datetime, timedelta, timezone
+import boto3
+import json
+import math
+
+# Shipped next to this script with --extra-py-files
+from spark_transforms import CLUSTER_KEYS, parquet_layout_conf
+
+# Merges the small Parquet files that incremental runs leave in the curated partitions.
+# Compacted files are written to a fresh prefix and the catalog partition is then pointed
+# at it in a single update_partition call, so Athena sees either the old or the new file
+# set and never a mix. The superseded files are deleted on a later run, once queries that
+# planned against them have had time to finish.
+
+## @params: [JOB_NAME]
+args = getResolvedOptions(sys.argv, ['JOB_NAME'])
+
+
+def get_optional_args(argv, defaults):
+    # getResolvedOptions fails on missing arguments, so only resolve the ones that were passed
+    present = [name for name in defaults if f"--{name}" in argv]
+    resolved = getResolvedOptions(argv, present) if present else {}
+    return {name: resolved.get(name, default) for name, default in defaults.items()}
+
+
+options = get_optional_args(sys.argv, {
+    "JOB_RUN_ID": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+    "TABLES": "fact_orders,fact_items,fact_items_options,fact_order_totals,agg_revenue_daily",
+    "SMALL_FILE_MB": "64",
+    "TARGET_FILE_MB": "128",
+    "RETENTION_HOURS": "24",
+    # Keep the sort order and bloom filters data-transformation-job gives the fact files
+    "CURATED_LAYOUT": "clustered",
+    "PARQUET_BLOCK_SIZE_MB": "64",
+})
+
+sc = SparkContext()
+glueContext = GlueContext(sc)
+spark = glueContext.spark_session
+job = Job(glueContext)
+job.init(args['JOB_NAME'], args)
+logger = glueContext.get_logger()
+
+# No _SUCCESS markers in the compacted partitions
+sc._jsc.hadoopConfiguration().set("mapreduce.fileoutputcommitter.marksuccessfuljobs", "false")
+
+clustered_layout = options["CURATED_LAYOUT"] == "clustered"
+# Passed to the writes of clustered tables only; the other tables keep the writer defaults
+clustered_write_options = parquet_layout_conf(int(options["PARQUET_BLOCK_SIZE_MB"]) * 1024 * 1024)
+
+# --------------------------
+# Configuration
+# --------------------------
+bucket = "global-partners-de-project2"
+curated_database = "curated_zone_db"
+compacted_path = f"s3://{bucket}/curated-compacted/"
+s3_checkpoint_path = f"s3://{bucket}/checkpoints/fact_orders_lpt.json"
+compaction_state_key = "checkpoints/compaction_state.json"
+report_prefix = "compaction-reports/"
+
+small_file_bytes = int(options["SMALL_FILE_MB"]) * 1024 * 1024
+target_file_bytes = int(options["TARGET_FILE_MB"]) * 1024 * 1024
+run_id = options["JOB_RUN_ID"]
+
+s3 = boto3.client('s3')
+glue = boto3.client('glue')
+
+
+def split_s3_path(path):
+    return path.replace("s3://", "").split("/", 1)
+
+
+def list_parquet_objects(location):
+    location_bucket, prefix = split_s3_path(location.rstrip("/") + "/")
+    paginator = s3.get_paginator("list_objects_v2")
+    return [
+        {"bucket": location_bucket, "key": obj["Key"], "size": obj["Size"]}
+        for page in paginator.paginate(Bucket=location_bucket, Prefix=prefix)
+        for obj in page.get("Contents", [])
+        # Nested prefixes and hidden files (_SUCCESS, .crc) are not part of the partition
+        if "/" not in obj["Key"][len(prefix):] and not obj["Key"][len(prefix):].startswith(("_", "."))
+    ]
+
+
+def partition_date(values):
+    # Rows with a null order date land in __HIVE_DEFAULT_PARTITION__, which has no date
+    try:
+        return date(*(int(v) for v in values))
+    except ValueError:
+        return None
+
+
+def load_state():
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=compaction_state_key)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return {"pending_deletes": []}
+
+
+# --------------------------
+# Closed partitions
+# --------------------------
+# Incremental batches only contain orders newer than the checkpoint, so partitions dated
+# before it never receive another write and are safe to relocate.
+checkpoint_bucket, checkpoint_key = split_s3_path(s3_checkpoint_path)
+try:
+    last_lpt = json.loads(s3.get_object(Bucket=checkpoint_bucket, Key=checkpoint_key)['Body'].read())['last_processed_timestamp']
+except s3.exceptions.NoSuchKey:
+    logger.info("No transformation checkpoint yet. Nothing to compact.")
+    job.commit()
+    sys.exit(0)
+closed_before = date.fromisoformat(last_lpt[:10])
+logger.info(f"Compacting partitions dated before {closed_before}")
+
+
+# --------------------------
+# Deferred cleanup of files superseded by earlier runs
+# --------------------------
+state = load_state()
+retention_cutoff = datetime.now(timezone.utc) - timedelta(hours=int(options["RETENTION_HOURS"]))
+still_pending = []
+for entry in state["pending_deletes"]:
+    if datetime.fromisoformat(entry["superseded_at"]) > retention_cutoff:
+        still_pending.append(entry)
+        continue
+    for start in range(0, len(entry["keys"]), 1000):
+        s3.delete_objects(
+            Bucket=entry["bucket"],
+            Delete={"Objects": [{"Key": k} for k in entry["keys"][start:start + 1000]], "Quiet": True}
+        )
+    logger.info(f"Deleted {len(entry['keys'])} superseded files of {entry['partition']}")
+state["pending_deletes"] = still_pending
+
+
+# ==============================
+# Compact
+# ==============================
+def compact_partition(table_name, partition, partition_keys):
+    location = partition["StorageDescriptor"]["Location"]
+    spec = "/".join(f"{k}={v}" for k, v in zip(partition_keys, partition["Values"]))
+    files = list_parquet_objects(location)
+    small_files = [f for f in files if f["size"] < small_file_bytes]
+    result = {
+        "partition": f"{table_name}/{spec}",
+        "before_files": len(files),
+        "before_bytes": sum(f["size"] for f in files),
+    }
+    if len(small_files) < 2:
+        result.update({"after_files": result["before_files"], "after_bytes": result["before_bytes"], "compacted": False})
+        return result
+
+    new_location = f"{compacted_path}{table_name}/{run_id}/{spec}/"
+    small_bytes = sum(f["size"] for f in small_files)
+    output_files = max(1, math.ceil(small_bytes / target_file_bytes))
+
+    small_df = spark.read.parquet(*[f"s3://{f['bucket']}/{f['key']}" for f in small_files])
+    expected_rows = small_df.count()
+    cluster_keys = CLUSTER_KEYS.get(table_name) if clustered_layout else None
+    writer_options = {}
+    if cluster_keys:
+        # Merging sorted files by coalesce would interleave their key ranges; re-sort instead
+        compacted_df = small_df.repartitionByRange(output_files, *cluster_keys).sortWithinPartitions(*cluster_keys)
+        writer_options = clustered_write_options
+    else:
+        compacted_df = small_df.coalesce(output_files)
+    compacted_df.write.mode("errorifexists").options(**writer_options).parquet(new_location)
+    written_rows = spark.read.parquet(new_location).count()
+    if written_rows != expected_rows:
+        raise RuntimeError(f"Row count mismatch compacting {spec} of {table_name}: {expected_rows} != {written_rows}")
+
+    # Files already near the target size are carried over as they are
+    new_bucket, new_prefix = split_s3_path(new_location)
+    for f in files:
+        if f["size"] >= small_file_bytes:
+            s3.copy({"Bucket": f["bucket"], "Key": f["key"]}, new_bucket, f"{new_prefix}{f['key'].rsplit('/', 1)[-1]}")
+
+    # The swap: readers planning after this call list the new prefix only
+    storage_descriptor = dict(partition["StorageDescriptor"], Location=new_location)
+    glue.update_partition(
+        DatabaseName=curated_database,
+        TableName=table_name,
+        PartitionValueList=partition["Values"],
+        PartitionInput={
+            "Values": partition["Values"],
+            "StorageDescriptor": storage_descriptor,
+            "Parameters": partition.get("Parameters", {}),
+        }
+    )
+
+    state["pending_deletes"].append({
+        "partition": f"{table_name}/{spec}",
+        "bucket": files[0]["bucket"],
+        "keys": [f["key"] for f in files],
+        "superseded_at": datetime.now(timezone.utc).isoformat(),
+    })
+    after = list_parquet_objects(new_location)
+    result.update({"after_files": len(after), "after_bytes": sum(f["size"] for f in after), "compacted": True})
+    logger.info(f"Compacted {result['partition']}: {result['before_files']} -> {result['after_files']} files")
+    return result
+
+
+report = {"run_id": run_id, "closed_before": closed_before.isoformat(), "tables": {}}
+
+try:
+    for table_name in [t.strip() for t in options["TABLES"].split(",") if t.strip()]:
+        table = glue.get_table(DatabaseName=curated_database, Name=table_name)["Table"]
+        partition_keys = [k["Name"] for k in table["PartitionKeys"]]
+        if partition_keys != ["year", "month", "day"]:
+            logger.info(f"{table_name} is not partitioned by order date. Skipping.")
+            continue
+
+        partition_results = []
+        skipped_partitions = []
+        paginator = glue.get_paginator("get_partitions")
+        for page in paginator.paginate(DatabaseName=curated_database, TableName=table_name):
+            for partition in page["Partitions"]:
+                partition_day = partition_date(partition["Values"])
+                if partition_day is None:
+                    skipped_partitions.append("/".join(partition["Values"]))
+                    logger.warn(f"Skipping {table_name} partition {partition['Values']}: not an order date")
+                    continue
+                if partition_day >= closed_before:
+                    continue
+                partition_results.append(compact_partition(table_name, partition, partition_keys))
+
+        report["tables"][table_name] = {
+            "partitions_scanned": len(partition_results),
+            "partitions_compacted": sum(r["compacted"] for r in partition_results),
+            "before_files": sum(r["before_files"] for r in partition_results),
+            "after_files": sum(r["after_files"] for r in partition_results),
+            "before_bytes": sum(r["before_bytes"] for r in partition_results),
+            "after_bytes": sum(r["after_bytes"] for r in partition_results),
+            "partitions": [r for r in partition_results if r["compacted"]],
+            "skipped_partitions": skipped_partitions,
+        }
+        summary = report["tables"][table_name]
+        print(f"{table_name}: {summary['partitions_compacted']}/{summary['partitions_scanned']} partitions compacted, "
+              f"files {summary['before_files']} -> {summary['after_files']}, "
+              f"bytes {summary['before_bytes']} -> {summary['after_bytes']}")
+finally:
+    # Persist superseded files even on failure, so partitions already swapped get cleaned up
+    s3.put_object(Bucket=bucket, Key=compaction_state_key, Body=json.dumps(state, indent=2))
+    s3.put_object(Bucket=bucket, Key=f"{report_prefix}{run_id}.json", Body=json.dumps(report, indent=2))
+
+job.commit()
@@ -0,0 +1,220 @@
+import sys
+from awsglue.transforms import *
+from awsglue.utils import getResolvedOptions
+from pyspark.context import SparkContext
+from awsglue.context import GlueContext
+from awsglue.job import Job
+from awsglue.dynamicframe import DynamicFrame
+from pyspark.sql.functions import broadcast, coalesce, col, countDistinct, min as spark_min
+from datetime import datetime, timezone
+import boto3
+import json
+
+# Shipped next to this script with --extra-py-files
+from spark_transforms import (
+    ORDER_DATE_PARTITION_KEYS, add_order_date_columns, dedupe_dim_app, shared_app_ids, number_new_apps,
+    build_fact_order_totals, build_agg_revenue_daily, build_agg_revenue_weekly, build_agg_revenue_monthly,
+)
+
+# One-off migration: rewrites the existing, unpartitioned curated fact tables into the
+# year/month/day order-date layout written by data-transformation-job, then backfills
+# fact_order_totals and the agg_revenue_* rollups from the full history. It also renumbers
+# a dim_app whose ids the baseline reissued in every batch, together with fact_orders.app_id.
+# Each of these steps is recorded in a marker object, so re-running the job skips the steps
+# already done.
+# Run it while the transformation job is paused; each table is briefly unavailable
+# between the purge of the old files and the partitioned rewrite.
+
+## @params: [JOB_NAME]
+args = getResolvedOptions(sys.argv, ['JOB_NAME'])
+
+sc = SparkContext()
+glueContext = GlueContext(sc)
+spark = glueContext.spark_session
+job = Job(glueContext)
+job.init(args['JOB_NAME'], args)
+logger = glueContext.get_logger()
+
+# --------------------------
+# Configuration
+# --------------------------
+bucket = "global-partners-de-project2"
+output_path = f"s3://{bucket}/curated/"
+landing_path = f"s3://{bucket}/landing-zone/"
+staging_path = f"s3://{bucket}/curated-migration-staging/"
+curated_database = "curated_zone_db"
+migration_marker_key = "checkpoints/curated_migration.json"
+order_date_partition_keys = ORDER_DATE_PARTITION_KEYS
+
+glue = boto3.client('glue')
+s3 = boto3.client('s3')
+
+
+def write_partitioned(df, table_name, partition_keys=order_date_partition_keys):
+    sink = glueContext.getSink(
+        connection_type="s3",
+        path=f"{output_path}{table_name}/",
+        enableUpdateCatalog=True,
+        updateBehavior="UPDATE_IN_DATABASE",
+        partitionKeys=partition_keys
+    )
+    sink.setFormat("glueparquet")
+    sink.setCatalogInfo(catalogDatabase=curated_database, catalogTableName=table_name)
+    sink.writeFrame(DynamicFrame.fromDF(df, glueContext, f"migrated_{table_name}"))
+
+
+# ==============================
+# Derive the order date for every fact table
+# ==============================
+fact_orders_df = spark.read.parquet(f"{output_path}fact_orders/")
+if "order_date" in fact_orders_df.columns:
+    logger.info("fact_orders already carries order_date. Skipping the repartitioning.")
+else:
+    fact_orders_df = add_order_date_columns(fact_orders_df)
+    order_dates_df = fact_orders_df.select("order_id", "order_date", *order_date_partition_keys).dropDuplicates(["order_id"])
+
+    migrated_tables = {
+        "fact_orders": fact_orders_df,
+        "fact_items": spark.read.parquet(f"{output_path}fact_items/").join(order_dates_df, "order_id", "left"),
+        "fact_items_options": spark.read.parquet(f"{output_path}fact_items_options/").join(order_dates_df, "order_id", "left"),
+    }
+
+    # Stage the partitioned copies first: the sources are read lazily and are about to be purged
+    for table_name, df in migrated_tables.items():
+        df.write.mode("overwrite").partitionBy(*order_date_partition_keys).parquet(f"{staging_path}{table_name}/")
+        logger.info(f"Staged {table_name} at {staging_path}{table_name}/")
+
+    # ==============================
+    # Swap the staged data into the curated zone
+    # ==============================
+    for table_name in migrated_tables:
+        # The catalog table is recreated with partition keys by the sink below
+        glueContext.purge_s3_path(f"{output_path}{table_name}/", options={"retentionPeriod": 0})
+        try:
+            glue.delete_table(DatabaseName=curated_database, Name=table_name)
+        except glue.exceptions.EntityNotFoundException:
+            pass
+
+        write_partitioned(spark.read.parquet(f"{staging_path}{table_name}/"), table_name)
+        logger.info(f"Repartitioned {table_name} by {order_date_partition_keys}")
+
+    glueContext.purge_s3_path(staging_path, options={"retentionPeriod": 0})
+
+
+# ==============================
+# Backfill fact_order_totals and the revenue rollups
+# ==============================
+# Keyed on a marker rather than on the tables existing: a transformation run before this
+# job creates them with the dates of its own batch only. Each backfill replaces the table
+# with one built from the full history, which includes those batches.
+def load_migration_marker():
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=migration_marker_key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return {}
+
+
+def mark_backfilled(marker, step):
+    marker[step] = datetime.now(timezone.utc).isoformat()
+    s3.put_object(Bucket=bucket, Key=migration_marker_key, Body=json.dumps(marker, indent=2))
+
+
+def replace_table(df, table_name, partition_keys):
+    glueContext.purge_s3_path(f"{output_path}{table_name}/", options={"retentionPeriod": 0})
+    try:
+        glue.delete_table(DatabaseName=curated_database, Name=table_name)
+    except glue.exceptions.EntityNotFoundException:
+        pass
+    write_partitioned(df, table_name, partition_keys)
+
+
+marker = load_migration_marker()
+
+# ==============================
+# Renumber dim_app
+# ==============================
+# The baseline numbered the app names of every batch from 1 and appended them to dim_app,
+# so one app_id can stand for several apps, in dim_app and in fact_orders alike. Each app
+# name gets a single id again, and every order takes the id of the app_name it landed with.
+if "dim_app_ids" in marker:
+    logger.info(f"dim_app renumbered at {marker['dim_app_ids']}. Skipping the renumbering.")
+else:
+    old_dim_app_df = spark.read.parquet(f"{output_path}dim_app/").cache()
+    duplicate_app_ids = shared_app_ids(old_dim_app_df)
+    duplicate_names = old_dim_app_df.count() - dedupe_dim_app(old_dim_app_df).count()
+    if not duplicate_app_ids and not duplicate_names:
+        logger.info("dim_app has one id per app_name. Nothing to renumber.")
+    else:
+        app_names = sorted(row["app_name"] for row in old_dim_app_df.select("app_name").distinct().collect())
+        new_dim_app_df = number_new_apps(spark, app_names, 0)
+
+        # Landing keeps every order with its app_name. Orders no longer in landing keep their
+        # app only when the old id was issued to a single name.
+        order_apps_df = (spark.read.parquet(f"{landing_path}order_items/")
+                         .select("order_id", "app_name")
+                         .dropDuplicates(["order_id"]))
+        unambiguous_ids_df = (old_dim_app_df
+                              .groupBy("app_id")
+                              .agg(countDistinct("app_name").alias("app_names"),
+                                   spark_min("app_name").alias("issued_app_name"))
+                              .filter(col("app_names") == 1)
+                              .select("app_id", "issued_app_name"))
+        old_fact_orders_df = spark.read.parquet(f"{output_path}fact_orders/")
+        fact_orders_df = (old_fact_orders_df
+                          .join(order_apps_df, "order_id", "left")
+                          .join(broadcast(unambiguous_ids_df), "app_id", "left")
+                          .withColumn("app_name", coalesce(col("app_name"), col("issued_app_name")))
+                          .drop("app_id")
+                          .join(broadcast(new_dim_app_df), "app_name", "left")
+                          .select(*old_fact_orders_df.columns))
+
+        # Staged first: both tables are read lazily and are about to be purged
+        new_dim_app_df.write.mode("overwrite").parquet(f"{staging_path}dim_app/")
+        fact_orders_df.write.mode("overwrite").partitionBy(*order_date_partition_keys).parquet(
+            f"{staging_path}fact_orders/")
+        unresolved = spark.read.parquet(f"{staging_path}fact_orders/").filter(col("app_id").isNull()).count()
+        if unresolved:
+            logger.warn(f"{unresolved} fact_orders rows have no app_name in landing and an ambiguous "
+                        f"app_id; their app_id is left empty")
+
+        glueContext.purge_s3_path(f"{output_path}dim_app/", options={"retentionPeriod": 0})
+        spark.read.parquet(f"{staging_path}dim_app/").write.mode("append").parquet(f"{output_path}dim_app/")
+        replace_table(spark.read.parquet(f"{staging_path}fact_orders/"), "fact_orders", order_date_partition_keys)
+        glueContext.purge_s3_path(staging_path, options={"retentionPeriod": 0})
+        logger.info(f"Renumbered dim_app: {len(app_names)} app names, ids {duplicate_app_ids} were shared")
+    old_dim_app_df.unpersist()
+    mark_backfilled(marker, "dim_app_ids")
+
+if "fact_order_totals" in marker:
+    logger.info(f"fact_order_totals backfilled at {marker['fact_order_totals']}. Skipping the backfill.")
+else:
+    # Built before the purge and staged: the totals are read back from the fact tables lazily
+    fact_order_totals_df = build_fact_order_totals(spark.read.parquet(f"{output_path}fact_orders/"),
+                                                   spark.read.parquet(f"{output_path}fact_items/"),
+                                                   spark.read.parquet(f"{output_path}fact_items_options/"))
+    fact_order_totals_df.write.mode("overwrite").partitionBy(*order_date_partition_keys).parquet(
+        f"{staging_path}fact_order_totals/")
+    replace_table(spark.read.parquet(f"{staging_path}fact_order_totals/"), "fact_order_totals",
+                  order_date_partition_keys)
+    glueContext.purge_s3_path(staging_path, options={"retentionPeriod": 0})
+    mark_backfilled(marker, "fact_order_totals")
+    logger.info("Backfilled fact_order_totals")
+
+if "revenue_rollups" in marker:
+    logger.info(f"Revenue rollups backfilled at {marker['revenue_rollups']}. Skipping the rollup backfill.")
+else:
+    agg_revenue_daily_df = build_agg_revenue_daily(spark.read.parquet(f"{output_path}fact_orders/"),
+                                                   spark.read.parquet(f"{output_path}fact_items/"))
+    agg_revenue_daily_df.write.mode("overwrite").partitionBy(*order_date_partition_keys).parquet(
+        f"{staging_path}agg_revenue_daily/")
+    agg_revenue_daily_df = spark.read.parquet(f"{staging_path}agg_revenue_daily/").cache()
+
+    replace_table(agg_revenue_daily_df, "agg_revenue_daily", order_date_partition_keys)
+    replace_table(build_agg_revenue_weekly(agg_revenue_daily_df), "agg_revenue_weekly", ["week_start"])
+    replace_table(build_agg_revenue_monthly(agg_revenue_daily_df), "agg_revenue_monthly", ["month_start"])
+    agg_revenue_daily_df.unpersist()
+    glueContext.purge_s3_path(staging_path, options={"retentionPeriod": 0})
+    mark_backfilled(marker, "revenue_rollups")
+    logger.info("Backfilled agg_revenue_daily, agg_revenue_weekly and agg_revenue_monthly")
+
+job.commit()
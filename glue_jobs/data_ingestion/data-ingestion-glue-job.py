@@ -4,52 +4,123 @@ from awsglue.utils import getResolvedOptions
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
+from datetime import datetime, timezone
 
 import boto3
 import json
 
+# Shipped next to this script with --extra-py-files
+from jdbc_ingestion import WATERMARK_COLUMN, JdbcSource, LandingCatalog, table_configs, ingest
+
 ## @params: [JOB_NAME]
 args = getResolvedOptions(sys.argv, ['JOB_NAME'])
 
+
+def get_optional_args(argv, defaults):
+    # getResolvedOptions fails on missing arguments, so only resolve the ones that were passed
+    present = [name for name in defaults if f"--{name}" in argv]
+    resolved = getResolvedOptions(argv, present) if present else {}
+    return {name: resolved.get(name, default) for name, default in defaults.items()}
+
+
+# --------------------------
+# Configuration
+# --------------------------
+# Every option can be overridden with a job argument, e.g. to point the job at a local
+# SQLite/Postgres stand-in: --JDBC_URL jdbc:sqlite:/tmp/gp.db --JDBC_DRIVER org.sqlite.JDBC --SOURCE_SCHEMA main
+# The reads and writes themselves live in jdbc_ingestion and run without Glue as well.
+options = get_optional_args(sys.argv, {
+    "INGESTION_MODE": "incremental",  # "incremental" or "full"
+    "JDBC_URL": "jdbc:sqlserver://my-sqlserver-db.cmn64k4yi5vh.us-east-1.rds.amazonaws.com:1433;databaseName=GlobalPartners",
+    "JDBC_DRIVER": "com.microsoft.sqlserver.jdbc.SQLServerDriver",
+    "SECRET_NAME": "rds_credentials_secret",  # "none" for sources without credentials
+    "SOURCE_SCHEMA": "dbo",
+    "LANDING_PATH": "s3://global-partners-de-project2/landing-zone/",
+    "WATERMARK_PATH": "s3://global-partners-de-project2/checkpoints/ingestion_watermark.json",
+    "FINGERPRINT_PATH": "s3://global-partners-de-project2/checkpoints/ingestion_fingerprints.json",
+    # Catalog database the transformation job reads landing from; new ingest_date partitions are added to it
+    "LANDING_DATABASE": "landing_zone_db",
+    # JSON overrides per table, e.g. {"order_items": {"partition_column": "lineitem_id", "num_partitions": 8}}
+    "JDBC_PARTITIONING": "{}",
+    # JSON of Spark SQL settings for this run. Only set when the run is started through
+    # glue_job_sizing.py --start; other runs keep the job defaults
+    "SPARK_CONF": "{}",
+})
+
+table_configs_by_name = table_configs(json.loads(options["JDBC_PARTITIONING"]))
+
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 job = Job(glueContext)
 job.init(args['JOB_NAME'], args)
 
+spark_conf = json.loads(options["SPARK_CONF"])
+for conf_key, conf_value in spark_conf.items():
+    spark.conf.set(conf_key, conf_value)
+print(f"Spark settings for this run: {spark_conf or 'job defaults'}")
+
+s3 = boto3.client('s3')
+landing_catalog = LandingCatalog(boto3.client('glue'), options["LANDING_DATABASE"])
+
+
 def get_secret(secret_name):
     client = boto3.client('secretsmanager')
     response = client.get_secret_value(SecretId=secret_name)
     return json.loads(response['SecretString'])
 
-secret = get_secret('rds_credentials_secret')
 
-connection_properties = {
-    "user": secret['username'],
-    "password": secret['password'],
-    "driver": "com.microsoft.sqlserver.jdbc.SQLServerDriver"
-}
+connection_properties = {"driver": options["JDBC_DRIVER"]}
+if options["SECRET_NAME"].lower() != "none":
+    secret = get_secret(options["SECRET_NAME"])
+    connection_properties["user"] = secret['username']
+    connection_properties["password"] = secret['password']
 
-print(f"connection_properties={connection_properties}")
+print(f"jdbc_url={options['JDBC_URL']}, user={connection_properties.get('user')}")
+
+source = JdbcSource(spark, options["JDBC_URL"], connection_properties, options["SOURCE_SCHEMA"])
+
+
+# --------------------------
+# Watermark and fingerprints
+# --------------------------
+def load_checkpoint(path):
+    checkpoint_bucket, checkpoint_key = path.replace("s3://", "").split("/", 1)
+    try:
+        response = s3.get_object(Bucket=checkpoint_bucket, Key=checkpoint_key)
+        return json.loads(response['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return {}
 
-jdbc_url = "jdbc:sqlserver://my-sqlserver-db.cmn64k4yi5vh.us-east-1.rds.amazonaws.com:1433;databaseName=GlobalPartners"
-try:
-    date_dim_df = spark.read.jdbc(url=jdbc_url, table="dbo.date_dim", properties=connection_properties)
-    order_items_df = spark.read.jdbc(url=jdbc_url, table="dbo.order_items", properties=connection_properties)
-    order_item_options_df = spark.read.jdbc(url=jdbc_url, table="dbo.order_item_options", properties=connection_properties)
-    
-except Exception as e:
-    print(f"Connection failed: {str(e)}")
-    raise
+
+def save_checkpoint(path, content):
+    checkpoint_bucket, checkpoint_key = path.replace("s3://", "").split("/", 1)
+    s3.put_object(Bucket=checkpoint_bucket, Key=checkpoint_key, Body=json.dumps(content, indent=2))
+
+
+# --------------------------
+# Ingest
+# --------------------------
+incremental_mode = options["INGESTION_MODE"] == "incremental"
+last_watermark = load_checkpoint(options["WATERMARK_PATH"]).get(WATERMARK_COLUMN) if incremental_mode else None
+fingerprints = load_checkpoint(options["FINGERPRINT_PATH"])
+ingest_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
 # Write to S3 as Parquet
-# e.g., s3://my-output-bucket/date_dim/
-print(f"Write to S3 as Parquet")
 try:
-    for df, path in [(date_dim_df, 'date_dim'), (order_items_df, 'order_items'), (order_item_options_df, 'order_item_options')]:
-        df.write.mode("overwrite").parquet(f"s3://global-partners-de-project2/landing-zone/{path}/")
-        print(f"Successfully wrote data to s3://global-partners-de-project2/landing-zone/{path}/")
+    new_watermark, fingerprints = ingest(source, options["LANDING_PATH"], table_configs_by_name, last_watermark,
+                                         fingerprints, ingest_date, incremental_mode, landing_catalog)
 except Exception as e:
-    print(f"Failed to write to S3: {str(e)}")
+    print(f"Failed to ingest into S3: {str(e)}")
     raise
+
+# --------------------------
+# Update Watermark and fingerprints
+# --------------------------
+# Only advanced once every table landed, so a failed run re-reads the same window
+if new_watermark is not None:
+    save_checkpoint(options["WATERMARK_PATH"], {WATERMARK_COLUMN: new_watermark})
+    print(f"Successfully updated ingestion watermark: {new_watermark}")
+save_checkpoint(options["FINGERPRINT_PATH"], fingerprints)
+
 job.commit()
@@ -0,0 +1,347 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+from pyspark.sql.functions import lit
+
+# Source reads and landing writes of data-ingestion-glue-job. Nothing here touches the
+# GlueContext, S3 clients or Secrets Manager, and the Glue catalog client is passed in, so
+# the same code runs inside the Glue job (shipped next to it with --extra-py-files) and on a
+# plain local SparkSession against a SQLite/Postgres stand-in, as tests/test_jdbc_ingestion.py does.
+
+WATERMARK_COLUMN = "creation_time_utc"
+
+# Whole-table checksums per JDBC dialect, over the rows of the table aliased t. A row count
+# alone misses same-count updates, so sources without an entry here (SQLite among them) have
+# no change detection: their full loads are always read and rewritten.
+CHECKSUM_EXPRESSIONS = {
+    "sqlserver": "CHECKSUM_AGG(BINARY_CHECKSUM(*))",
+    # Sum of 60 bits of each row's md5; the sum is numeric, so it neither overflows nor
+    # depends on the row order. Returned as text so the checkpoint keeps it exactly.
+    "postgresql": "CAST(SUM(CAST(CAST('x' || LEFT(MD5(CAST(t AS text)), 15) AS bit(60)) AS bigint)) AS text)",
+}
+
+# Per-table read settings. lower_bound/upper_bound are looked up from the source when a
+# partition column is set without explicit bounds.
+TABLE_CONFIGS = {
+    "date_dim": {
+        "incremental": False,
+        "partition_column": None,
+        "lower_bound": None,
+        "upper_bound": None,
+        "num_partitions": 1,
+    },
+    "order_items": {
+        "incremental": True,
+        "partition_column": None,
+        "lower_bound": None,
+        "upper_bound": None,
+        "num_partitions": 4,
+    },
+    "order_item_options": {
+        "incremental": True,
+        # order_item_options has no timestamp of its own, the watermark is applied
+        # through a semi-join on the parent line items
+        "watermark_parent": "order_items",
+        "join_columns": ["order_id", "lineitem_id"],
+        "partition_column": None,
+        "lower_bound": None,
+        "upper_bound": None,
+        "num_partitions": 4,
+    },
+}
+
+
+def table_configs(overrides):
+    """TABLE_CONFIGS with the per-table overrides of the JDBC_PARTITIONING argument applied."""
+    configs = {name: dict(config) for name, config in TABLE_CONFIGS.items()}
+    for table_name, table_overrides in overrides.items():
+        configs[table_name].update(table_overrides)
+    return configs
+
+
+# --------------------------
+# Watermark values
+# --------------------------
+def watermark_text(value):
+    """Text form of a watermark, used both in SQL literals and in the checkpoint.
+
+    Datetimes are written as ISO 8601 with milliseconds: SQL Server DATETIME rejects
+    literals with more than 3 fractional digits, and the "T" form is read the same
+    whatever the session's DATEFORMAT. Values of other types keep their own text form.
+    """
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}"
+    return str(value)
+
+
+def parse_watermark(text, like):
+    """Checkpointed watermark text as the type the source returns in like, so the two compare."""
+    if text is None or like is None or isinstance(like, str):
+        return text
+    if isinstance(like, datetime):
+        # Also reads checkpoints written before watermark_text, with microseconds and a space
+        return datetime.fromisoformat(text)
+    if isinstance(like, (int, Decimal)):
+        return type(like)(text)
+    raise TypeError(f"Unsupported {WATERMARK_COLUMN} type {type(like).__name__}")
+
+
+def has_new_rows(last_watermark, new_watermark):
+    # Both sides must have been through parse_watermark; the checkpoint is compared at its
+    # own precision, so a source value within the same millisecond counts as already read
+    if last_watermark is None or new_watermark is None:
+        return new_watermark is not None
+    if isinstance(new_watermark, datetime):
+        return watermark_text(new_watermark) > watermark_text(last_watermark)
+    return new_watermark > last_watermark
+
+
+def sql_literal(value):
+    return "'" + watermark_text(value).replace("'", "''") + "'"
+
+
+def window_predicate(config, low, high, source_table):
+    """Build the WHERE clause selecting rows in the (low, high] watermark window."""
+    if not config["incremental"] or high is None:
+        return None
+    bounds = f"{WATERMARK_COLUMN} <= {sql_literal(high)}"
+    if low is not None:
+        bounds = f"{WATERMARK_COLUMN} > {sql_literal(low)} AND {bounds}"
+
+    if "watermark_parent" not in config:
+        return bounds
+    parent = source_table(config["watermark_parent"])
+    join = " AND ".join(f"p.{c} = t.{c}" for c in config["join_columns"])
+    parent_bounds = bounds.replace(WATERMARK_COLUMN, f"p.{WATERMARK_COLUMN}")
+    return f"EXISTS (SELECT 1 FROM {parent} p WHERE {join} AND {parent_bounds})"
+
+
+def partition_bound(value):
+    """A partition column bound as Spark's JDBC reader takes it: numeric, date or timestamp text."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str):
+        # Bounds given in JDBC_PARTITIONING, e.g. "2024-01-01" for a date column
+        return value
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return str(int(value))
+    raise TypeError(f"Spark cannot split a JDBC read on a {type(value).__name__} column; "
+                    f"use a numeric, date or timestamp partition_column")
+
+
+# --------------------------
+# Source
+# --------------------------
+class JdbcSource:
+    """The source database, read through Spark's JDBC data source."""
+
+    def __init__(self, spark, url, properties, schema):
+        self.spark = spark
+        self.url = url
+        self.properties = properties
+        self.schema = schema
+
+    def table(self, table_name):
+        return f"{self.schema}.{table_name}" if self.schema else table_name
+
+    def _reader(self, dbtable):
+        reader = self.spark.read.format("jdbc").option("url", self.url).option("dbtable", dbtable)
+        for key, value in self.properties.items():
+            reader = reader.option(key, value)
+        return reader
+
+    def query_row(self, query):
+        # Push a small aggregate query down to the source and return its single row
+        return self._reader(f"({query}) src").load().collect()[0]
+
+    def fingerprint(self, table_name):
+        """Row count plus a source-side checksum, computed by the database without moving the rows.
+
+        None when the dialect has no checksum expression: the table cannot be compared.
+        """
+        checksum = CHECKSUM_EXPRESSIONS.get(self.url.split(":")[1])
+        if checksum is None:
+            return None
+        row = self.query_row(f"SELECT COUNT(*) AS row_count, {checksum} AS checksum FROM {self.table(table_name)} t")
+        return {"row_count": int(row["row_count"]), "checksum": row["checksum"]}
+
+    def max_watermark(self):
+        return self.query_row(f"SELECT MAX({WATERMARK_COLUMN}) AS hwm FROM {self.table('order_items')}")["hwm"]
+
+    def read(self, table_name, config, predicate):
+        query = f"SELECT * FROM {self.table(table_name)} t"
+        if predicate:
+            query += f" WHERE {predicate}"
+        dbtable = f"({query}) src"
+
+        column = config["partition_column"]
+        if not column or int(config["num_partitions"]) <= 1:
+            return self._reader(dbtable).load()
+
+        lower, upper = config["lower_bound"], config["upper_bound"]
+        if lower is None or upper is None:
+            bounds = self.query_row(f"SELECT MIN({column}) AS lo, MAX({column}) AS hi FROM {dbtable}")
+            lower = bounds["lo"] if lower is None else lower
+            upper = bounds["hi"] if upper is None else upper
+        if lower is None:
+            # Empty window, nothing to split
+            return self._reader(dbtable).load()
+
+        return (self._reader(dbtable)
+                .option("partitionColumn", column)
+                .option("lowerBound", partition_bound(lower))
+                .option("upperBound", partition_bound(upper))
+                .option("numPartitions", int(config["num_partitions"]))
+                .load())
+
+
+# --------------------------
+# Landing catalog
+# --------------------------
+class LandingCatalog:
+    """The landing_zone_db tables of the incremental tables, kept in step with the ingest_date partitions.
+
+    The transformation job reads landing through these tables and glue_job_sizing counts the
+    pending rows through Athena on them, so a partition that is written but not registered
+    is never transformed.
+    """
+
+    # Table settings of a Parquet table as a crawler creates them; only used when the table is missing
+    PARQUET_STORAGE = {
+        "InputFormat": "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+        "OutputFormat": "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+        "SerdeInfo": {"SerializationLibrary": "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"},
+    }
+    # get_table returns read-only fields that update_table rejects
+    TABLE_INPUT_KEYS = ("Name", "Description", "Owner", "Retention", "StorageDescriptor", "PartitionKeys",
+                        "TableType", "Parameters")
+
+    def __init__(self, glue, database):
+        self.glue = glue
+        self.database = database
+
+    def register(self, table_name, location, columns, ingest_date, rebuilt):
+        """Register the ingest_date partition just written under location.
+
+        columns are (name, Hive type) pairs of the landed rows. rebuilt means the table was
+        overwritten as a whole: the baseline's flat table is switched to the partitioned
+        layout and partitions of the replaced files are dropped.
+        """
+        partition_key = {"Name": "ingest_date", "Type": "string"}
+        columns = [{"Name": name, "Type": hive_type} for name, hive_type in columns if name != "ingest_date"]
+        try:
+            table = self.glue.get_table(DatabaseName=self.database, Name=table_name)["Table"]
+        except self.glue.exceptions.EntityNotFoundException:
+            table = None
+
+        if table is None:
+            storage_descriptor = dict(self.PARQUET_STORAGE, Columns=columns, Location=location)
+            self.glue.create_table(DatabaseName=self.database, TableInput={
+                "Name": table_name,
+                "TableType": "EXTERNAL_TABLE",
+                "Parameters": {"classification": "parquet"},
+                "PartitionKeys": [partition_key],
+                "StorageDescriptor": storage_descriptor,
+            })
+        elif rebuilt or table.get("PartitionKeys") != [partition_key]:
+            storage_descriptor = dict(table["StorageDescriptor"], Columns=columns, Location=location)
+            table_input = {key: table[key] for key in self.TABLE_INPUT_KEYS if key in table}
+            table_input.update(PartitionKeys=[partition_key], StorageDescriptor=storage_descriptor)
+            self.glue.update_table(DatabaseName=self.database, TableInput=table_input)
+            self._drop_partitions(table_name)
+        else:
+            storage_descriptor = table["StorageDescriptor"]
+
+        response = self.glue.batch_create_partition(DatabaseName=self.database, TableName=table_name,
+                                                    PartitionInputList=[{
+            "Values": [ingest_date],
+            "StorageDescriptor": dict(storage_descriptor, Location=f"{location}ingest_date={ingest_date}/"),
+        }])
+        errors = [e for e in response.get("Errors", []) if e["ErrorDetail"]["ErrorCode"] != "AlreadyExistsException"]
+        if errors:
+            raise RuntimeError(f"Could not register ingest_date={ingest_date} of {table_name}: {errors}")
+
+    def _drop_partitions(self, table_name):
+        paginator = self.glue.get_paginator("get_partitions")
+        values = [{"Values": p["Values"]}
+                  for page in paginator.paginate(DatabaseName=self.database, TableName=table_name)
+                  for p in page["Partitions"]]
+        # batch_delete_partition accepts at most 25 partitions per call
+        for start in range(0, len(values), 25):
+            self.glue.batch_delete_partition(DatabaseName=self.database, TableName=table_name,
+                                             PartitionsToDelete=values[start:start + 25])
+
+
+# --------------------------
+# Ingest
+# --------------------------
+def ingest_table(source, landing_path, table_name, config, low, high, ingest_date, previous_fingerprint,
+                 catalog=None):
+    incremental = config["incremental"] and low is not None
+
+    # Full loads are skipped when the source table has not changed since the last run
+    fingerprint = None
+    if not incremental:
+        fingerprint = source.fingerprint(table_name)
+        if fingerprint is None:
+            print(f"No checksum for {table_name} on this source. Reloading it.")
+        elif fingerprint == previous_fingerprint:
+            print(f"{table_name} unchanged since the last run ({fingerprint}). Skipping read and write.")
+            return table_name, fingerprint
+
+    # Full loads are capped at the same upper watermark, so the next incremental run starts exactly there
+    predicate = window_predicate(config, low, high, source.table)
+
+    df = source.read(table_name, config, predicate)
+    target = f"{landing_path}{table_name}/"
+
+    if not config["incremental"]:
+        # Small reference tables are always replaced as a whole
+        df.write.mode("overwrite").parquet(target)
+    else:
+        writer = df.withColumn("ingest_date", lit(ingest_date)).write.partitionBy("ingest_date")
+        # The first incremental run (no watermark yet) rebuilds the landing zone in the partitioned layout
+        writer.mode("append" if incremental else "overwrite").parquet(target)
+        if catalog is not None:
+            catalog.register(table_name, target, [(f.name, f.dataType.simpleString()) for f in df.schema.fields],
+                             ingest_date, rebuilt=not incremental)
+
+    print(f"Successfully wrote {table_name} to {target} ({'append' if incremental else 'overwrite'})")
+    return table_name, fingerprint
+
+
+def ingest(source, landing_path, configs, last_watermark_text, fingerprints, ingest_date, incremental_mode=True,
+           catalog=None):
+    """Land one watermark window of every table; returns the new watermark text and fingerprints.
+
+    The caller saves both only after this returns, so a failed run re-reads the same window.
+    Each ingest_date partition written is registered in catalog, a LandingCatalog, when one is given.
+    """
+    # Fix the upper end of the window once so parent and child tables see the same set of orders
+    new_watermark = source.max_watermark()
+    last_watermark = parse_watermark(last_watermark_text, new_watermark) if incremental_mode else None
+    print(f"Ingestion mode={'incremental' if incremental_mode else 'full'}, "
+          f"window=({last_watermark}, {new_watermark}]")
+
+    tables = dict(configs)
+    if incremental_mode and last_watermark is not None and not has_new_rows(last_watermark, new_watermark):
+        print("No new orders in the source since the last run. Skipping order tables.")
+        tables = {name: config for name, config in tables.items() if not config["incremental"]}
+
+    fingerprints = dict(fingerprints)
+    # One thread per table so the JDBC reads run side by side
+    with ThreadPoolExecutor(max_workers=max(len(tables), 1)) as executor:
+        futures = [
+            executor.submit(ingest_table, source, landing_path, name, config, last_watermark, new_watermark,
+                            ingest_date, fingerprints.get(name), catalog)
+            for name, config in tables.items()
+        ]
+        for future in futures:
+            table_name, fingerprint = future.result()
+            if fingerprint is not None:
+                fingerprints[table_name] = fingerprint
+
+    return (watermark_text(new_watermark) if new_watermark is not None else None), fingerprints
@@ -4,15 +4,49 @@ from awsglue.utils import getResolvedOptions
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
-from pyspark.sql.functions import row_number, col, to_date, to_timestamp, year, month, weekofyear, lit, date_format
-from pyspark.sql.window import Window
+from pyspark.sql.functions import col, to_date
+from pyspark.sql.utils import AnalysisException
 from awsglue.dynamicframe import DynamicFrame
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from urllib.request import urlopen
 import boto3
+import hashlib
 import json
+import time
+
+# Shipped next to this script with --extra-py-files
+from spark_transforms import (
+    ORDER_DATE_PARTITION_KEYS, DIM_APP_SCHEMA, transform_date_dim, parse_order_items, new_order_items,
+    options_for_order_items, dedupe_dim_app, shared_app_ids, unseen_app_names, number_new_apps, build_fact_orders,
+    build_fact_items, build_fact_item_options, build_fact_order_totals, build_agg_revenue_daily,
+    build_agg_revenue_weekly, build_agg_revenue_monthly, CLUSTER_KEYS, cluster_for_layout, parquet_layout_conf,
+)
 
 ## @params: [JOB_NAME]
 args = getResolvedOptions(sys.argv, ['JOB_NAME'])
 
+
+def get_optional_args(argv, defaults):
+    # getResolvedOptions fails on missing arguments, so only resolve the ones that were passed
+    present = [name for name in defaults if f"--{name}" in argv]
+    resolved = getResolvedOptions(argv, present) if present else {}
+    return {name: resolved.get(name, default) for name, default in defaults.items()}
+
+
+options = get_optional_args(sys.argv, {
+    "JOB_RUN_ID": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+    "RUN_REPORT_PATH": "s3://global-partners-de-project2/run-reports/data-transformation-job/",
+    "METRICS_NAMESPACE": "GlobalPartners/GlueJobs",
+    # JSON of Spark SQL settings for this run, chosen from the pending volume by glue_job_sizing.py
+    "SPARK_CONF": "{}",
+    # "clustered" sorts the fact files by their lookup keys and adds bloom filters on them;
+    # "none" writes rows in whatever order Spark produces
+    "CURATED_LAYOUT": "clustered",
+    # Parquet row group size; smaller groups let Athena skip at a finer grain
+    "PARQUET_BLOCK_SIZE_MB": "64",
+})
+
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
@@ -20,17 +54,278 @@ job = Job(glueContext)
 job.init(args['JOB_NAME'], args)
 logger = glueContext.get_logger()
 
+spark_conf = json.loads(options["SPARK_CONF"])
+for conf_key, conf_value in spark_conf.items():
+    spark.conf.set(conf_key, conf_value)
+logger.info(f"Spark settings for this run: {spark_conf or 'job defaults'}")
+
+clustered_layout = options["CURATED_LAYOUT"] == "clustered"
+# Passed to the clustered writes only; date_dim, dim_app and the rollups keep the writer defaults
+clustered_write_options = parquet_layout_conf(int(options["PARQUET_BLOCK_SIZE_MB"]) * 1024 * 1024)
+
+
+class RunInstrumentation:
+    """Per-stage Spark metrics for one job run, published as a JSON run report and CloudWatch metrics.
+
+    Every stage runs under its own Spark job group. Wall time and cached memory are sampled when the
+    stage ends; job, stage, row and shuffle counters are read from the Spark status API when the
+    report is published, once the listener bus has caught up.
+    """
+
+    def __init__(self, spark, job_name, run_id):
+        self.sc = spark.sparkContext
+        self.job_name = job_name
+        self.run_id = run_id
+        self.started_at = datetime.now(timezone.utc)
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        group = f"{self.run_id}:{name}"
+        self.sc.setJobGroup(group, name)
+        record = {"stage": name, "job_group": group}
+        started = time.time()
+        try:
+            yield record
+        finally:
+            record["wall_time_seconds"] = round(time.time() - started, 3)
+            record["cached_bytes"] = self._cached_bytes()
+            self.sc.setLocalProperty("spark.jobGroup.id", None)
+            self.stages.append(record)
+            logger.info(f"Stage {name} finished in {record['wall_time_seconds']}s")
+
+    def _cached_bytes(self):
+        try:
+            return sum(info.memSize() for info in self.sc._jsc.sc().getRDDStorageInfo())
+        except Exception:
+            return None
+
+    def _rest(self, path):
+        url = f"{self.sc.uiWebUrl}/api/v1/applications/{self.sc.applicationId}/{path}"
+        with urlopen(url, timeout=10) as response:
+            return json.loads(response.read())
+
+    def _collect_spark_metrics(self):
+        tracker = self.sc.statusTracker()
+        try:
+            stage_data = {}
+            for stage in self._rest("stages"):
+                if stage["status"] != "SKIPPED":
+                    stage_data[stage["stageId"]] = stage
+        except Exception as e:
+            # Spark UI disabled or unreachable: fall back to job and stage counts only
+            logger.warn(f"Spark status API unavailable, row and shuffle metrics skipped: {str(e)}")
+            stage_data = None
+
+        for record in self.stages:
+            # Kept in the record, so a second publish (e.g. the failure path) finds it again
+            job_ids = tracker.getJobIdsForGroup(record.get("job_group"))
+            stage_ids = set()
+            for job_id in job_ids:
+                info = tracker.getJobInfo(job_id)
+                if info:
+                    stage_ids.update(info.stageIds)
+            record["spark_jobs"] = len(job_ids)
+
+            if stage_data is None:
+                record["spark_stages"] = len(stage_ids)
+                continue
+            executed = [stage_data[i] for i in stage_ids if i in stage_data]
+            record["spark_stages"] = len(executed)
+            record["input_rows"] = sum(s.get("inputRecords", 0) for s in executed)
+            record["output_rows"] = sum(s.get("outputRecords", 0) for s in executed)
+            record["shuffle_read_bytes"] = sum(s.get("shuffleReadBytes", 0) for s in executed)
+            record["shuffle_write_bytes"] = sum(s.get("shuffleWriteBytes", 0) for s in executed)
+
+    def publish(self, status):
+        """Write the run report and its CloudWatch metrics; a failure here is logged, never raised.
+
+        Called after the checkpoint is saved, where failing the run would skip job.commit()
+        and have the next run redo a batch that is already written.
+        """
+        try:
+            return self._publish(status)
+        except Exception as e:
+            logger.error(f"Could not publish run report: {str(e)}")
+            return None
+
+    def _publish(self, status):
+        self._collect_spark_metrics()
+        report = {
+            "job_name": self.job_name,
+            "run_id": self.run_id,
+            "status": status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "spark_conf": spark_conf,
+            "stages": self.stages,
+        }
+
+        report_bucket, report_prefix = options["RUN_REPORT_PATH"].replace("s3://", "").split("/", 1)
+        s3.put_object(Bucket=report_bucket, Key=f"{report_prefix}{self.run_id}.json",
+                      Body=json.dumps(report, indent=2, default=str))
+        logger.info(f"Run report written to {options['RUN_REPORT_PATH']}{self.run_id}.json")
+
+        metric_names = {
+            "wall_time_seconds": ("WallTime", "Seconds"),
+            "spark_jobs": ("SparkJobs", "Count"),
+            "spark_stages": ("SparkStages", "Count"),
+            "input_rows": ("InputRows", "Count"),
+            "output_rows": ("OutputRows", "Count"),
+            "shuffle_read_bytes": ("ShuffleReadBytes", "Bytes"),
+            "shuffle_write_bytes": ("ShuffleWriteBytes", "Bytes"),
+            "cached_bytes": ("CachedBytes", "Bytes"),
+        }
+        metric_data = []
+        for record in self.stages:
+            dimensions = [{"Name": "JobName", "Value": self.job_name}, {"Name": "Stage", "Value": record["stage"]}]
+            for field, (metric_name, unit) in metric_names.items():
+                if record.get(field) is not None:
+                    metric_data.append({"MetricName": metric_name, "Dimensions": dimensions,
+                                        "Value": record[field], "Unit": unit})
+        cloudwatch = boto3.client('cloudwatch')
+        # put_metric_data accepts at most 1000 metrics per call
+        for start in range(0, len(metric_data), 1000):
+            cloudwatch.put_metric_data(Namespace=options["METRICS_NAMESPACE"],
+                                       MetricData=metric_data[start:start + 1000])
+        return report
+
+
 # --------------------------
 # Configuration
 # --------------------------
 # S3 path to store LPT (JSON with last processed timestamp)
 s3_checkpoint_path = "s3://global-partners-de-project2/checkpoints/fact_orders_lpt.json"
+# Content fingerprints of the landing tables seen by the last successful run
+s3_fingerprint_path = "s3://global-partners-de-project2/checkpoints/transformation_fingerprints.json"
+
+landing_path = "s3://global-partners-de-project2/landing-zone/"
+landing_tables = ["date_dim", "order_items", "order_item_options"]
+
+output_path = "s3://global-partners-de-project2/curated/"
+curated_database = "curated_zone_db"
+order_date_partition_keys = ORDER_DATE_PARTITION_KEYS
+
+
+def write_partitioned(df, table_name, partition_keys):
+    if clustered_layout and table_name in CLUSTER_KEYS:
+        write_clustered(df, table_name, partition_keys)
+        return
+    # Partitioned writes register their new partitions in the catalog as they land
+    sink = glueContext.getSink(
+        connection_type="s3",
+        path=f"{output_path}{table_name}/",
+        enableUpdateCatalog=True,
+        updateBehavior="UPDATE_IN_DATABASE",
+        partitionKeys=partition_keys
+    )
+    sink.setFormat("glueparquet")
+    sink.setCatalogInfo(catalogDatabase=curated_database, catalogTableName=table_name)
+    sink.writeFrame(DynamicFrame.fromDF(df, glueContext, f"dynamic_{table_name}"))
+
+
+def write_clustered(df, table_name, partition_keys):
+    """Append df sorted by the table's cluster keys and register any new partition in the catalog.
+
+    Written by Spark's Parquet writer rather than the Glue sink: a DynamicFrame does not keep
+    the row order, and the sink's catalog update only supports glueparquet, which ignores the
+    bloom filter and row group options.
+    """
+    partition_values = [tuple(row) for row in df.select(*partition_keys).distinct().collect()]
+    (cluster_for_layout(df, table_name, partition_keys)
+     .write
+     .mode("append")
+     .options(**clustered_write_options)
+     .partitionBy(*partition_keys)
+     .parquet(f"{output_path}{table_name}/"))
+    register_partitions(df.schema, table_name, partition_keys, partition_values)
+
+
+def partition_spec(partition_keys, values):
+    return "/".join(f"{k}={v}" for k, v in zip(partition_keys, values))
+
+
+def register_partitions(schema, table_name, partition_keys, partition_values):
+    try:
+        storage_descriptor = glue.get_table(DatabaseName=curated_database, Name=table_name)["Table"]["StorageDescriptor"]
+    except glue.exceptions.EntityNotFoundException:
+        # First run: the table is created as the Glue sink would have created it
+        storage_descriptor = {
+            "Columns": [{"Name": f.name, "Type": f.dataType.simpleString()}
+                        for f in schema.fields if f.name not in partition_keys],
+            "Location": f"{output_path}{table_name}/",
+            "InputFormat": "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+            "OutputFormat": "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+            "SerdeInfo": {"SerializationLibrary": "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"},
+        }
+        glue.create_table(DatabaseName=curated_database, TableInput={
+            "Name": table_name,
+            "TableType": "EXTERNAL_TABLE",
+            "Parameters": {"classification": "parquet"},
+            "PartitionKeys": [{"Name": k, "Type": schema[k].dataType.simpleString()} for k in partition_keys],
+            "StorageDescriptor": storage_descriptor,
+        })
+
+    inputs = [{
+        "Values": [str(v) for v in values],
+        "StorageDescriptor": dict(storage_descriptor,
+                                  Location=f"{output_path}{table_name}/{partition_spec(partition_keys, values)}/"),
+    } for values in partition_values]
+    # batch_create_partition accepts at most 100 partitions per call
+    for start in range(0, len(inputs), 100):
+        response = glue.batch_create_partition(DatabaseName=curated_database, TableName=table_name,
+                                               PartitionInputList=inputs[start:start + 100])
+        errors = [e for e in response.get("Errors", [])
+                  if e["ErrorDetail"]["ErrorCode"] != "AlreadyExistsException"]
+        if errors:
+            raise RuntimeError(f"Could not register partitions of {table_name}: {errors}")
+
+
+def overwrite_partitions(df, table_name, partition_keys, partition_values):
+    """Replace the given partitions of a curated table with the contents of df."""
+    for values in partition_values:
+        glueContext.purge_s3_path(f"{output_path}{table_name}/{partition_spec(partition_keys, values)}/",
+                                  options={"retentionPeriod": 0})
+    write_partitioned(df, table_name, partition_keys)
+
+
+def read_curated(table_name, push_down_predicate):
+    return glueContext.create_dynamic_frame.from_catalog(
+        database=curated_database,
+        table_name=table_name,
+        push_down_predicate=push_down_predicate
+    ).toDF()
+
+
+def order_date_predicate(dates):
+    return " or ".join(f"(year == {d.year} and month == {d.month} and day == {d.day})" for d in dates)
+
+
+def landing_fingerprint(table_name):
+    """Cheap change marker for a landing table, taken from its S3 listing without reading the data."""
+    landing_bucket, landing_prefix = landing_path.replace("s3://", "").split("/", 1)
+    paginator = s3.get_paginator("list_objects_v2")
+    objects = [obj for page in paginator.paginate(Bucket=landing_bucket, Prefix=f"{landing_prefix}{table_name}/")
+               for obj in page.get("Contents", [])]
+    digest = hashlib.sha256("\n".join(sorted(f"{o['Key']}:{o['ETag']}" for o in objects)).encode()).hexdigest()
+    return {
+        "object_count": len(objects),
+        "total_bytes": sum(o["Size"] for o in objects),
+        "max_last_modified": max(o["LastModified"] for o in objects).isoformat() if objects else None,
+        "etag_digest": digest,
+    }
+
+
+def save_fingerprints(fingerprints):
+    fingerprint_bucket, fingerprint_key = s3_fingerprint_path.replace("s3://", "").split("/", 1)
+    s3.put_object(Bucket=fingerprint_bucket, Key=fingerprint_key, Body=json.dumps(fingerprints, indent=2))
 
 
 # --------------------------
 # Load Last Processed Timestamp
 # --------------------------
 s3 = boto3.client('s3')
+glue = boto3.client('glue')
 bucket, key = s3_checkpoint_path.replace("s3://", "").split("/", 1)
 
 try:
@@ -43,175 +338,239 @@ except Exception as e:
     print(f"Error reading checkpoint from S3: {str(e)}")
     raise
 
+instrumentation = RunInstrumentation(spark, args['JOB_NAME'], options["JOB_RUN_ID"])
+
+
+# --------------------------
+# Change Detection
+# --------------------------
+with instrumentation.stage("change_detection"):
+    try:
+        fingerprint_bucket, fingerprint_key = s3_fingerprint_path.replace("s3://", "").split("/", 1)
+        previous_fingerprints = json.loads(s3.get_object(Bucket=fingerprint_bucket, Key=fingerprint_key)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        previous_fingerprints = {}
+
+    current_fingerprints = {table_name: landing_fingerprint(table_name) for table_name in landing_tables}
+    changed_tables = {table_name for table_name, fingerprint in current_fingerprints.items()
+                      if fingerprint != previous_fingerprints.get(table_name)}
+    logger.info(f"Changed landing tables since the last run: {sorted(changed_tables) or 'none'}")
+
+
+# ==============================
+# Dimension Tables
+# ==============================
+
+# ---Table 1: Date Dimension ---
+# date_dim almost never changes, so it is only read, transformed and rewritten when its landing files did
+with instrumentation.stage("dim_date"):
+    if "date_dim" in changed_tables:
+        date_dim_df = glueContext.create_dynamic_frame.from_catalog(
+            database="landing_zone_db", 
+            table_name="date_dim"
+        ).toDF()
+        logger.info(f"Date Dim Schema: {date_dim_df.schema.simpleString()}")
+
+        date_dim_transformed_df = transform_date_dim(date_dim_df)
+        # Convert back to a DynamicFrame for writing
+        dynamic_date_dim_df = DynamicFrame.fromDF(date_dim_transformed_df, glueContext, "dynamic_date_dim_df")
+
+        # The dimension is replaced as a whole rather than appended to
+        glueContext.purge_s3_path(f"{output_path}date_dim/", options={"retentionPeriod": 0})
+        glueContext.write_dynamic_frame.from_options(
+            frame=dynamic_date_dim_df,
+            connection_type="s3",
+            connection_options={"path": f"{output_path}date_dim/"},
+            format="parquet"
+        )
+    else:
+        logger.info("date_dim unchanged since the last run. Skipping read, transform and write.")
+
+if "order_items" not in changed_tables:
+    logger.info("order_items unchanged since the last run. No new orders to process. Exiting job.")
+    save_fingerprints(current_fingerprints)
+    instrumentation.publish("unchanged")
+    job.commit()
+    sys.exit(0)
+
 
 # ==============================
 # Load DataFrames from Glue Catalog
 # ==============================
-date_dim_df = glueContext.create_dynamic_frame.from_catalog(
-    database="landing_zone_db", 
-    table_name="date_dim"
-).toDF()
-
-order_item_options_df = glueContext.create_dynamic_frame.from_catalog(
-    database="landing_zone_db", 
-    table_name="order_item_options"
-).toDF()
-
-order_item_df = glueContext.create_dynamic_frame.from_catalog(
-    database="landing_zone_db", 
-    table_name="order_items"
-).toDF()
-
-# Convert creation_time_utc from ISO 8601 format to Spark timestamp
-order_item_df = order_item_df.withColumn(
-    "creation_time_utc",
-    to_timestamp(col("creation_time_utc"), "yyyy-MM-dd'T'HH:mm:ss.SSS'Z'")
-)
+with instrumentation.stage("load"):
+    order_item_options_df = glueContext.create_dynamic_frame.from_catalog(
+        database="landing_zone_db", 
+        table_name="order_item_options"
+    ).toDF()
 
-logger.info("Order Items Schema:")
-order_item_df.printSchema()
-logger.info("Order Item Options Schema:")
-order_item_options_df.printSchema()
-logger.info("Date Dim Schema:")
-date_dim_df.printSchema()
+    order_item_df = parse_order_items(glueContext.create_dynamic_frame.from_catalog(
+        database="landing_zone_db", 
+        table_name="order_items"
+    ).toDF())
+
+    # Logged through the job logger instead of printSchema on stdout
+    logger.info(f"Order Items Schema: {order_item_df.schema.simpleString()}")
+    logger.info(f"Order Item Options Schema: {order_item_options_df.schema.simpleString()}")
 
 
 # --------------------------
 # Incremental filter: only new orders
 # --------------------------
-# Create an empty DataFrame with the same schema as order_item_df
-new_order_item_df = spark.createDataFrame([], schema=order_item_df.schema)
+with instrumentation.stage("incremental_filter"):
+    new_order_item_df = new_order_items(order_item_df, last_lpt).cache()
 
-if last_lpt:
-    new_order_item_df = order_item_df.filter(col("creation_time_utc") > lit(last_lpt).cast("timestamp"))
-else:
-    new_order_item_df = order_item_df
+    # One pass both materializes the cache and yields the next checkpoint value;
+    # a None max means the batch is empty
+    max_timestamp = new_order_item_df.agg({"creation_time_utc": "max"}).collect()[0][0]
 
-if not new_order_item_df.head(1):
+if max_timestamp is None:
     logger.info("No new orders to process. Exiting job.")
+    new_order_item_df.unpersist()
+    save_fingerprints(current_fingerprints)
+    instrumentation.publish("no_new_orders")
     job.commit()
+    sys.exit(0)
 
-new_order_item_df = new_order_item_df.cache()
-
-#  Filter related order items and options
-new_order_item_options_df = order_item_options_df.join(
-    new_order_item_df.select("order_id", "lineitem_id"), 
-    ["order_id", "lineitem_id"], 
-    "inner"
-).cache()
-
-# ==============================
-# Dimension Tables
-# ==============================
-
-# ---Table 1: Date Dimension ---
-# Transform the date dim table with proper datatypes
-date_dim_transformed_df = (
-    date_dim_df
-    .withColumn("date_key", to_date(col("date_key"), "dd-MM-yyyy"))
-    .withColumn("year", col("year").cast("int"))
-)
-# Convert back to a DynamicFrame for writing
-dynamic_date_dim_df = DynamicFrame.fromDF(date_dim_transformed_df, glueContext, "dynamic_date_dim_df")
-
+#  Filter related order items and options, carrying the order timestamp for partitioning
+new_order_item_options_df = options_for_order_items(order_item_options_df, new_order_item_df).cache()
 
 # Table 2 - dim_app
-dim_app_spark_df = new_order_item_df.select( "app_name").dropDuplicates()
-# Use row_number() for strictly sequential IDs
-windowSpec_app = Window.orderBy("app_name") 
-new_dim_app_spark_df = dim_app_spark_df.withColumn("app_id", row_number().over(windowSpec_app))
-# Reorder so app_id is the first column
-new_dim_app_spark_df = new_dim_app_spark_df.select("app_id", "app_name")
-# Convert back to a DynamicFrame for writing
-dynamic_dim_app_df = DynamicFrame.fromDF(new_dim_app_spark_df, glueContext, "dynamic_dim_app_df")
+with instrumentation.stage("dim_app"):
+    # app_id values live in a persistent key table in the curated zone, so they stay stable across runs
+    try:
+        existing_dim_app_spark_df = dedupe_dim_app(spark.read.parquet(f"{output_path}dim_app/"))
+    except AnalysisException:
+        # First run, no key table yet
+        existing_dim_app_spark_df = spark.createDataFrame([], schema=DIM_APP_SCHEMA)
+    existing_dim_app_spark_df = existing_dim_app_spark_df.cache()
+    # New ids would start after a max that is already ambiguous, so stop before writing any fact
+    duplicate_app_ids = shared_app_ids(existing_dim_app_spark_df)
+    if duplicate_app_ids:
+        raise RuntimeError(f"dim_app ids {duplicate_app_ids} belong to more than one app_name; "
+                           f"run repartition-curated-job to renumber dim_app and fact_orders first")
+
+    # Only app names never seen before get new ids, appended after the current max
+    new_app_names = unseen_app_names(new_order_item_df, existing_dim_app_spark_df)
+    max_app_id = existing_dim_app_spark_df.agg({"app_id": "max"}).collect()[0][0] or 0
+    new_dim_app_spark_df = number_new_apps(spark, new_app_names, max_app_id)
+    dim_app_lookup_df = existing_dim_app_spark_df.unionByName(new_dim_app_spark_df)
+    logger.info(f"dim_app: {len(new_app_names)} new app names, ids from {max_app_id + 1}")
+    # Only the new keys are appended to the curated table
+    dynamic_dim_app_df = DynamicFrame.fromDF(new_dim_app_spark_df, glueContext, "dynamic_dim_app_df")
 
 
 # ==============================
 # Fact Tables
 # ==============================
+# Only the plans are built here. Spark computes the facts when they are written, so their
+# cost is timed under the write_<table> stages below. fact_order_totals follows the writes.
 
 # --- Table 3 - Fact Orders ---
-fact_orders_spark_joined_df = (
-                        new_order_item_df
-                        .join(new_dim_app_spark_df, "app_name", "inner")
-                        )
-
-fact_orders_spark_results_df = (fact_orders_spark_joined_df.select("order_id", "app_id", "restaurant_id",
-                                                                  "user_id", "printed_card_number", "is_loyalty",
-                                                                  "creation_time_utc", "currency")
-                                                                  .fillna({"user_id": "UNKNOWN"})
-                                                                  .dropDuplicates())
-
-transformed_fact_orders_results_df = (fact_orders_spark_results_df
-                                      .withColumnRenamed("currency", "currency_used"))
+transformed_fact_orders_results_df = build_fact_orders(new_order_item_df, dim_app_lookup_df)
 # Convert back to a DynamicFrame for writing
 dynamic_fact_orders_df = DynamicFrame.fromDF(transformed_fact_orders_results_df, glueContext, "dynamic_fact_orders_df")
 
 
  # ---- Table 4 - Fact Items ----
-fact_items_spark_results_df = (new_order_item_df.select("lineitem_id","order_id", "item_category", 
-                                                        "item_name", "item_quantity", "item_price")
-                                                        .withColumn("item_quantity", col("item_quantity").cast("int"))
-                                                        .withColumn("item_price", col("item_price").cast("float"))
-                                                        .withColumn("item_total", col("item_quantity") * col("item_price")))
+fact_items_spark_results_df = build_fact_items(new_order_item_df)
 # Convert back to a DynamicFrame for writing
 dynamic_fact_items_df = DynamicFrame.fromDF(fact_items_spark_results_df, glueContext, "dynamic_fact_items_df")
 
 
 # ---- Table 5 - Fact Item Options ----
-fact_item_options_spark_results_df = (new_order_item_options_df
-                                      .select("lineitem_id", "order_id", "option_group_name", "option_name", "option_quantity", "option_price")
-                                      .withColumn("option_quantity", col("option_quantity").cast("float"))
-                                      .withColumn("option_price", col("option_price").cast("float"))
-                                      .withColumn("option_total", col("option_quantity") * col("option_price"))
-                                      .dropDuplicates())
+fact_item_options_spark_results_df = build_fact_item_options(new_order_item_options_df)
 
 fact_item_options_dynamic_df = DynamicFrame.fromDF(fact_item_options_spark_results_df, glueContext, "fact_item_options_dynamic_df")
-                   
+
 
 # ==============================
 # Write Outputs to S3
 # ==============================
 
-output_path = "s3://global-partners-de-project2/curated/"
-
-transformed_df_s3_path_list = [(dynamic_date_dim_df, "date_dim"), (dynamic_dim_app_df, "dim_app"), 
-                               (dynamic_fact_orders_df, "fact_orders"), (dynamic_fact_items_df, "fact_items"), 
-                               (fact_item_options_dynamic_df, "fact_items_options")]
+transformed_df_s3_path_list = [(dynamic_dim_app_df, "dim_app", []), 
+                               (dynamic_fact_orders_df, "fact_orders", order_date_partition_keys),
+                               (dynamic_fact_items_df, "fact_items", order_date_partition_keys), 
+                               (fact_item_options_dynamic_df, "fact_items_options", order_date_partition_keys)]
 
 try:
-    for df, s3_path in transformed_df_s3_path_list:
-        # Write the transformed data to the processed S3 bucket
-        glueContext.write_dynamic_frame.from_options(
-            frame=df,
-            connection_type="s3",
-            connection_options={"path": f"{output_path}{s3_path}/"},
-            format="parquet"  # It's a best practice to use a columnar format like Parquet
-        )
+    for df, s3_path, partition_keys in transformed_df_s3_path_list:
+        with instrumentation.stage(f"write_{s3_path}"):
+            if partition_keys:
+                write_partitioned(df.toDF(), s3_path, partition_keys)
+                continue
+
+            # Write the transformed data to the processed S3 bucket
+            glueContext.write_dynamic_frame.from_options(
+                frame=df,
+                connection_type="s3",
+                connection_options={"path": f"{output_path}{s3_path}/"},
+                format="parquet"  # It's a best practice to use a columnar format like Parquet
+            )
     
+    # Never empty: the batch holds at least one timestamp, otherwise the job stopped earlier
+    affected_dates = sorted(row["order_date"] for row in
+                            new_order_item_df.select(to_date(col("creation_time_utc")).alias("order_date"))
+                            .filter(col("order_date").isNotNull())
+                            .distinct().collect())
+
+    # ---- Table 6 - Fact Order Totals ----
+    # One narrow, pre-joined row per order so the analyses stop re-aggregating fact_items and
+    # fact_items_options. Rebuilt for the order dates of the batch from the curated facts, so
+    # an order whose lines or options reach the curated zone over several runs is still
+    # totalled once, over all of them.
+    with instrumentation.stage("fact_order_totals"):
+        fact_order_totals_df = build_fact_order_totals(
+            read_curated("fact_orders", order_date_predicate(affected_dates)),
+            read_curated("fact_items", order_date_predicate(affected_dates)),
+            read_curated("fact_items_options", order_date_predicate(affected_dates)),
+        )
+        overwrite_partitions(fact_order_totals_df, "fact_order_totals", order_date_partition_keys,
+                             [(d.year, d.month, d.day) for d in affected_dates])
+
+    # --------------------------
+    # Revenue Rollups
+    # --------------------------
+    # Only the order dates touched by this batch are recomputed, from the curated facts that
+    # now include the batch; weeks and months are then re-derived from the affected days.
+    with instrumentation.stage("agg_revenue_daily"):
+        agg_revenue_daily_df = build_agg_revenue_daily(read_curated("fact_orders", order_date_predicate(affected_dates)),
+                                                       read_curated("fact_items", order_date_predicate(affected_dates)))
+        overwrite_partitions(agg_revenue_daily_df, "agg_revenue_daily", order_date_partition_keys,
+                             [(d.year, d.month, d.day) for d in affected_dates])
+
+    with instrumentation.stage("agg_revenue_weekly"):
+        # Weeks start on Monday, matching DATE_TRUNC('week', ...) in Athena
+        affected_weeks = sorted({d - timedelta(days=d.weekday()) for d in affected_dates})
+        week_days = [w + timedelta(days=offset) for w in affected_weeks for offset in range(7)]
+        agg_revenue_weekly_df = build_agg_revenue_weekly(read_curated("agg_revenue_daily", order_date_predicate(week_days)))
+        overwrite_partitions(agg_revenue_weekly_df, "agg_revenue_weekly", ["week_start"],
+                             [(w.isoformat(),) for w in affected_weeks])
+
+    with instrumentation.stage("agg_revenue_monthly"):
+        affected_months = sorted({d.replace(day=1) for d in affected_dates})
+        month_predicate = " or ".join(f"(year == {m.year} and month == {m.month})" for m in affected_months)
+        agg_revenue_monthly_df = build_agg_revenue_monthly(read_curated("agg_revenue_daily", month_predicate))
+        overwrite_partitions(agg_revenue_monthly_df, "agg_revenue_monthly", ["month_start"],
+                             [(m.isoformat(),) for m in affected_months])
+
     # --------------------------
     # Update Last Processed Timestamp
     # --------------------------
-    if new_order_item_df.head(1):
-        max_timestamp = new_order_item_df.agg({"creation_time_utc": "max"}).collect()[0][0]
-        s3.put_object(
-            Bucket=bucket,
-            Key=key,    
-            Body=json.dumps({"last_processed_timestamp": str(max_timestamp)})
-        )
-    else:
-        max_timestamp = None
-        print("No new orders found. Max timestamp is None.")
-    
-    if max_timestamp:
+    with instrumentation.stage("checkpoint"):
         s3.put_object(
             Bucket=bucket,
             Key=key,
             Body=json.dumps({"last_processed_timestamp": str(max_timestamp)})
         )
         print(f"Successfully updated checkpoint: {max_timestamp}")
+        save_fingerprints(current_fingerprints)
+
+    for cached_df in (new_order_item_df, new_order_item_options_df, existing_dim_app_spark_df):
+        cached_df.unpersist()
 
+    instrumentation.publish("succeeded")
     job.commit()
 except Exception as e:
     print(f"Job failed: {str(e)}")
+    instrumentation.publish("failed")
     raise
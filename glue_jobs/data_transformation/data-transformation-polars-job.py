@@ -0,0 +1,443 @@
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+import calendar
+import hashlib
+import json
+
+import boto3
+import polars as pl
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# Shipped next to this script with --extra-py-files
+from polars_transforms import (
+    ORDER_DATE_PARTITION_KEYS, DIM_APP_SCHEMA, transform_date_dim, parse_order_items, new_order_items,
+    options_for_order_items, dedupe_dim_app, shared_app_ids, unseen_app_names, number_new_apps, build_fact_orders,
+    build_fact_items, build_fact_item_options, build_fact_order_totals, build_agg_revenue_daily,
+    build_agg_revenue_weekly, build_agg_revenue_monthly, CLUSTER_KEYS, cluster_for_layout,
+)
+from glue_job_sizing import start_sized_run
+
+# Single-node engine for data-transformation-job. Runs as a pythonshell job and is the
+# entry point of the transformation: it does the same change detection as the Spark job,
+# then sizes the batch from the landing files written since the last successful run.
+# Batches up to SPARK_THRESHOLD_MB are transformed here with Polars and pyarrow; larger
+# ones, and the very first run, are handed to the Spark job. Both engines share the
+# checkpoint and fingerprints and write the same curated tables, partitions and catalog
+# entries, so consecutive runs can switch engines freely.
+
+
+def get_job_arg(name, default):
+    # Glue passes job arguments as "--NAME value" pairs
+    flag = f"--{name}"
+    if flag in sys.argv and sys.argv.index(flag) + 1 < len(sys.argv):
+        return sys.argv[sys.argv.index(flag) + 1]
+    return default
+
+
+JOB_NAME = get_job_arg("JOB_NAME", "data-transformation-polars-job")
+JOB_RUN_ID = get_job_arg("JOB_RUN_ID", datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"))
+RUN_REPORT_PATH = get_job_arg("RUN_REPORT_PATH", "s3://global-partners-de-project2/run-reports/data-transformation-polars-job/")
+SPARK_JOB_NAME = get_job_arg("SPARK_JOB_NAME", "data-transformation-job")
+# New landing bytes (order_items plus order_item_options) above which the batch goes to Spark
+SPARK_THRESHOLD_BYTES = float(get_job_arg("SPARK_THRESHOLD_MB", "256")) * 1024 * 1024
+# "clustered" sorts the fact files by their lookup keys in the same order as data-transformation-job;
+# "none" keeps join order. The files carry the sort order and min/max statistics only: unlike
+# the Spark writer, they have no bloom filters and keep pyarrow's default row group size
+CURATED_LAYOUT = get_job_arg("CURATED_LAYOUT", "clustered")
+# Workers of dispatched Spark runs are sized from these profiles when the run starts
+SIZING_PROFILES = get_job_arg("SIZING_PROFILES",
+                              "s3://aws-glue-assets-860063976206-us-east-1/scripts/sizing_profiles.json")
+
+# --------------------------
+# Configuration
+# --------------------------
+s3_checkpoint_path = "s3://global-partners-de-project2/checkpoints/fact_orders_lpt.json"
+s3_fingerprint_path = "s3://global-partners-de-project2/checkpoints/transformation_fingerprints.json"
+
+landing_path = "s3://global-partners-de-project2/landing-zone/"
+landing_tables = ["date_dim", "order_items", "order_item_options"]
+
+output_path = "s3://global-partners-de-project2/curated/"
+curated_database = "curated_zone_db"
+
+# Landing columns read by the transformation; everything else is left on S3
+ORDER_ITEM_COLUMNS = ["order_id", "lineitem_id", "app_name", "restaurant_id", "user_id", "printed_card_number",
+                      "is_loyalty", "creation_time_utc", "currency", "item_category", "item_name",
+                      "item_quantity", "item_price"]
+ORDER_ITEM_OPTION_COLUMNS = ["order_id", "lineitem_id", "option_group_name", "option_name",
+                             "option_quantity", "option_price"]
+
+# Catalog column types of the curated tables, for reads that find no partitions
+CATALOG_TYPES = {"string": pl.String, "int": pl.Int32, "bigint": pl.Int64, "float": pl.Float32,
+                 "double": pl.Float64, "boolean": pl.Boolean, "date": pl.Date, "timestamp": pl.Datetime("us")}
+
+s3 = boto3.client('s3')
+glue = boto3.client('glue')
+s3_fs = fs.S3FileSystem(region=boto3.session.Session().region_name or "us-east-1")
+
+stages = []
+
+
+@contextmanager
+def stage(name):
+    started = time.time()
+    try:
+        yield
+    finally:
+        stages.append({"stage": name, "wall_time_seconds": round(time.time() - started, 3)})
+        print(f"Stage {name} finished in {stages[-1]['wall_time_seconds']}s")
+
+
+def publish_report(status, engine="polars", **extra):
+    # Logged rather than raised: after the checkpoint is saved a failed report must not fail the run
+    try:
+        _write_report(status, engine, **extra)
+    except Exception as e:
+        print(f"Could not publish run report: {str(e)}")
+
+
+def _write_report(status, engine, **extra):
+    report = {
+        "job_name": JOB_NAME,
+        "run_id": JOB_RUN_ID,
+        "status": status,
+        "engine": engine,
+        "stages": stages,
+        **extra,
+    }
+    report_bucket, report_prefix = split_s3_path(RUN_REPORT_PATH)
+    s3.put_object(Bucket=report_bucket, Key=f"{report_prefix}{JOB_RUN_ID}.json",
+                  Body=json.dumps(report, indent=2, default=str))
+
+
+def split_s3_path(path):
+    return path.replace("s3://", "").split("/", 1)
+
+
+def load_json(path, default):
+    json_bucket, json_key = split_s3_path(path)
+    try:
+        return json.loads(s3.get_object(Bucket=json_bucket, Key=json_key)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return default
+
+
+def save_json(path, content):
+    json_bucket, json_key = split_s3_path(path)
+    s3.put_object(Bucket=json_bucket, Key=json_key, Body=json.dumps(content, indent=2))
+
+
+def list_objects(path):
+    list_bucket, prefix = split_s3_path(path)
+    paginator = s3.get_paginator("list_objects_v2")
+    return [obj for page in paginator.paginate(Bucket=list_bucket, Prefix=prefix)
+            for obj in page.get("Contents", [])]
+
+
+def landing_fingerprint(objects):
+    """Same change marker as data-transformation-job, so the engines agree on what changed."""
+    digest = hashlib.sha256("\n".join(sorted(f"{o['Key']}:{o['ETag']}" for o in objects)).encode()).hexdigest()
+    return {
+        "object_count": len(objects),
+        "total_bytes": sum(o["Size"] for o in objects),
+        "max_last_modified": max(o["LastModified"] for o in objects).isoformat() if objects else None,
+        "etag_digest": digest,
+    }
+
+
+def new_landing_bytes(objects, previous_fingerprint):
+    since = (previous_fingerprint or {}).get("max_last_modified")
+    if since is None:
+        return sum(o["Size"] for o in objects)
+    since = datetime.fromisoformat(since)
+    return sum(o["Size"] for o in objects if o["LastModified"] > since)
+
+
+# --------------------------
+# Parquet I/O
+# --------------------------
+def read_dataset(path, columns=None, filter=None):
+    """Stream a Parquet prefix into a DataFrame, with column projection and predicate pushdown."""
+    dataset = ds.dataset(path.replace("s3://", ""), filesystem=s3_fs, format="parquet", partitioning="hive")
+    return pl.from_arrow(dataset.to_table(columns=columns, filter=filter))
+
+
+def to_arrow(df):
+    # Plain string columns rather than string views, for Athena's Parquet reader
+    return df.to_arrow(compat_level=pl.CompatLevel.oldest())
+
+
+def write_partitioned(df, table_name, partition_keys):
+    """Append df under the table's hive partitions and register any new partition in the catalog."""
+    clustered = CURATED_LAYOUT == "clustered" and table_name in CLUSTER_KEYS
+    if clustered:
+        df = cluster_for_layout(df, table_name, partition_keys)
+    table = to_arrow(df)
+    partition_schema = pa.schema([table.schema.field(k) for k in partition_keys])
+    ds.write_dataset(
+        table,
+        f"{output_path}{table_name}".replace("s3://", ""),
+        filesystem=s3_fs,
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+        # One file name per run, so appends never replace files of earlier runs
+        basename_template=f"{JOB_RUN_ID}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        # Threaded writes may reorder rows; the batches here are small enough to write in order
+        use_threads=not clustered,
+    )
+    partition_values = df.select(partition_keys).unique().rows()
+    register_partitions(table_name, partition_keys, partition_values)
+    print(f"Wrote {df.height} rows to {table_name} ({len(partition_values)} partitions)")
+
+
+def partition_spec(partition_keys, values):
+    return "/".join(f"{k}={v}" for k, v in zip(partition_keys, values))
+
+
+def register_partitions(table_name, partition_keys, partition_values):
+    storage_descriptor = glue.get_table(DatabaseName=curated_database, Name=table_name)["Table"]["StorageDescriptor"]
+    inputs = [{
+        "Values": [str(v) for v in values],
+        "StorageDescriptor": dict(storage_descriptor,
+                                  Location=f"{output_path}{table_name}/{partition_spec(partition_keys, values)}/"),
+    } for values in partition_values]
+    # batch_create_partition accepts at most 100 partitions per call
+    for start in range(0, len(inputs), 100):
+        response = glue.batch_create_partition(DatabaseName=curated_database, TableName=table_name,
+                                               PartitionInputList=inputs[start:start + 100])
+        errors = [e for e in response.get("Errors", [])
+                  if e["ErrorDetail"]["ErrorCode"] != "AlreadyExistsException"]
+        if errors:
+            raise RuntimeError(f"Could not register partitions of {table_name}: {errors}")
+
+
+def read_partitions(table_name, partition_keys, partition_values, columns):
+    """Read the given partitions through their catalog locations, which compaction may have moved.
+
+    Partitions missing from the catalog are skipped; partition keys are added back as columns.
+    When none is found the frame is empty, with the catalog types of the columns.
+    """
+    entries = [{"Values": [str(v) for v in values]} for values in partition_values]
+    frames = []
+    # batch_get_partition accepts at most 1000 partitions per call
+    for start in range(0, len(entries), 1000):
+        response = glue.batch_get_partition(DatabaseName=curated_database, TableName=table_name,
+                                            PartitionsToGet=entries[start:start + 1000])
+        for partition in response["Partitions"]:
+            location = partition["StorageDescriptor"]["Location"]
+            frames.append(read_dataset(location, columns=columns).with_columns(
+                pl.lit(int(v)).cast(pl.Int32).alias(k) for k, v in zip(partition_keys, partition["Values"])
+            ))
+    if not frames:
+        table_columns = glue.get_table(DatabaseName=curated_database, Name=table_name)["Table"]["StorageDescriptor"]["Columns"]
+        types = {c["Name"]: CATALOG_TYPES[c["Type"]] for c in table_columns}
+        return pl.DataFrame(schema={**{c: types[c] for c in columns}, **{k: pl.Int32 for k in partition_keys}})
+    return pl.concat(frames, how="vertical_relaxed")
+
+
+def overwrite_partitions(df, table_name, partition_keys, partition_values):
+    """Replace the given partitions of a curated table with the contents of df."""
+    for values in partition_values:
+        objects = list_objects(f"{output_path}{table_name}/{partition_spec(partition_keys, values)}/")
+        output_bucket, _ = split_s3_path(output_path)
+        for start in range(0, len(objects), 1000):
+            s3.delete_objects(Bucket=output_bucket, Delete={
+                "Objects": [{"Key": o["Key"]} for o in objects[start:start + 1000]], "Quiet": True})
+    write_partitioned(df, table_name, partition_keys)
+
+
+def order_date_values(dates):
+    return [(d.year, d.month, d.day) for d in dates]
+
+
+# --------------------------
+# Change Detection and engine choice
+# --------------------------
+with stage("change_detection"):
+    previous_fingerprints = load_json(s3_fingerprint_path, {})
+    landing_objects = {table_name: list_objects(f"{landing_path}{table_name}/") for table_name in landing_tables}
+    current_fingerprints = {table_name: landing_fingerprint(objects) for table_name, objects in landing_objects.items()}
+    changed_tables = {table_name for table_name, fingerprint in current_fingerprints.items()
+                      if fingerprint != previous_fingerprints.get(table_name)}
+    print(f"Changed landing tables since the last run: {sorted(changed_tables) or 'none'}")
+
+    batch_bytes = sum(new_landing_bytes(landing_objects[t], previous_fingerprints.get(t))
+                      for t in ("order_items", "order_item_options"))
+
+if "order_items" in changed_tables and (not previous_fingerprints or batch_bytes > SPARK_THRESHOLD_BYTES):
+    # The first run also goes to Spark: its catalog sinks create the curated tables
+    reason = "first run" if not previous_fingerprints else f"{batch_bytes} new landing bytes > {SPARK_THRESHOLD_BYTES:.0f}"
+    spark_run_id = start_sized_run(SPARK_JOB_NAME, profiles_path=SIZING_PROFILES)
+    print(f"Engine: spark ({reason}). Started {SPARK_JOB_NAME} run {spark_run_id}.")
+    publish_report("dispatched", engine="spark", batch_bytes=batch_bytes, spark_job_run_id=spark_run_id)
+    sys.exit(0)
+print(f"Engine: polars ({batch_bytes} new landing bytes <= {SPARK_THRESHOLD_BYTES:.0f})")
+
+
+# ==============================
+# Dimension Tables
+# ==============================
+with stage("dim_date"):
+    if "date_dim" in changed_tables:
+        date_dim_df = transform_date_dim(read_dataset(f"{landing_path}date_dim/"))
+        # The dimension is replaced as a whole rather than appended to
+        output_bucket, _ = split_s3_path(output_path)
+        for obj in list_objects(f"{output_path}date_dim/"):
+            s3.delete_object(Bucket=output_bucket, Key=obj["Key"])
+        pq.write_table(to_arrow(date_dim_df), f"{output_path}date_dim/{JOB_RUN_ID}.parquet".replace("s3://", ""),
+                       filesystem=s3_fs)
+    else:
+        print("date_dim unchanged since the last run. Skipping read, transform and write.")
+
+if "order_items" not in changed_tables:
+    print("order_items unchanged since the last run. No new orders to process. Exiting job.")
+    save_json(s3_fingerprint_path, current_fingerprints)
+    publish_report("unchanged")
+    sys.exit(0)
+
+
+# ==============================
+# Load the new batch
+# ==============================
+last_lpt = load_json(s3_checkpoint_path, {}).get("last_processed_timestamp")
+print(f"Last processed timestamp: {last_lpt}")
+
+with stage("load"):
+    order_item_filter = None
+    if last_lpt:
+        # The landing timestamps are fixed-width ISO 8601 strings, so comparing the strings lets
+        # Parquet statistics skip older row groups; the exact filter runs after parsing
+        lpt = datetime.fromisoformat(last_lpt)
+        order_item_filter = ds.field("creation_time_utc") > lpt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    new_order_item_df = new_order_items(
+        parse_order_items(read_dataset(f"{landing_path}order_items/", ORDER_ITEM_COLUMNS, order_item_filter)),
+        last_lpt,
+    )
+    max_timestamp = new_order_item_df.get_column("creation_time_utc").max()
+
+if max_timestamp is None:
+    print("No new orders to process. Exiting job.")
+    save_json(s3_fingerprint_path, current_fingerprints)
+    publish_report("no_new_orders")
+    sys.exit(0)
+
+with stage("load_options"):
+    order_ids = pa.array(new_order_item_df.get_column("order_id").unique().to_list())
+    new_order_item_options_df = options_for_order_items(
+        read_dataset(f"{landing_path}order_item_options/", ORDER_ITEM_OPTION_COLUMNS,
+                     ds.field("order_id").isin(order_ids)),
+        new_order_item_df,
+    )
+print(f"Batch: {new_order_item_df.height} line items, {new_order_item_options_df.height} options")
+
+with stage("dim_app"):
+    try:
+        existing_dim_app_df = dedupe_dim_app(read_dataset(f"{output_path}dim_app/", ["app_id", "app_name"]))
+    except FileNotFoundError:
+        # First run, no key table yet
+        existing_dim_app_df = pl.DataFrame(schema=DIM_APP_SCHEMA)
+    # New ids would start after a max that is already ambiguous, so stop before writing any fact
+    duplicate_app_ids = shared_app_ids(existing_dim_app_df)
+    if duplicate_app_ids:
+        raise RuntimeError(f"dim_app ids {duplicate_app_ids} belong to more than one app_name; "
+                           f"run repartition-curated-job to renumber dim_app and fact_orders first")
+    new_app_names = unseen_app_names(new_order_item_df, existing_dim_app_df)
+    max_app_id = existing_dim_app_df.get_column("app_id").max() or 0
+    new_dim_app_df = number_new_apps(new_app_names, max_app_id)
+    dim_app_lookup_df = pl.concat([existing_dim_app_df, new_dim_app_df])
+    print(f"dim_app: {len(new_app_names)} new app names, ids from {max_app_id + 1}")
+
+
+# ==============================
+# Fact Tables
+# ==============================
+with stage("facts"):
+    fact_orders_df = build_fact_orders(new_order_item_df, dim_app_lookup_df)
+    fact_items_df = build_fact_items(new_order_item_df)
+    fact_item_options_df = build_fact_item_options(new_order_item_options_df)
+
+
+# ==============================
+# Write Outputs to S3
+# ==============================
+try:
+    with stage("write_dim_app"):
+        # Only the new keys are appended to the key table
+        if new_dim_app_df.height:
+            pq.write_table(to_arrow(new_dim_app_df), f"{output_path}dim_app/{JOB_RUN_ID}.parquet".replace("s3://", ""),
+                           filesystem=s3_fs)
+    for df, table_name in ((fact_orders_df, "fact_orders"),
+                           (fact_items_df, "fact_items"),
+                           (fact_item_options_df, "fact_items_options")):
+        with stage(f"write_{table_name}"):
+            if df.height:
+                write_partitioned(df, table_name, ORDER_DATE_PARTITION_KEYS)
+
+    affected_dates = sorted(new_order_item_df.get_column("creation_time_utc").dt.date().drop_nulls().unique())
+
+    # Rebuilt for the order dates of the batch from the curated facts, as in the Spark job
+    with stage("fact_order_totals"):
+        fact_order_totals_df = build_fact_order_totals(
+            read_partitions("fact_orders", ORDER_DATE_PARTITION_KEYS, order_date_values(affected_dates),
+                            ["order_id", "user_id", "restaurant_id", "is_loyalty", "creation_time_utc", "order_date"]),
+            read_partitions("fact_items", ORDER_DATE_PARTITION_KEYS, order_date_values(affected_dates),
+                            ["order_id", "item_total"]),
+            read_partitions("fact_items_options", ORDER_DATE_PARTITION_KEYS, order_date_values(affected_dates),
+                            ["order_id", "option_price", "option_total"]),
+        )
+        overwrite_partitions(fact_order_totals_df, "fact_order_totals", ORDER_DATE_PARTITION_KEYS,
+                             order_date_values(affected_dates))
+
+    # --------------------------
+    # Revenue Rollups
+    # --------------------------
+    # Same incremental scheme as the Spark job: the days touched by the batch are recomputed
+    # from the curated facts, then their weeks and months from the daily rollup.
+    with stage("agg_revenue_daily"):
+        agg_revenue_daily_df = build_agg_revenue_daily(
+            read_partitions("fact_orders", ORDER_DATE_PARTITION_KEYS, order_date_values(affected_dates),
+                            ["order_id", "restaurant_id"]),
+            read_partitions("fact_items", ORDER_DATE_PARTITION_KEYS, order_date_values(affected_dates),
+                            ["order_id", "item_category", "item_total", "order_date"]),
+        )
+        overwrite_partitions(agg_revenue_daily_df, "agg_revenue_daily", ORDER_DATE_PARTITION_KEYS,
+                             order_date_values(affected_dates))
+
+    daily_columns = ["order_date", "restaurant_id", "item_category", "revenue"]
+    with stage("agg_revenue_weekly"):
+        affected_weeks = sorted({d - timedelta(days=d.weekday()) for d in affected_dates})
+        week_days = [w + timedelta(days=offset) for w in affected_weeks for offset in range(7)]
+        agg_revenue_weekly_df = build_agg_revenue_weekly(
+            read_partitions("agg_revenue_daily", ORDER_DATE_PARTITION_KEYS, order_date_values(week_days), daily_columns))
+        overwrite_partitions(agg_revenue_weekly_df, "agg_revenue_weekly", ["week_start"],
+                             [(w.isoformat(),) for w in affected_weeks])
+
+    with stage("agg_revenue_monthly"):
+        affected_months = sorted({d.replace(day=1) for d in affected_dates})
+        month_days = [date(m.year, m.month, day) for m in affected_months
+                      for day in range(1, calendar.monthrange(m.year, m.month)[1] + 1)]
+        agg_revenue_monthly_df = build_agg_revenue_monthly(
+            read_partitions("agg_revenue_daily", ORDER_DATE_PARTITION_KEYS, order_date_values(month_days), daily_columns))
+        overwrite_partitions(agg_revenue_monthly_df, "agg_revenue_monthly", ["month_start"],
+                             [(m.isoformat(),) for m in affected_months])
+
+    # --------------------------
+    # Update Last Processed Timestamp
+    # --------------------------
+    with stage("checkpoint"):
+        # str() of the batch max, the same format the Spark job stores
+        save_json(s3_checkpoint_path, {"last_processed_timestamp": str(max_timestamp)})
+        print(f"Successfully updated checkpoint: {max_timestamp}")
+        save_json(s3_fingerprint_path, current_fingerprints)
+
+    publish_report("succeeded", batch_bytes=batch_bytes)
+except Exception as e:
+    print(f"Job failed: {str(e)}")
+    publish_report("failed", batch_bytes=batch_bytes)
+    raise
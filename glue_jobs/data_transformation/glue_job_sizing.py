@@ -0,0 +1,272 @@
+import argparse
+import boto3
+import json
+import re
+import time
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+# Picks the worker type, worker count and Spark settings of a Glue job run from the volume
+# waiting for it, for runs started through start_sized_run: the choice is passed to
+# start_job_run as WorkerType/NumberOfWorkers overrides and a --SPARK_CONF argument, and the
+# job definitions keep the jobs.json workers. Profiles live in
+# glue_jobs/glue_job_configs/sizing_profiles.json, ordered from smallest to largest; the
+# first profile whose limits hold is used. Every decision is printed and kept under
+# sizing-decisions/ in the data bucket.
+#
+# Only one caller in this repo goes through it: data-transformation-polars-job imports this
+# module (shipped next to it with --extra-py-files) to size the Spark runs it dispatches.
+# Nothing here schedules data-ingestion-glue-job. Runs started by a console click, a Glue
+# trigger or a workflow keep the jobs.json capacity and no --SPARK_CONF. To size ingestion,
+# the external scheduler has to start it through the command line instead:
+#
+#   python glue_jobs/data_transformation/glue_job_sizing.py data-transformation-job            # show the decision
+#   python glue_jobs/data_transformation/glue_job_sizing.py data-transformation-job --start    # start a run sized by it
+#   python glue_jobs/data_transformation/glue_job_sizing.py data-ingestion-glue-job --start    # what an ingestion schedule runs
+
+# A local path, or the copy buildspec.yml uploads next to the job scripts
+PROFILES_PATH = "glue_jobs/glue_job_configs/sizing_profiles.json"
+
+DATA_BUCKET = "global-partners-de-project2"
+LANDING_PREFIX = "landing-zone/"
+DECISIONS_PREFIX = "sizing-decisions/"
+INGESTION_WATERMARK_KEY = "checkpoints/ingestion_watermark.json"
+TRANSFORMATION_CHECKPOINT_KEY = "checkpoints/fact_orders_lpt.json"
+TRANSFORMATION_FINGERPRINT_KEY = "checkpoints/transformation_fingerprints.json"
+
+LANDING_DATABASE = "landing_zone_db"
+ATHENA_OUTPUT = f"s3://{DATA_BUCKET}/athena-query-results/sizing/"
+ATHENA_TIMEOUT_SECONDS = 120
+
+# Days of landed partitions averaged into the daily ingestion volume
+RECENT_INGEST_DAYS = 7
+INGEST_DATE_PATTERN = re.compile(r"/ingest_date=(\d{4}-\d{2}-\d{2})/")
+
+s3 = boto3.client("s3")
+glue = boto3.client("glue")
+athena = boto3.client("athena")
+
+
+def load_profiles(path=PROFILES_PATH):
+    if path.startswith("s3://"):
+        profiles_bucket, profiles_key = path.replace("s3://", "").split("/", 1)
+        return json.loads(s3.get_object(Bucket=profiles_bucket, Key=profiles_key)["Body"].read())
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_json(key):
+    try:
+        return json.loads(s3.get_object(Bucket=DATA_BUCKET, Key=key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return {}
+
+
+def list_objects(prefix):
+    paginator = s3.get_paginator("list_objects_v2")
+    return [obj for page in paginator.paginate(Bucket=DATA_BUCKET, Prefix=prefix) for obj in page.get("Contents", [])]
+
+
+# --------------------------
+# Volume estimates
+# --------------------------
+def estimate_ingestion(tables):
+    """Bytes the next ingestion window is expected to land.
+
+    The rows past the ingestion watermark are only known to the source database, so the
+    window is estimated from what landed recently: the average bytes per ingest_date over
+    the last few partitions, times the days since the watermark. Reference tables are
+    reloaded whole and count with their current size. Without a watermark the next run
+    is a full load, as large as the landing zone is today.
+    """
+    watermark = load_json(INGESTION_WATERMARK_KEY).get("creation_time_utc")
+    objects = {table_name: list_objects(f"{LANDING_PREFIX}{table_name}/") for table_name in tables}
+    landing_bytes = sum(o["Size"] for table_objects in objects.values() for o in table_objects)
+    if watermark is None:
+        return {"input_bytes": landing_bytes, "pending_rows": None, "landing_bytes": landing_bytes,
+                "basis": "no ingestion watermark, full load"}
+
+    input_bytes = 0
+    daily_bytes = {}
+    for table_objects in objects.values():
+        for o in table_objects:
+            match = INGEST_DATE_PATTERN.search(o["Key"])
+            if match:
+                daily_bytes[match.group(1)] = daily_bytes.get(match.group(1), 0) + o["Size"]
+            else:
+                input_bytes += o["Size"]
+    recent = [daily_bytes[day] for day in sorted(daily_bytes)[-RECENT_INGEST_DAYS:]]
+    bytes_per_day = sum(recent) / len(recent) if recent else 0
+
+    # The watermark is the newest creation_time_utc ingested; anything after it is pending
+    since = datetime.fromisoformat(watermark[:19])
+    pending_days = max((datetime.now(timezone.utc).replace(tzinfo=None) - since).total_seconds() / 86400, 1.0)
+    input_bytes += int(bytes_per_day * pending_days)
+    return {"input_bytes": input_bytes, "pending_rows": None, "landing_bytes": landing_bytes,
+            "basis": f"{bytes_per_day:.0f} bytes/day over {len(recent)} ingest dates x {pending_days:.1f} days "
+                     f"since watermark {watermark}"}
+
+
+def pending_order_rows(last_processed_timestamp):
+    """Landing order_items rows newer than the transformation checkpoint, counted by Athena.
+
+    Orders land on or after the day they were created, so only ingest_date partitions from
+    the checkpoint's day on are scanned. Returns None when the count is not available.
+    """
+    query = (f"SELECT COUNT(*) FROM {LANDING_DATABASE}.order_items "
+             f"WHERE ingest_date >= '{last_processed_timestamp[:10]}' "
+             f"AND from_iso8601_timestamp(creation_time_utc) > CAST('{last_processed_timestamp}' AS timestamp)")
+    try:
+        query_execution_id = athena.start_query_execution(
+            QueryString=query,
+            QueryExecutionContext={"Database": LANDING_DATABASE},
+            ResultConfiguration={"OutputLocation": ATHENA_OUTPUT},
+        )["QueryExecutionId"]
+        deadline = time.time() + ATHENA_TIMEOUT_SECONDS
+        while time.time() < deadline:
+            status = athena.get_query_execution(QueryExecutionId=query_execution_id)["QueryExecution"]["Status"]
+            if status["State"] == "SUCCEEDED":
+                rows = athena.get_query_results(QueryExecutionId=query_execution_id)["ResultSet"]["Rows"]
+                return int(rows[1]["Data"][0]["VarCharValue"])
+            if status["State"] in ("FAILED", "CANCELLED"):
+                print(f"Pending row count {status['State']}: {status.get('StateChangeReason')}")
+                return None
+            time.sleep(2)
+        athena.stop_query_execution(QueryExecutionId=query_execution_id)
+        print(f"Pending row count timed out after {ATHENA_TIMEOUT_SECONDS}s")
+    except ClientError as e:
+        print(f"Could not count pending rows: {e}")
+    return None
+
+
+def estimate_transformation(tables):
+    """Landing bytes written since the last transformation run, plus the order rows past its checkpoint.
+
+    New bytes are the landing objects modified after the fingerprints the last successful
+    run saved, as data-transformation-polars-job measures its batches.
+    """
+    previous_fingerprints = load_json(TRANSFORMATION_FINGERPRINT_KEY)
+    last_processed_timestamp = load_json(TRANSFORMATION_CHECKPOINT_KEY).get("last_processed_timestamp")
+
+    input_bytes = landing_bytes = 0
+    for table_name in tables:
+        objects = list_objects(f"{LANDING_PREFIX}{table_name}/")
+        landing_bytes += sum(o["Size"] for o in objects)
+        since = previous_fingerprints.get(table_name, {}).get("max_last_modified")
+        if since is None:
+            input_bytes += sum(o["Size"] for o in objects)
+        else:
+            since = datetime.fromisoformat(since)
+            input_bytes += sum(o["Size"] for o in objects if o["LastModified"] > since)
+
+    if last_processed_timestamp is None:
+        # First run: everything in the landing zone is pending, the byte count says enough
+        return {"input_bytes": input_bytes, "pending_rows": None, "landing_bytes": landing_bytes,
+                "basis": "no transformation checkpoint, first run"}
+    return {"input_bytes": input_bytes, "pending_rows": pending_order_rows(last_processed_timestamp),
+            "landing_bytes": landing_bytes,
+            "basis": f"landing objects modified since the last run, order rows after {last_processed_timestamp}"}
+
+
+ESTIMATORS = {
+    "data-ingestion-glue-job": estimate_ingestion,
+    "data-transformation-job": estimate_transformation,
+}
+
+
+# --------------------------
+# Decisions
+# --------------------------
+def choose_profile(profiles, input_bytes, pending_rows):
+    """First profile whose limits hold; a null limit, or a row count that is not known, always holds."""
+    input_mb = input_bytes / 1024 ** 2
+    for profile in profiles:
+        max_input_mb = profile.get("max_input_mb")
+        max_pending_rows = profile.get("max_pending_rows")
+        if max_input_mb is not None and input_mb > max_input_mb:
+            continue
+        if max_pending_rows is not None and pending_rows is not None and pending_rows > max_pending_rows:
+            continue
+        return profile
+    # Nothing was large enough: the largest profile is the best there is
+    return profiles[-1]
+
+
+def size_job(job_name, profiles=None):
+    """Estimate the pending volume of job_name and pick its profile."""
+    sizing = (profiles or load_profiles())[job_name]
+    estimate = ESTIMATORS[job_name](sizing["tables"])
+    profile = choose_profile(sizing["profiles"], estimate["input_bytes"], estimate["pending_rows"])
+    return {
+        "job_name": job_name,
+        "decided_at": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+        **estimate,
+        "profile": profile["name"],
+        "WorkerType": profile["WorkerType"],
+        "NumberOfWorkers": profile["NumberOfWorkers"],
+        "spark_conf": profile["spark_conf"],
+    }
+
+
+def log_decision(decision, applied_to):
+    """Print the decision and keep it in the data bucket for auditing."""
+    decision = {**decision, "applied_to": applied_to}
+    rows = "unknown" if decision["pending_rows"] is None else f"{decision['pending_rows']:,}"
+    print(f"Sizing {decision['job_name']} ({applied_to}): {decision['input_bytes'] / 1024 ** 2:,.1f} MB pending, "
+          f"{rows} rows -> profile {decision['profile']}: "
+          f"{decision['NumberOfWorkers']} x {decision['WorkerType']}, {decision['spark_conf']}")
+    print(f"    basis: {decision['basis']}")
+    key = f"{DECISIONS_PREFIX}{decision['job_name']}/{decision['decided_at']}.json"
+    s3.put_object(Bucket=DATA_BUCKET, Key=key, Body=json.dumps(decision, indent=2))
+    return key
+
+
+def spark_conf_argument(decision):
+    # Applied by the job with spark.conf.set, see SPARK_CONF in the job scripts
+    return json.dumps(decision["spark_conf"], sort_keys=True)
+
+
+def start_sized_run(job_name, arguments=None, profiles_path=PROFILES_PATH):
+    """Start a run of job_name with the workers and Spark settings its pending volume calls for.
+
+    A failed estimate never holds the run back: it then starts with the workers of the job
+    definition.
+    """
+    try:
+        decision = size_job(job_name, load_profiles(profiles_path))
+    except Exception as e:
+        print(f"Sizing {job_name} failed, starting it with its configured workers: {e}")
+        job_run_id = glue.start_job_run(JobName=job_name, Arguments=arguments or {})["JobRunId"]
+        print(f"Started {job_name} run {job_run_id}")
+        return job_run_id
+
+    job_run_id = glue.start_job_run(
+        JobName=job_name,
+        Arguments={**(arguments or {}), "--SPARK_CONF": spark_conf_argument(decision)},
+        WorkerType=decision["WorkerType"],
+        NumberOfWorkers=decision["NumberOfWorkers"],
+    )["JobRunId"]
+    try:
+        log_decision({**decision, "job_run_id": job_run_id}, applied_to="job run")
+    except ClientError as e:
+        # The run is already started; a missing audit record must not fail the caller
+        print(f"Could not record the sizing decision: {e}")
+    print(f"Started {job_name} run {job_run_id}")
+    return job_run_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Size a Glue job run from its pending input volume.")
+    parser.add_argument("job_name", choices=sorted(ESTIMATORS))
+    parser.add_argument("--start", action="store_true", help="start a run with the chosen sizing")
+    parser.add_argument("--profiles", default=PROFILES_PATH, help="sizing profiles, a local path or an s3:// URI")
+    args = parser.parse_args(argv)
+
+    if args.start:
+        start_sized_run(args.job_name, profiles_path=args.profiles)
+    else:
+        print(json.dumps(size_job(args.job_name, load_profiles(args.profiles)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+from datetime import datetime
+
+import polars as pl
+
+# Polars counterparts of spark_transforms, one function per Spark transform with the same
+# name, columns and column types, so data-transformation-polars-job writes the same curated
+# tables as the Spark job. Kept free of S3 and catalog access; benchmarks/parity.py runs
+# both modules on the same generated data and compares the results.
+
+ORDER_DATE_PARTITION_KEYS = ["year", "month", "day"]
+DIM_APP_SCHEMA = {"app_id": pl.Int32, "app_name": pl.String}
+
+
+def add_order_date_columns(df, timestamp_col="creation_time_utc"):
+    # Spark's year/month/dayofmonth are ints
+    return df.with_columns(
+        pl.col(timestamp_col).dt.date().alias("order_date"),
+        pl.col(timestamp_col).dt.year().cast(pl.Int32).alias("year"),
+        pl.col(timestamp_col).dt.month().cast(pl.Int32).alias("month"),
+        pl.col(timestamp_col).dt.day().cast(pl.Int32).alias("day"),
+    )
+
+
+def transform_date_dim(date_dim_df):
+    # Unparseable values become null, as with Spark's to_date
+    return date_dim_df.with_columns(
+        pl.col("date_key").str.to_date("%d-%m-%Y", strict=False),
+        pl.col("year").cast(pl.Int32, strict=False),
+    )
+
+
+def parse_order_items(order_item_df):
+    # Convert creation_time_utc from ISO 8601 format to a (UTC, timezone-naive) timestamp
+    return order_item_df.with_columns(
+        pl.col("creation_time_utc").str.to_datetime("%Y-%m-%dT%H:%M:%S%.3fZ", time_unit="us", strict=False)
+    )
+
+
+def new_order_items(order_item_df, last_lpt):
+    """Line items created after the last processed timestamp; all of them on the first run."""
+    if not last_lpt:
+        return order_item_df
+    return order_item_df.filter(pl.col("creation_time_utc") > datetime.fromisoformat(last_lpt))
+
+
+def options_for_order_items(order_item_options_df, order_item_df):
+    # Options of the given line items, carrying the order timestamp for partitioning
+    return order_item_options_df.join(
+        order_item_df.select("order_id", "lineitem_id", "creation_time_utc"),
+        on=["order_id", "lineitem_id"],
+        how="inner",
+    )
+
+
+def dedupe_dim_app(dim_app_df):
+    # Older runs could append the same app_name twice; keep the first id issued for it
+    return (dim_app_df
+            .group_by("app_name")
+            .agg(pl.col("app_id").min())
+            .select(pl.col("app_id").cast(pl.Int32), "app_name"))
+
+
+def shared_app_ids(dim_app_df):
+    """Sorted app_ids issued to more than one app_name."""
+    return sorted(dim_app_df
+                  .group_by("app_id")
+                  .agg(pl.col("app_name").n_unique().alias("app_names"))
+                  .filter(pl.col("app_names") > 1)
+                  .get_column("app_id")
+                  .to_list())
+
+
+def unseen_app_names(order_item_df, dim_app_df):
+    """Sorted app names of the batch that have no id yet."""
+    return sorted(order_item_df
+                  .select("app_name")
+                  .filter(pl.col("app_name").is_not_null())
+                  .unique()
+                  .join(dim_app_df.select("app_name"), on="app_name", how="anti")
+                  .get_column("app_name")
+                  .to_list())
+
+
+def number_new_apps(app_names, max_app_id):
+    # New ids are appended after the current max, so existing ids never change
+    return pl.DataFrame(
+        {"app_id": [max_app_id + offset for offset in range(1, len(app_names) + 1)], "app_name": app_names},
+        schema=DIM_APP_SCHEMA,
+    )
+
+
+def build_fact_orders(order_item_df, dim_app_lookup_df):
+    fact_orders_df = (order_item_df
+                      .join(dim_app_lookup_df, on="app_name", how="inner")
+                      .select("order_id", "app_id", "restaurant_id", "user_id", "printed_card_number",
+                              "is_loyalty", "creation_time_utc", "currency")
+                      .with_columns(pl.col("user_id").fill_null("UNKNOWN"))
+                      .unique(maintain_order=True))
+    return add_order_date_columns(fact_orders_df.rename({"currency": "currency_used"}))
+
+
+def build_fact_items(order_item_df):
+    # Spark's float is a 32-bit float, and int * float stays a float
+    return (add_order_date_columns(order_item_df)
+            .select("lineitem_id", "order_id", "item_category", "item_name", "item_quantity", "item_price",
+                    "order_date", *ORDER_DATE_PARTITION_KEYS)
+            .with_columns(pl.col("item_quantity").cast(pl.Int32, strict=False),
+                          pl.col("item_price").cast(pl.Float32, strict=False))
+            .with_columns((pl.col("item_quantity").cast(pl.Float32) * pl.col("item_price")).alias("item_total")))
+
+
+def build_fact_item_options(order_item_options_df):
+    return (add_order_date_columns(order_item_options_df)
+            .select("lineitem_id", "order_id", "option_group_name", "option_name", "option_quantity", "option_price",
+                    "order_date", *ORDER_DATE_PARTITION_KEYS)
+            .with_columns(pl.col("option_quantity").cast(pl.Float32, strict=False),
+                          pl.col("option_price").cast(pl.Float32, strict=False))
+            .with_columns((pl.col("option_quantity") * pl.col("option_price")).alias("option_total"))
+            .unique(maintain_order=True))
+
+
+def build_fact_order_totals(fact_orders_df, fact_items_df, fact_item_options_df):
+    """One narrow, pre-joined row per order; sums are doubles, as Spark's sum of floats."""
+    item_totals_df = (fact_items_df
+                      .group_by("order_id")
+                      .agg(pl.col("item_total").cast(pl.Float64).sum().alias("item_total")))
+
+    option_totals_df = (fact_item_options_df
+                        .group_by("order_id")
+                        .agg(pl.col("option_total").cast(pl.Float64).sum().alias("option_total"),
+                             (pl.col("option_price") < 0).any().alias("has_discount")))
+
+    return (fact_orders_df
+            .select("order_id", "user_id", "restaurant_id", "is_loyalty",
+                    "creation_time_utc", "order_date", *ORDER_DATE_PARTITION_KEYS)
+            .join(item_totals_df, on="order_id", how="left")
+            .join(option_totals_df, on="order_id", how="left")
+            .with_columns(pl.col("item_total").fill_null(0.0),
+                          pl.col("option_total").fill_null(0.0),
+                          pl.col("has_discount").fill_null(False))
+            .with_columns((pl.col("item_total") + pl.col("option_total")).alias("order_total"))
+            .select("order_id", "user_id", "restaurant_id", "is_loyalty",
+                    "creation_time_utc", "order_date", "item_total", "option_total",
+                    "order_total", "has_discount", *ORDER_DATE_PARTITION_KEYS))
+
+
+def build_agg_revenue_daily(fact_orders_df, fact_items_df):
+    return (fact_orders_df.select("order_id", "restaurant_id")
+            .join(fact_items_df.select("order_id", "item_category", "item_total",
+                                       "order_date", *ORDER_DATE_PARTITION_KEYS), on="order_id", how="inner")
+            .group_by("order_date", "restaurant_id", "item_category", *ORDER_DATE_PARTITION_KEYS)
+            .agg(pl.col("item_total").cast(pl.Float64).fill_null(0.0).sum().alias("revenue"))
+            .select("order_date", "restaurant_id", "item_category", "revenue", *ORDER_DATE_PARTITION_KEYS))
+
+
+def build_agg_revenue_weekly(agg_revenue_daily_df):
+    # Weeks start on Monday, matching DATE_TRUNC('week', ...) in Athena
+    return (agg_revenue_daily_df
+            .with_columns(pl.col("order_date").dt.truncate("1w").alias("week_start"))
+            .group_by("week_start", "restaurant_id", "item_category")
+            .agg(pl.col("revenue").sum())
+            .select("restaurant_id", "item_category", "revenue", "week_start"))
+
+
+def build_agg_revenue_monthly(agg_revenue_daily_df):
+    return (agg_revenue_daily_df
+            .with_columns(pl.col("order_date").dt.month_start().alias("month_start"))
+            .group_by("month_start", "restaurant_id", "item_category")
+            .agg(pl.col("revenue").sum())
+            .select("restaurant_id", "item_category", "revenue", "month_start"))
+
+
+# Same row order as spark_transforms.cluster_for_layout, for min/max row group skipping
+CLUSTER_KEYS = {
+    "fact_orders": ["user_id", "restaurant_id"],
+    "fact_items": ["order_id"],
+    "fact_items_options": ["order_id"],
+}
+
+
+def cluster_for_layout(df, table_name, partition_keys):
+    keys = CLUSTER_KEYS.get(table_name)
+    if not keys:
+        return df
+    return df.sort([*partition_keys, *keys], nulls_last=True)
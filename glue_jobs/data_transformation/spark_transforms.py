@@ -0,0 +1,217 @@
+from pyspark.sql.functions import col, to_date, to_timestamp, year, month, dayofmonth, lit, broadcast
+from pyspark.sql.functions import min as spark_min, max as spark_max, sum as spark_sum, when, coalesce, date_trunc
+from pyspark.sql.functions import countDistinct
+
+# DataFrame-in, DataFrame-out transforms of data-transformation-job. Nothing here touches
+# the GlueContext, S3 or the catalog, so the same code runs inside the Glue job (shipped
+# next to it with --extra-py-files) and on a plain local SparkSession in benchmarks/.
+
+# Fact tables are partitioned by order date so date-bounded queries can prune partitions
+ORDER_DATE_PARTITION_KEYS = ["year", "month", "day"]
+DIM_APP_SCHEMA = "app_id int, app_name string"
+
+
+def add_order_date_columns(df, timestamp_col="creation_time_utc"):
+    return (df
+            .withColumn("order_date", to_date(col(timestamp_col)))
+            .withColumn("year", year(col(timestamp_col)))
+            .withColumn("month", month(col(timestamp_col)))
+            .withColumn("day", dayofmonth(col(timestamp_col))))
+
+
+def transform_date_dim(date_dim_df):
+    # Proper datatypes for the date dimension
+    return (date_dim_df
+            .withColumn("date_key", to_date(col("date_key"), "dd-MM-yyyy"))
+            .withColumn("year", col("year").cast("int")))
+
+
+def parse_order_items(order_item_df):
+    # Convert creation_time_utc from ISO 8601 format to Spark timestamp
+    return order_item_df.withColumn(
+        "creation_time_utc",
+        to_timestamp(col("creation_time_utc"), "yyyy-MM-dd'T'HH:mm:ss.SSS'Z'")
+    )
+
+
+def new_order_items(order_item_df, last_lpt):
+    """Line items created after the last processed timestamp; all of them on the first run."""
+    if not last_lpt:
+        return order_item_df
+    return order_item_df.filter(col("creation_time_utc") > lit(last_lpt).cast("timestamp"))
+
+
+def options_for_order_items(order_item_options_df, order_item_df):
+    # Options of the given line items, carrying the order timestamp for partitioning
+    return order_item_options_df.join(
+        order_item_df.select("order_id", "lineitem_id", "creation_time_utc"),
+        ["order_id", "lineitem_id"],
+        "inner"
+    )
+
+
+def dedupe_dim_app(dim_app_df):
+    # Older runs could append the same app_name twice; keep the first id issued for it
+    return (dim_app_df
+            .groupBy("app_name")
+            .agg(spark_min("app_id").alias("app_id"))
+            .select("app_id", "app_name"))
+
+
+def shared_app_ids(dim_app_df):
+    """Sorted app_ids issued to more than one app_name.
+
+    The baseline job numbered dim_app from 1 in every batch, so a key table that predates
+    the persistent ids can reuse an id; repartition-curated-job renumbers it once.
+    """
+    return sorted(
+        row["app_id"] for row in dim_app_df
+        .groupBy("app_id")
+        .agg(countDistinct("app_name").alias("app_names"))
+        .filter(col("app_names") > 1)
+        .collect()
+    )
+
+
+def unseen_app_names(order_item_df, dim_app_df):
+    """Sorted app names of the batch that have no id yet.
+
+    The handful of new names is collected to the driver instead of numbering them
+    with an unpartitioned window.
+    """
+    return sorted(
+        row["app_name"] for row in order_item_df.select("app_name")
+        .filter(col("app_name").isNotNull())
+        .distinct()
+        .join(dim_app_df, "app_name", "left_anti")
+        .collect()
+    )
+
+
+def number_new_apps(spark, app_names, max_app_id):
+    # New ids are appended after the current max, so existing ids never change
+    return spark.createDataFrame(
+        [(max_app_id + offset, app_name) for offset, app_name in enumerate(app_names, start=1)],
+        schema=DIM_APP_SCHEMA
+    )
+
+
+def build_fact_orders(order_item_df, dim_app_lookup_df):
+    fact_orders_df = (order_item_df
+                      .join(broadcast(dim_app_lookup_df), "app_name", "inner")
+                      .select("order_id", "app_id", "restaurant_id", "user_id", "printed_card_number",
+                              "is_loyalty", "creation_time_utc", "currency")
+                      .fillna({"user_id": "UNKNOWN"})
+                      .dropDuplicates())
+    return add_order_date_columns(fact_orders_df.withColumnRenamed("currency", "currency_used"))
+
+
+def build_fact_items(order_item_df):
+    return (add_order_date_columns(order_item_df)
+            .select("lineitem_id", "order_id", "item_category", "item_name", "item_quantity", "item_price",
+                    "order_date", *ORDER_DATE_PARTITION_KEYS)
+            .withColumn("item_quantity", col("item_quantity").cast("int"))
+            .withColumn("item_price", col("item_price").cast("float"))
+            .withColumn("item_total", col("item_quantity") * col("item_price")))
+
+
+def build_fact_item_options(order_item_options_df):
+    return (add_order_date_columns(order_item_options_df)
+            .select("lineitem_id", "order_id", "option_group_name", "option_name", "option_quantity", "option_price",
+                    "order_date", *ORDER_DATE_PARTITION_KEYS)
+            .withColumn("option_quantity", col("option_quantity").cast("float"))
+            .withColumn("option_price", col("option_price").cast("float"))
+            .withColumn("option_total", col("option_quantity") * col("option_price"))
+            .dropDuplicates())
+
+
+def build_fact_order_totals(fact_orders_df, fact_items_df, fact_item_options_df):
+    """One narrow, pre-joined row per order, so the analyses stop re-aggregating the item facts.
+
+    The totals are only as complete as the facts passed in, so the jobs build them from the
+    curated partitions of the order dates a batch touched rather than from the batch alone.
+    """
+    item_totals_df = (fact_items_df
+                      .groupBy("order_id")
+                      .agg(spark_sum("item_total").alias("item_total")))
+
+    option_totals_df = (fact_item_options_df
+                        .groupBy("order_id")
+                        .agg(spark_sum("option_total").alias("option_total"),
+                             spark_max(when(col("option_price") < 0, 1).otherwise(0)).alias("has_discount")))
+
+    return (fact_orders_df
+            .select("order_id", "user_id", "restaurant_id", "is_loyalty",
+                    "creation_time_utc", "order_date", *ORDER_DATE_PARTITION_KEYS)
+            .join(item_totals_df, "order_id", "left")
+            .join(option_totals_df, "order_id", "left")
+            .fillna({"item_total": 0.0, "option_total": 0.0, "has_discount": 0})
+            .withColumn("order_total", col("item_total") + col("option_total"))
+            .withColumn("has_discount", col("has_discount").cast("boolean"))
+            .select("order_id", "user_id", "restaurant_id", "is_loyalty",
+                    "creation_time_utc", "order_date", "item_total", "option_total",
+                    "order_total", "has_discount", *ORDER_DATE_PARTITION_KEYS))
+
+
+def build_agg_revenue_daily(fact_orders_df, fact_items_df):
+    return (fact_orders_df.select("order_id", "restaurant_id")
+            .join(fact_items_df.select("order_id", "item_category", "item_total",
+                                       "order_date", *ORDER_DATE_PARTITION_KEYS), "order_id")
+            .groupBy("order_date", "restaurant_id", "item_category", *ORDER_DATE_PARTITION_KEYS)
+            .agg(spark_sum(coalesce(col("item_total"), lit(0.0))).alias("revenue"))
+            .select("order_date", "restaurant_id", "item_category", "revenue", *ORDER_DATE_PARTITION_KEYS))
+
+
+def build_agg_revenue_weekly(agg_revenue_daily_df):
+    # Weeks start on Monday, matching DATE_TRUNC('week', ...) in Athena
+    return (agg_revenue_daily_df
+            .withColumn("week_start", to_date(date_trunc("week", col("order_date"))))
+            .groupBy("week_start", "restaurant_id", "item_category")
+            .agg(spark_sum("revenue").alias("revenue"))
+            .select("restaurant_id", "item_category", "revenue", "week_start"))
+
+
+def build_agg_revenue_monthly(agg_revenue_daily_df):
+    return (agg_revenue_daily_df
+            .withColumn("month_start", to_date(date_trunc("month", col("order_date"))))
+            .groupBy("month_start", "restaurant_id", "item_category")
+            .agg(spark_sum("revenue").alias("revenue"))
+            .select("restaurant_id", "item_category", "revenue", "month_start"))
+
+
+# Row order of the curated fact files. Files sorted by the lookup keys get tight Parquet
+# min/max statistics per row group, so Athena skips the row groups a user, restaurant or
+# order cannot be in. Files written by Spark with parquet_layout_conf also get bloom filters
+# on the same keys, which cover values inside a row group's range. The Polars job sorts the
+# same way but writes no bloom filters (see benchmarks/parity.py).
+CLUSTER_KEYS = {
+    "fact_orders": ["user_id", "restaurant_id"],
+    "fact_items": ["order_id"],
+    "fact_items_options": ["order_id"],
+}
+# Expected distinct values per file, which sizes each column's bloom filter in the Spark writer
+BLOOM_FILTER_NDV = {"user_id": 100000, "restaurant_id": 5000, "order_id": 500000}
+
+
+def cluster_for_layout(df, table_name, partition_keys):
+    """Range-split and sort df by the table's cluster keys; tables without any are returned as they are."""
+    keys = CLUSTER_KEYS.get(table_name)
+    if not keys:
+        return df
+    # Each task, and so each file, holds its own slice of the keys. Leading with the partition
+    # keys gives the writer the order it needs, so it does not sort again.
+    return (df
+            .repartitionByRange(*partition_keys, *keys)
+            .sortWithinPartitions(*partition_keys, *keys))
+
+
+def parquet_layout_conf(block_size_bytes):
+    """Spark Parquet writer options for clustered files: row group size and bloom filters on the cluster keys.
+
+    Passed to DataFrameWriter.options, so they apply to that write and not to the session.
+    """
+    conf = {"parquet.block.size": str(block_size_bytes)}
+    for column, ndv in BLOOM_FILTER_NDV.items():
+        conf[f"parquet.bloom.filter.enabled#{column}"] = "true"
+        conf[f"parquet.bloom.filter.expected.ndv#{column}"] = str(ndv)
+    return conf
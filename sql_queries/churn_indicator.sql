@@ -1,20 +1,14 @@
+-- Order totals come from fact_order_totals, where an order without options is worth its
+-- items. Before that table, this query computed COALESCE(item_total + option_total, 0),
+-- which made such orders zero-spend; monthly_total and pct_change_last_month changed
+-- accordingly, the order dates and activity_status did not.
 WITH customer_orders AS (
     SELECT
-        o.user_id,
-        o.order_id,
-        DATE(o.creation_time_utc) AS order_date,
-        COALESCE(i.item_total + op.option_total, 0) AS order_total
-    FROM fact_orders o
-    LEFT JOIN (
-        SELECT order_id, SUM(item_total) AS item_total
-        FROM fact_items
-        GROUP BY order_id
-    ) i ON o.order_id = i.order_id
-    LEFT JOIN (
-        SELECT order_id, SUM(option_total) AS option_total
-        FROM fact_items_options
-        GROUP BY order_id
-    ) op ON o.order_id = op.order_id
+        user_id,
+        order_id,
+        order_date,
+        order_total
+    FROM fact_order_totals
 ),
 orders_with_previous AS (
     -- Add previous order date per user
@@ -0,0 +1,16 @@
+-- Shared intermediate: per-user spend and activity.
+-- Built once per run as a Parquet table named after this file, then read by
+-- customer_lifetime_value and customer_segmentation_behavior.
+
+SELECT
+    user_id,
+    SUM(item_total)   AS total_item_cost,
+    SUM(option_total) AS total_option_cost,
+    SUM(order_total)  AS total_cost_per_user,
+    MAX(creation_time_utc) AS last_purchase_date,
+    SUM(CASE
+        WHEN creation_time_utc >= date_add('month', -24, current_date) THEN 1
+        ELSE 0
+    END) AS num_purchases_last_24_months
+FROM fact_order_totals
+GROUP BY user_id
@@ -11,21 +11,11 @@
 
 WITH order_totals AS (
     SELECT
-        o.user_id,
-        o.is_loyalty,  -- true = loyalty member, false = non-member
-        o.order_id,
-        COALESCE(i.item_total, 0) + COALESCE(op.option_total, 0) AS order_total
-    FROM fact_orders o
-    LEFT JOIN (
-        SELECT order_id, SUM(item_total) AS item_total
-        FROM fact_items
-        GROUP BY order_id
-    ) i ON o.order_id = i.order_id
-    LEFT JOIN (
-        SELECT order_id, SUM(option_total) AS option_total
-        FROM fact_items_options
-        GROUP BY order_id
-    ) op ON o.order_id = op.order_id
+        user_id,
+        is_loyalty,  -- true = loyalty member, false = non-member
+        order_id,
+        order_total
+    FROM fact_order_totals
 ),
 customer_stats AS (
     SELECT
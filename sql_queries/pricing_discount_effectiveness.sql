@@ -9,29 +9,17 @@
 
 WITH order_totals AS (
     SELECT
-        o.order_id,
-        o.user_id,
-        o.restaurant_id,
-        SUM(i.item_total) AS item_total,
-        SUM(COALESCE(op.option_total, 0)) AS option_total,
-        SUM(i.item_total + COALESCE(op.option_total, 0)) AS order_total,
-        MAX(COALESCE(op.has_discount, 0)) AS has_discount
-    FROM fact_orders o
-    LEFT JOIN (
-        SELECT order_id, SUM(item_total) AS item_total
-        FROM fact_items
-        GROUP BY order_id
-    ) i ON o.order_id = i.order_id
-    LEFT JOIN (
-        SELECT order_id, SUM(option_total) AS option_total,
-        MAX(CASE WHEN option_price < 0 THEN 1 ELSE 0 END) AS has_discount
-        FROM fact_items_options
-        GROUP BY order_id
-    ) op ON o.order_id = op.order_id
-    GROUP BY o.order_id, o.user_id, o.restaurant_id
+        order_id,
+        user_id,
+        restaurant_id,
+        item_total,
+        option_total,
+        order_total,
+        has_discount  -- true when any option on the order has a negative price
+    FROM fact_order_totals
 )
 SELECT
-    CASE WHEN has_discount = 1 THEN 'Discounted Order'
+    CASE WHEN has_discount THEN 'Discounted Order'
     ELSE 'Non-Discounted Order'
     END as order_type,
     COUNT(DISTINCT order_id) AS total_orders,
@@ -7,64 +7,43 @@
 --  • Menu category (if available)
 --  • Time of day (optional)
 
-WITH order_revenue AS (
-    SELECT 
-        o.order_id,
-        DATE(o.creation_time_utc) AS order_date,
-        o.restaurant_id,
-        i.item_category,
-        COALESCE(i.item_total, 0) as order_total
-    FROM fact_orders o
-    JOIN fact_items i ON o.order_id = i.order_id
-),
-daily_revenue AS (
-    SELECT
-        order_date,
-        restaurant_id,
-        item_category,
-        SUM(order_total) AS daily_total
-    FROM order_revenue
-    GROUP BY order_date, restaurant_id, item_category
-),
-weekly_revenue AS (
-    SELECT
-        DATE_TRUNC('week', order_date) AS week_start,
-        restaurant_id,
-        item_category,
-        SUM(order_total) AS weekly_total
-    FROM order_revenue
-    GROUP BY DATE_TRUNC('week', order_date), restaurant_id, item_category
-),
-monthly_revenue AS (
-    SELECT
-        DATE_TRUNC('month', order_date) AS month_start,
-        restaurant_id,
-        item_category,
-        SUM(order_total) AS monthly_total
-    FROM order_revenue
-    GROUP BY DATE_TRUNC('month', order_date), restaurant_id, item_category
+-- The rollups are maintained incrementally by data-transformation-job
+-- (agg_revenue_daily, agg_revenue_weekly, agg_revenue_monthly), so this
+-- query only reads the pre-aggregated tables.
+-- Daily points cover the year up to the latest order date in agg_revenue_daily;
+-- older periods are served by the weekly and monthly rows. The window follows the
+-- data rather than current_date, so a history without orders in the last calendar
+-- year still has a daily series. The year bound lets Athena's dynamic filtering skip
+-- older partitions, the order_date one trims the first year exactly.
+
+WITH daily_window AS (
+    SELECT max(order_date) - INTERVAL '365' DAY AS window_start
+    FROM agg_revenue_daily
 )
 SELECT 
     'Daily' AS period_type,
-    order_date AS period_start,
-    restaurant_id,
-    item_category,
-    daily_total AS revenue
-FROM daily_revenue
+    d.order_date AS period_start,
+    d.restaurant_id,
+    d.item_category,
+    d.revenue
+FROM agg_revenue_daily d
+CROSS JOIN daily_window w
+WHERE d.year >= year(w.window_start)
+    AND d.order_date >= w.window_start
 UNION ALL
 SELECT
     'Weekly' AS period_type,
     week_start AS period_start,
     restaurant_id,
     item_category,
-    weekly_total AS revenue
-FROM weekly_revenue
+    revenue
+FROM agg_revenue_weekly
 UNION ALL
 SELECT
     'Monthly' AS period_type,
     month_start AS period_start,
     restaurant_id,
     item_category,
-    monthly_total AS revenue
-FROM monthly_revenue
+    revenue
+FROM agg_revenue_monthly
 ORDER BY period_start, restaurant_id, item_category;
@@ -12,21 +12,11 @@
 
 WITH order_totals AS (
     SELECT
-        o.order_id,
-        o.restaurant_id AS location_id,
-        DATE(o.creation_time_utc) AS order_date,
-        COALESCE(i.item_total, 0) + COALESCE(op.option_total, 0) AS order_total
-    FROM fact_orders o
-    LEFT JOIN (
-        SELECT order_id, SUM(item_total) AS item_total
-        FROM fact_items
-        GROUP BY order_id
-    ) i ON o.order_id = i.order_id
-    LEFT JOIN (
-        SELECT order_id, SUM(option_total) AS option_total
-        FROM fact_items_options
-        GROUP BY order_id
-    ) op ON o.order_id = op.order_id
+        order_id,
+        restaurant_id AS location_id,
+        order_date,
+        order_total
+    FROM fact_order_totals
 ),
 location_stats AS (
     SELECT
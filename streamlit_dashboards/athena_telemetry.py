@@ -0,0 +1,114 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from data_access import load_query_metrics
+
+# Athena bills $5 per TB scanned, rounded up to at least 10 MB per query
+USD_PER_TB = 5.0
+MIN_BILLED_BYTES = 10 * 1024 ** 2
+# Runs compared against the earlier history in the latency trend
+RECENT_RUNS = 5
+
+LATENCY_METRICS = {
+    "Engine execution": "engine_execution_ms",
+    "Total execution": "total_execution_ms",
+    "Queue": "queue_ms",
+    "Planning": "planning_ms",
+}
+
+
+def latency_trend(df, column, recent_runs=RECENT_RUNS):
+    """Median of the last recent_runs executions per query against the median of the ones before."""
+    rows = []
+    for query_name, runs in df.sort_values("recorded_at").groupby("query_name"):
+        seconds = runs[column].dropna() / 1000
+        recent, earlier = seconds.tail(recent_runs), seconds.iloc[:-recent_runs]
+        rows.append({
+            "query_name": query_name,
+            "executions": len(seconds),
+            "recent_median_s": recent.median(),
+            "earlier_median_s": earlier.median() if not earlier.empty else float("nan"),
+            "latest_s": seconds.iloc[-1] if not seconds.empty else float("nan"),
+        })
+    trend = pd.DataFrame(rows)
+    if trend.empty:
+        return trend
+    trend["change_pct"] = ((trend["recent_median_s"] / trend["earlier_median_s"] - 1) * 100).round(1)
+    return trend.sort_values(["change_pct", "recent_median_s"], ascending=False, na_position="last")
+
+
+def athena_telemetry(bucket):
+    st.title("Athena Query Telemetry")
+
+    try:
+        df = load_query_metrics(bucket)
+    except FileNotFoundError:
+        st.error("No execution statistics recorded yet. athena-query-runner writes them after every run.")
+        return
+    if df.empty:
+        st.info("No executions recorded yet.")
+        return
+
+    days = st.slider("Days of history", min_value=1, max_value=90, value=30)
+    df = df[df["recorded_at"] >= df["recorded_at"].max() - pd.Timedelta(days=days)]
+    df = df.assign(
+        scanned_gib=df["data_scanned_bytes"].fillna(0) / 1024 ** 3,
+        estimated_cost_usd=df["data_scanned_bytes"].fillna(0).clip(lower=MIN_BILLED_BYTES) / 1e12 * USD_PER_TB,
+    )
+
+    # Key metrics
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Runner Runs", df["run_id"].nunique())
+    with col2:
+        st.metric("Data Scanned", f"{df['scanned_gib'].sum():,.2f} GiB")
+    with col3:
+        st.metric("Estimated Cost", f"${df['estimated_cost_usd'].sum():,.2f}")
+    with col4:
+        st.metric("Failed Executions", int((df["state"] != "SUCCEEDED").sum()))
+
+    # --- Cost: ranked by bytes scanned ---
+    st.markdown("### Queries Ranked by Data Scanned")
+    ranking = (df.sort_values("recorded_at")
+               .groupby("query_name")
+               .agg(kind=("kind", "last"),
+                    executions=("query_execution_id", "count"),
+                    total_scanned_gib=("scanned_gib", "sum"),
+                    avg_scanned_gib=("scanned_gib", "mean"),
+                    estimated_cost_usd=("estimated_cost_usd", "sum"),
+                    last_row_count=("row_count", "last"),
+                    sql_versions=("sql_hash", "nunique"))
+               .sort_values("total_scanned_gib", ascending=False)
+               .reset_index())
+    st.dataframe(ranking.round(4), use_container_width=True, hide_index=True)
+
+    fig1 = px.bar(ranking, x="query_name", y="total_scanned_gib", color="kind",
+                  title="Data Scanned per Query (GiB)", text_auto=".2f")
+    st.plotly_chart(fig1, use_container_width=True)
+
+    # --- Latency: trend over time ---
+    st.markdown("### Latency Trend")
+    metric_label = st.selectbox("Latency metric", list(LATENCY_METRICS))
+    column = LATENCY_METRICS[metric_label]
+    # Failed and cancelled executions stop early and would flatter the trend
+    succeeded = df[df["state"] == "SUCCEEDED"]
+
+    st.markdown(f"Median of the last {RECENT_RUNS} executions against the earlier ones, slowest-growing first")
+    st.dataframe(latency_trend(succeeded, column), use_container_width=True, hide_index=True)
+
+    trend_df = succeeded.sort_values("recorded_at").assign(seconds=succeeded[column] / 1000)
+    fig2 = px.line(trend_df, x="recorded_at", y="seconds", color="query_name", markers=True,
+                   hover_data=["sql_hash", "data_scanned_bytes", "row_count"],
+                   title=f"{metric_label} Time per Execution (s)")
+    st.plotly_chart(fig2, use_container_width=True)
+
+    # Where the time of the latest run went
+    latest = succeeded[succeeded["run_id"] == succeeded["run_id"].max()]
+    # Athena counts planning inside the engine time
+    latest = latest.assign(execution_ms=latest["engine_execution_ms"] - latest["planning_ms"].fillna(0))
+    breakdown = latest.melt(id_vars="query_name",
+                            value_vars=["queue_ms", "planning_ms", "execution_ms", "service_processing_ms"],
+                            var_name="phase", value_name="ms")
+    fig3 = px.bar(breakdown, x="query_name", y="ms", color="phase",
+                  title=f"Latest Run ({latest['run_id'].max()}) Time Breakdown (ms)")
+    st.plotly_chart(fig3, use_container_width=True)
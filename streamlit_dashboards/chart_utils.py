@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+# Helpers that keep chart rendering off the rerun path: a shape-preserving downsampler
+# for long time series, a small process-wide cache of rendered figures, and binned
+# WebGL scatter plots for per-user results.
+
+# Points drawn per line chart after downsampling
+POINT_BUDGET = int(os.environ.get("DASHBOARD_CHART_POINTS", "500"))
+MAX_RENDERED_FIGURES = 64
+# Above this many rows a scatter is drawn as 2-D bins instead of one marker per row
+SCATTER_MAX_POINTS = int(os.environ.get("DASHBOARD_SCATTER_MAX_POINTS", "20000"))
+DENSITY_BINS = int(os.environ.get("DASHBOARD_DENSITY_BINS", "60"))
+
+_rendered = OrderedDict()
+_binned = OrderedDict()
+_lock = threading.Lock()
+
+
+def lttb_indices(x, y, threshold=POINT_BUDGET):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    x must be sorted; datetimes are handled through their integer representation. The
+    first and last points are always kept, and from every bucket in between the point
+    forming the largest triangle with its neighbours, so peaks and troughs survive.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    xs = np.asarray(x)
+    if np.issubdtype(xs.dtype, np.datetime64):
+        xs = xs.astype("int64")
+    xs = xs.astype("float64")
+    ys = np.asarray(y, dtype="float64")
+
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype="int64")
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int(np.floor((i + 1) * every)) + 1
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x, avg_y = xs[next_start:next_end].mean(), ys[next_start:next_end].mean()
+
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        area = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def render_cached(key, draw):
+    """PNG bytes of the figure returned by draw(), rendered once per key.
+
+    key must capture everything the figure depends on, including the version of the data.
+    """
+    with _lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key]
+
+    fig = draw()
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+
+    with _lock:
+        _rendered[key] = buffer.getvalue()
+        while len(_rendered) > MAX_RENDERED_FIGURES:
+            _rendered.popitem(last=False)
+    return _rendered[key]
+
+
+def density_bins(df, x, y, color, version, bins=DENSITY_BINS):
+    """Per-colour 2-D histogram of df on shared edges, computed once per data version.
+
+    Returns one row per non-empty bin with its centre and row count.
+    """
+    key = (version, x, y, color, bins)
+    with _lock:
+        if key in _binned:
+            _binned.move_to_end(key)
+            return _binned[key]
+
+    data = df[[x, y, color]].dropna()
+    x_edges = np.histogram_bin_edges(data[x], bins)
+    y_edges = np.histogram_bin_edges(data[y], bins)
+    frames = []
+    for group, part in data.groupby(color, observed=True):
+        counts, _, _ = np.histogram2d(part[x], part[y], bins=[x_edges, y_edges])
+        xi, yi = np.nonzero(counts)
+        frames.append(pd.DataFrame({
+            color: group,
+            x: (x_edges[xi] + x_edges[xi + 1]) / 2,
+            y: (y_edges[yi] + y_edges[yi + 1]) / 2,
+            "count": counts[xi, yi].astype("int64"),
+        }))
+    result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[color, x, y, "count"])
+
+    with _lock:
+        _binned[key] = result
+        while len(_binned) > MAX_RENDERED_FIGURES:
+            _binned.popitem(last=False)
+    return result
+
+
+def scatter_or_density(df, x, y, color, version, title, labels=None, hover_data=None, size=None, key=None):
+    """One marker per row for small frames; above SCATTER_MAX_POINTS, binned markers sized
+    by row count, with box selection drilling down to the rows inside the selected region."""
+    if len(df) <= SCATTER_MAX_POINTS:
+        fig = px.scatter(df, x=x, y=y, color=color, size=size, hover_data=hover_data, labels=labels, title=title)
+        st.plotly_chart(fig, use_container_width=True)
+        return
+
+    bins = density_bins(df, x, y, color, version)
+    fig = px.scatter(bins, x=x, y=y, color=color, size="count", hover_data={"count": ":,"},
+                     labels=labels, title=f"{title} ({len(df):,} rows, binned)", render_mode="webgl")
+    event = st.plotly_chart(fig, use_container_width=True, on_select="rerun", selection_mode="box", key=key)
+    st.caption("Box-select a region to see the individual rows in it.")
+
+    boxes = event.selection.box if event else []
+    if not boxes:
+        return
+    (x0, x1), (y0, y1) = sorted(boxes[0]["x"]), sorted(boxes[0]["y"])
+    region = df[df[x].between(x0, x1) & df[y].between(y0, y1)]
+    st.write(f"{len(region):,} rows in the selected region"
+             + (f", showing the first {SCATTER_MAX_POINTS:,}" if len(region) > SCATTER_MAX_POINTS else ""))
+    fig = px.scatter(region.head(SCATTER_MAX_POINTS), x=x, y=y, color=color, size=size, hover_data=hover_data,
+                     labels=labels, title=f"{title} (selected region)", render_mode="webgl")
+    st.plotly_chart(fig, use_container_width=True)
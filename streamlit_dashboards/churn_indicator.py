@@ -1,29 +1,16 @@
 import streamlit as st
 import pandas as pd
-import boto3
 import plotly.express as px
-from io import StringIO
+from data_access import dataset_version, load_dataset
+from chart_utils import scatter_or_density
 
 
-s3 = boto3.client('s3')
-
 def churn_indicator(bucket):
-    st.set_page_config(page_title="Churn Indicator Dashboard", layout="wide")
     st.title("Churn Indicator Dashboard")
 
     st.write("Identify customers at risk based on recency, frequency, and spend trends.")
     
-    prefix = "athena-query-results/churn_indicator/"
-    s3.list_objects_v2(Bucket=bucket, Prefix=prefix).get('Contents', [])
-    file = None
-    for f in s3.list_objects_v2(Bucket=bucket, Prefix=prefix).get('Contents', []):
-        if f['Key'].endswith('.csv'):
-              file = f['Key'] 
-              break
-    
-        # Get the object from S3
-    response = s3.get_object(Bucket=bucket, Key=file)
-    df = pd.read_csv(StringIO(response['Body'].read().decode("utf-8")))
+    df = load_dataset(bucket, "churn_indicator")
     # st.dataframe(df.head(10))  # sample table 
 
 
@@ -61,16 +48,18 @@ def churn_indicator(bucket):
     #     st.plotly_chart(fig3, use_container_width=True)
 
     # Visualization 4: Scatter Plot - Churn Risk Profile
+    # Large customer bases are binned, with drill-down into a selected region
     if "avg_days_between_orders" in df.columns:
-        fig4 = px.scatter(
-            df, 
-            x="avg_days_between_orders", 
+        scatter_or_density(
+            df,
+            x="avg_days_between_orders",
             y="days_since_last_order",
             color="activity_status",
+            version=dataset_version(bucket, "churn_indicator"),
             hover_data=["user_id"],
-            title="Customer Churn Risk Profile"
+            title="Customer Churn Risk Profile",
+            key="churn_risk_profile",
         )
-        st.plotly_chart(fig4, use_container_width=True)   
 
     # Data Table
     st.subheader("Customer Activity Details")
@@ -1,58 +1,47 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import boto3
-from io import StringIO
+from data_access import dataset_version, load_dataset
+from chart_utils import scatter_or_density
 
 
-s3 = boto3.client('s3')
-
 def customer_segmentation(bucket):
-    st.set_page_config(page_title="Customer Segmentation Dashboard", layout="wide")
     st.title("Customer Segmentation Dashboard")
     st.header("RFM Segmentation")
     st.write("Low Monetary Rank - High Spending")
     st.write("Low Frequency Rank - High Order Count In Last 24 Months")
     st.write("Low Recency Rank - Few Days Passed Since Last Order")
 
-    prefix = "athena-query-results/customer_segmentation_behavior/"
-    s3.list_objects_v2(Bucket=bucket, Prefix=prefix).get('Contents', [])
-    file = None
-    for f in s3.list_objects_v2(Bucket=bucket, Prefix=prefix).get('Contents', []):
-        if f['Key'].endswith('.csv'):
-              file = f['Key'] 
-              break
-    
-    # Get the object from S3
-    response = s3.get_object(Bucket=bucket, Key=file)
-    df = pd.read_csv(StringIO(response['Body'].read().decode("utf-8")))
+    df = load_dataset(bucket, "customer_segmentation_behavior")
     st.dataframe(df.head(20)) # sample table
 
     # --- Scatter Plot: Customer-level view ---
     st.subheader("Customer Distribution (RFM Scatter)")
 
-    fig_scatter = px.scatter(
+    # Large customer bases are binned, with drill-down into a selected region
+    scatter_or_density(
         df,
         x="days_passed",
         y="num_purchases_last_24_months",
         size="total_cost_per_user",
         color="customer_segment",
+        version=dataset_version(bucket, "customer_segmentation_behavior"),
         hover_data=["user_id", "total_cost_per_user"],
         labels={
             "days_passed": "Recency (days since last purchase)",
             "num_purchases_last_24_months": "Frequency (purchases last 24 months)",
             "total_cost_per_user": "Monetary (total spend)"
         },
-        title="Customer Segmentation by RFM"
+        title="Customer Segmentation by RFM",
+        key="rfm_scatter",
     )
-    st.plotly_chart(fig_scatter, use_container_width=True)
 
     # --- Segment Summary: Aggregated view ---
     st.subheader("Customer Segment Summary")
 
     # Bar Chart: Count of customers per segment
     fig_bar = px.bar(
-        df.groupby("customer_segment")["user_id"].count().reset_index(),
+        df.groupby("customer_segment", observed=True)["user_id"].count().reset_index(),
         x="customer_segment",
         y="user_id",
         text="user_id",
@@ -63,7 +52,7 @@ def customer_segmentation(bucket):
 
     # Pie Chart: Revenue share per segment
     fig_pie = px.pie(
-        df.groupby("customer_segment")["total_cost_per_user"].sum().reset_index(),
+        df.groupby("customer_segment", observed=True)["total_cost_per_user"].sum().reset_index(),
         values="total_cost_per_user",
         names="customer_segment",
         title="Revenue Contribution by Segment",
@@ -73,7 +62,7 @@ def customer_segmentation(bucket):
 
     # Table: Avg RFM values per segment
     segment_summary = (
-        df.groupby("customer_segment")
+        df.groupby("customer_segment", observed=True)
         .agg(
             avg_recency=("days_passed", "mean"),
             avg_frequency=("num_purchases_last_24_months", "mean"),
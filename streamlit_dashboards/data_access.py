@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+
+import boto3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from pyarrow import fs
+
+# Single entry point for the dashboards' data. Every page loads its datasets through
+# load_dataset, which keeps them in a process-wide cache shared by all sessions:
+# - within DATA_TTL_SECONDS a dataset is served from memory, without touching S3;
+# - after that, the query's latest.json manifest is revalidated with its ETag, and the
+#   data files are only downloaded again when the runner has published a new result.
+# Results are resolved through the manifest the runner publishes after every successful
+# run, so no prefix is ever listed. Parquet results are read with column projection; CSV
+# results are streamed from S3 into pyarrow's parser with the dataset's declared types.
+
+RESULTS_PREFIX = "athena-query-results/"
+# Execution statistics appended by the query runner, one Parquet file per run
+METRICS_PREFIX = "athena-metrics/"
+DATA_TTL_SECONDS = float(os.environ.get("DASHBOARD_DATA_TTL_SECONDS", "300"))
+
+# One pooled client for every page and session; boto3 clients are thread-safe
+s3 = boto3.client('s3', config=Config(
+    max_pool_connections=int(os.environ.get("DASHBOARD_S3_POOL_SIZE", "32")),
+    retries={"max_attempts": 5, "mode": "adaptive"},
+))
+s3_fs = fs.S3FileSystem(region=boto3.session.Session().region_name or "us-east-1")
+
+# Column types per dataset; columns not listed keep their inferred type. Money stays
+# float64 (float32 loses cents on large totals); small counts and day gaps fit float32.
+DATASET_SCHEMAS = {
+    "sales_trend": {
+        "period_type": "category",
+        "period_start": "datetime64[ms]",
+        "restaurant_id": "category",
+        "item_category": "category",
+        "revenue": "float64",
+    },
+    "churn_indicator": {
+        "last_order_date": "datetime64[ms]",
+        "days_since_last_order": "float32",
+        "avg_days_between_orders": "float32",
+        "pct_change_last_month": "float32",
+        "activity_status": "category",
+    },
+    "customer_segmentation_behavior": {
+        "total_cost_per_user": "float64",
+        "days_passed": "float32",
+        "num_purchases_last_24_months": "float32",
+        "monetary_rank": "int8",
+        "recency_rank": "int8",
+        "frequency_rank": "int8",
+        "customer_segment": "category",
+    },
+}
+
+# How each declared type is parsed from CSV
+ARROW_TYPES = {
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "datetime64[ms]": pa.timestamp("ms"),
+    "float32": pa.float32(),
+    "float64": pa.float64(),
+    "int8": pa.int8(),
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def manifest_key(name):
+    return f"{RESULTS_PREFIX}{name}/latest.json"
+
+
+def fetch_manifest(bucket, name, etag=None):
+    """Return (manifest, etag), or (None, etag) when the manifest still matches etag."""
+    request = {"Bucket": bucket, "Key": manifest_key(name)}
+    if etag:
+        request["IfNoneMatch"] = etag
+    try:
+        response = s3.get_object(**request)
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code in ("304", "NotModified"):
+            return None, etag
+        if code == "NoSuchKey":
+            raise FileNotFoundError(f"No published results for {name} in s3://{bucket}/{RESULTS_PREFIX}{name}/")
+        raise
+    return json.loads(response['Body'].read()), response["ETag"]
+
+
+def read_result(manifest, schema, columns=None):
+    if manifest["format"] == "csv":
+        convert_options = pa_csv.ConvertOptions(
+            column_types={name: ARROW_TYPES[dtype] for name, dtype in schema.items()},
+            include_columns=columns or [],
+        )
+        # The body is parsed as it streams in, never held as bytes and str first
+        with s3_fs.open_input_stream(f"{manifest['bucket']}/{manifest['keys'][0]}") as stream:
+            table = pa_csv.read_csv(stream, convert_options=convert_options)
+    elif not manifest["keys"]:
+        # UNLOAD writes no files for an empty result
+        return pd.DataFrame(columns=columns or [c["name"] for c in manifest["schema"]])
+    else:
+        dataset = ds.dataset([f"{manifest['bucket']}/{key}" for key in manifest["keys"]],
+                             format="parquet", filesystem=s3_fs)
+        table = dataset.to_table(columns=columns)
+
+    # self_destruct frees each Arrow column as soon as it is converted
+    df = table.to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
+    return df.astype({name: dtype for name, dtype in schema.items() if name in df.columns and df[name].dtype != dtype})
+
+
+def load_dataset(bucket, name, columns=None, copy=True):
+    """Latest result of the named analysis as a DataFrame with typed columns.
+
+    columns limits the read to the listed columns; dates and timestamps come back as
+    datetime64 rather than strings or Python objects. The caller gets its own copy, so
+    pages can add or reformat columns without touching the cached frame; pages that only
+    read the frame can pass copy=False to skip it.
+    """
+    cache_key = (bucket, name, tuple(columns) if columns else None)
+    with _lock:
+        entry = _cache.get(cache_key)
+    now = time.monotonic()
+    if entry is not None and now - entry["checked_at"] < DATA_TTL_SECONDS:
+        return entry["df"].copy() if copy else entry["df"]
+
+    manifest, etag = fetch_manifest(bucket, name, entry["etag"] if entry else None)
+    if manifest is None:
+        entry = dict(entry, checked_at=now)
+    else:
+        entry = {"df": read_result(manifest, DATASET_SCHEMAS.get(name, {}), columns), "etag": etag, "checked_at": now,
+                 "query_execution_id": manifest["query_execution_id"]}
+    with _lock:
+        _cache[cache_key] = entry
+    return entry["df"].copy() if copy else entry["df"]
+
+
+def dataset_version(bucket, name, columns=None):
+    """Execution id of the cached result, for keying anything derived from the dataset."""
+    with _lock:
+        entry = _cache.get((bucket, name, tuple(columns) if columns else None))
+    return entry["query_execution_id"] if entry else None
+
+
+def load_query_metrics(bucket):
+    """Every execution statistic the query runner has recorded, re-read at most once per DATA_TTL_SECONDS.
+
+    The runner only ever adds files, one per run, so the whole history is a few small
+    Parquet files; run_date comes back as a column from the partition paths.
+    """
+    cache_key = (bucket, METRICS_PREFIX)
+    with _lock:
+        entry = _cache.get(cache_key)
+    now = time.monotonic()
+    if entry is not None and now - entry["checked_at"] < DATA_TTL_SECONDS:
+        return entry["df"]
+
+    try:
+        dataset = ds.dataset(f"{bucket}/{METRICS_PREFIX}", format="parquet", filesystem=s3_fs, partitioning="hive")
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No execution statistics in s3://{bucket}/{METRICS_PREFIX}")
+    df = dataset.to_table().to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
+    with _lock:
+        _cache[cache_key] = {"df": df, "checked_at": now, "query_execution_id": None}
+    return df
+
+
+def refresh():
+    """Forget every cached dataset; the next load revalidates against S3."""
+    with _lock:
+        _cache.clear()
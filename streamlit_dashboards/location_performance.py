@@ -1,32 +1,19 @@
 import streamlit as st
 import pandas as pd
-import boto3
-from io import StringIO
 import plotly.express as px
-
-# Initialize S3 client
-s3 = boto3.client("s3")
-
-# Page config (call only ONCE at the top)
-st.set_page_config(page_title="Location Performance Dashboard", layout="wide")
+from data_access import dataset_version, load_dataset
+from paged_table import paged_table
 
 def location_performance(bucket):
     st.title("Location Performance Dashboard")
 
-    # Get the latest CSV file from S3 prefix
-    prefix = "athena-query-results/top_performing_location/"
-    files = s3.list_objects_v2(Bucket=bucket, Prefix=prefix).get("Contents", [])
-    csv_files = [f["Key"] for f in files if f["Key"].endswith(".csv")]
-
-    if not csv_files:
-        st.error("No CSV file found in the S3 bucket under the given prefix.")
+    # Latest query result, Parquet or CSV
+    try:
+        df = load_dataset(bucket, "top_performing_location")
+    except FileNotFoundError:
+        st.error("No query results found in the S3 bucket under the given prefix.")
         return
 
-    # Use the most recent file
-    latest_file = max(csv_files, key=lambda x: x.split("/")[-1])
-    response = s3.get_object(Bucket=bucket, Key=latest_file)
-    df = pd.read_csv(StringIO(response["Body"].read().decode("utf-8")))
-
     # Format numbers
     df["total_revenue"] = df["total_revenue"].round(2)
     df["avg_order_value"] = df["avg_order_value"].round(2)
@@ -34,7 +21,8 @@ def location_performance(bucket):
     df["orders_per_week"] = df["orders_per_week"].round(2)
 
     st.subheader("Ranked Locations by Revenue")
-    st.dataframe(df, use_container_width=True)
+    paged_table(df, key="location_ranking", data_key=dataset_version(bucket, "top_performing_location"),
+                default_sort="total_revenue", descending=True, file_name="top_performing_location.csv")
 
     # --- Top vs Bottom Locations ---
     col1, col2 = st.columns(2)
@@ -0,0 +1,57 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+
+# Dashboard pages are imported the first time they are selected and then stay in
+# sys.modules, so a session only pays for the pages it opens and later selections are
+# warm. Import and render timings are logged to stdout for cold-start measurements.
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+logger = logging.getLogger("dashboards")
+
+# Sidebar label -> (module, render function taking the bucket)
+PAGES = {
+    "Customer Segmentation": ("customer_segmentation", "customer_segmentation"),
+    "Churn Risk Indicators": ("churn_indicator", "churn_indicator"),
+    "Sales Trends & Seasonality": ("sales_trends_seasonality", "sales_trend_seasonality"),
+    "Loyalty Program Impact": ("loyalty_program_impact", "loyalty_program_impact"),
+    "Location Performance": ("location_performance", "location_performance"),
+    "Pricing & Discount Effectiveness": ("pricing_discount", "pricing_discount"),
+    "Athena Query Telemetry": ("athena_telemetry", "athena_telemetry"),
+}
+
+LOADED_AT = time.perf_counter()
+_first_render_logged = False
+_lock = threading.Lock()
+
+
+def load_page(label):
+    """Render function of the page, importing its module on first use."""
+    module_name, function_name = PAGES[label]
+    cold = module_name not in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if cold:
+        logger.info(f"Imported {module_name} in {time.perf_counter() - started:.3f}s")
+    return getattr(module, function_name)
+
+
+def refresh_data():
+    """Clear the data_access cache, without importing it (and boto3, pandas, pyarrow) when no page has."""
+    data_access = sys.modules.get("data_access")
+    if data_access is not None:
+        data_access.refresh()
+
+
+def render_page(label, bucket):
+    global _first_render_logged
+    started = time.perf_counter()
+    load_page(label)(bucket)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        first, _first_render_logged = not _first_render_logged, True
+    if first:
+        logger.info(f"First render ({label}) finished {time.perf_counter() - LOADED_AT:.3f}s after app start")
+    logger.info(f"Rendered {label} in {elapsed:.3f}s")
@@ -0,0 +1,124 @@
+import math
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import streamlit as st
+
+# Table component that keeps the data on the server: sorting and filtering run against
+# the cached frame and only the rows of the visible page are sent to the browser, so the
+# payload stays bounded however large the result is. The full (sorted, filtered) table
+# can still be downloaded as CSV.
+
+DEFAULT_PAGE_SIZE = 50
+PAGE_SIZES = [25, 50, 100, 250]
+CSV_CHUNK_ROWS = 100_000
+MAX_CACHED_VIEWS = 32
+# Prepared CSVs are shared by all sessions; the oldest are evicted past this total
+MAX_CACHED_CSV_BYTES = 256 * 1024 * 1024
+NO_FILTER = "(none)"
+
+_views = OrderedDict()
+_csv = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(cache, key, value):
+    with _lock:
+        cache[key] = value
+        while len(cache) > MAX_CACHED_VIEWS:
+            cache.popitem(last=False)
+    return value
+
+
+def _remember_csv(key, data):
+    # A CSV larger than the whole budget is served to the session that asked for it, not kept
+    if len(data) > MAX_CACHED_CSV_BYTES:
+        return data
+    with _lock:
+        _csv[key] = data
+        cached_bytes = sum(len(value) for value in _csv.values())
+        while cached_bytes > MAX_CACHED_CSV_BYTES or len(_csv) > MAX_CACHED_VIEWS:
+            cached_bytes -= len(_csv.popitem(last=False)[1])
+    return data
+
+
+def _lookup(cache, key):
+    with _lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
+
+
+def ordered_positions(df, data_key, sort_by, descending, filter_column=NO_FILTER, filter_text=""):
+    """Row positions of df after filtering and sorting, computed once per view."""
+    view_key = (data_key, sort_by, descending, filter_column, filter_text)
+    positions = _lookup(_views, view_key)
+    if positions is not None:
+        return positions
+
+    positions = np.arange(len(df))
+    if filter_column != NO_FILTER and filter_text:
+        matches = df[filter_column].astype(str).str.contains(filter_text, case=False, regex=False)
+        positions = np.flatnonzero(matches.to_numpy())
+    ordered = (df[sort_by].iloc[positions].reset_index(drop=True)
+               .sort_values(ascending=not descending, kind="stable", na_position="last"))
+    return _remember(_views, view_key, positions[ordered.index.to_numpy()])
+
+
+def csv_bytes(frame):
+    """CSV of frame, written in chunks so no second full-size text copy is built."""
+    buffer = BytesIO()
+    frame.iloc[:0].to_csv(buffer, index=False)
+    for start in range(0, len(frame), CSV_CHUNK_ROWS):
+        frame.iloc[start:start + CSV_CHUNK_ROWS].to_csv(buffer, index=False, header=False)
+    return buffer.getvalue()
+
+
+def paged_table(df, key, data_key, default_sort=None, descending=True, file_name=None):
+    """Render df one page at a time.
+
+    key namespaces the widgets; data_key identifies the content of df (for example the
+    result version plus the page's filter selection) and keys the cached sort orders.
+    """
+    columns = list(df.columns)
+    col1, col2, col3, col4 = st.columns([2, 1, 2, 2])
+    with col1:
+        sort_by = st.selectbox("Sort by", columns,
+                               index=columns.index(default_sort) if default_sort in columns else 0,
+                               key=f"{key}_sort")
+    with col2:
+        sort_descending = st.toggle("Descending", value=descending, key=f"{key}_descending")
+    with col3:
+        filter_column = st.selectbox("Filter column", [NO_FILTER] + columns, key=f"{key}_filter_column")
+    with col4:
+        filter_text = st.text_input("Contains", key=f"{key}_filter_text", disabled=filter_column == NO_FILTER)
+
+    positions = ordered_positions(df, data_key, sort_by, sort_descending, filter_column, filter_text)
+    total = len(positions)
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col2:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                 key=f"{key}_page_size")
+    pages = max(1, math.ceil(total / page_size))
+    with col1:
+        # Keyed on the page count, so a narrower filter starts again from page 1
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page_{pages}")
+    start = (page - 1) * page_size
+    end = min(start + page_size, total)
+    with col3:
+        st.caption(f"Rows {start + 1 if total else 0:,}-{end:,} of {total:,}")
+
+    st.dataframe(df.iloc[positions[start:end]], use_container_width=True, hide_index=True)
+
+    # The CSV is only built on request, once per view, and shared by all sessions
+    view_key = (data_key, sort_by, sort_descending, filter_column, filter_text)
+    data = _lookup(_csv, view_key)
+    if data is None and st.button("Prepare full CSV download", key=f"{key}_prepare_csv"):
+        data = _remember_csv(view_key, csv_bytes(df.iloc[positions]))
+    if data is not None:
+        st.download_button("Download full CSV", data, file_name=file_name or f"{key}.csv", mime="text/csv",
+                           key=f"{key}_download_csv")
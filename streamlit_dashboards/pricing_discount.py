@@ -1,32 +1,18 @@
 import streamlit as st
 import pandas as pd
-import boto3
-from io import StringIO
 import plotly.express as px
-
-# Initialize S3 client
-s3 = boto3.client("s3")
-
-# Page config (call only ONCE at the top)
-st.set_page_config(page_title="Pricing & Discount Effectiveness Dashboard", layout="wide")
+from data_access import load_dataset
 
 def pricing_discount(bucket):
     st.title("Pricing & Discount Effectiveness Dashboard")
 
-    # Get the latest CSV file from S3 prefix
-    prefix = "athena-query-results/pricing_discount_effectiveness/"
-    files = s3.list_objects_v2(Bucket=bucket, Prefix=prefix).get("Contents", [])
-    csv_files = [f["Key"] for f in files if f["Key"].endswith(".csv")]
-
-    if not csv_files:
-        st.error("No CSV file found in the S3 bucket under the given prefix.")
+    # Latest query result, Parquet or CSV
+    try:
+        df = load_dataset(bucket, "pricing_discount_effectiveness")
+    except FileNotFoundError:
+        st.error("No query results found in the S3 bucket under the given prefix.")
         return
 
-    # Use the most recent file
-    latest_file = max(csv_files, key=lambda x: x.split("/")[-1])
-    response = s3.get_object(Bucket=bucket, Key=latest_file)
-    df = pd.read_csv(StringIO(response["Body"].read().decode("utf-8")))
-
     # Summary Metrics
     st.subheader("Key Metrics")
     col1, col2, col3 = st.columns(3)
@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Sales trend revenue pre-aggregated for every (period_type, restaurant_id, item_category)
+# filter combination, "All" rollups included, on sorted MultiIndexes. A selection on the
+# Sales Trends page is then answered with index lookups instead of masks and groupbys
+# over the whole result, whatever the number of restaurants and categories.
+
+ALL = "All"
+KEYS = ["period_type", "restaurant_id", "item_category"]
+MAX_ROW_VIEWS = 32
+
+_cubes = {}
+_lock = threading.Lock()
+
+
+def _display_order(values):
+    """Distinct values as the cube's string keys, in the order of the values they stand for.
+
+    Restaurant 2 comes before 10 also when the ids arrive as strings, as they do from the
+    dictionary-encoded "category" columns of data_access.
+    """
+    distinct = values.drop_duplicates()
+    if isinstance(distinct.dtype, pd.CategoricalDtype):
+        distinct = distinct.astype(distinct.cat.categories.dtype)
+    numbers = pd.to_numeric(distinct, errors="coerce")
+    sort_on = numbers if numbers.notna().sum() == distinct.notna().sum() else distinct
+    return list(distinct.loc[sort_on.sort_values(na_position="last").index].astype(str))
+
+
+class SalesCube:
+    def __init__(self, df):
+        frame = df[KEYS + ["period_start", "revenue"]].dropna(subset=["period_start"])
+        self.restaurants = _display_order(frame["restaurant_id"])
+        self.categories = _display_order(frame["item_category"])
+        # String keys so the "All" rollups sort alongside real ids
+        frame = frame.astype({"period_type": str, "restaurant_id": str, "item_category": str})
+        self.period_types = list(pd.unique(frame["period_type"]))
+
+        parts = []
+        for rollup in ([], ["restaurant_id"], ["item_category"], ["restaurant_id", "item_category"]):
+            parts.append(frame.assign(**{key: ALL for key in rollup})
+                         .groupby(KEYS + ["period_start"], sort=False)["revenue"].sum())
+        # Revenue per period for every combination, e.g. series[("Daily", "All", "Pizza")]
+        self.series = pd.concat(parts).sort_index()
+        self.totals = self.series.groupby(level=KEYS).sum()
+        # Breakdowns exclude the rollup rows they are broken down over
+        restaurant_ids = self.totals.index.get_level_values("restaurant_id")
+        self.by_restaurant = (self.totals[restaurant_ids != ALL]
+                              .reorder_levels(["period_type", "item_category", "restaurant_id"]).sort_index())
+        self.by_category = self.totals[self.totals.index.get_level_values("item_category") != ALL]
+        self.rows = frame.set_index(KEYS).sort_index()
+        self._row_views = OrderedDict()
+
+    @staticmethod
+    def _lookup(series, key):
+        try:
+            return series.loc[key]
+        except KeyError:
+            return series.iloc[:0].droplevel(list(range(len(key))))
+
+    def revenue_series(self, period_type, restaurant_id=ALL, item_category=ALL):
+        """Revenue indexed by period_start, in order."""
+        return self._lookup(self.series, (period_type, restaurant_id, item_category))
+
+    def total_revenue(self, period_type, restaurant_id=ALL, item_category=ALL):
+        return float(self.totals.get((period_type, restaurant_id, item_category), 0.0))
+
+    def revenue_by_restaurant(self, period_type, restaurant_id=ALL, item_category=ALL):
+        breakdown = self._lookup(self.by_restaurant, (period_type, item_category))
+        return breakdown if restaurant_id == ALL else breakdown[breakdown.index == restaurant_id]
+
+    def revenue_by_category(self, period_type, restaurant_id=ALL, item_category=ALL):
+        breakdown = self._lookup(self.by_category, (period_type, restaurant_id))
+        return breakdown if item_category == ALL else breakdown[breakdown.index == item_category]
+
+    def rows_for(self, period_type, restaurant_id=ALL, item_category=ALL):
+        """Detail rows of the selection, kept for the most recent selections."""
+        selection = (period_type, restaurant_id, item_category)
+        with _lock:
+            if selection in self._row_views:
+                self._row_views.move_to_end(selection)
+                return self._row_views[selection]
+
+        key = (period_type,
+               slice(None) if restaurant_id == ALL else restaurant_id,
+               slice(None) if item_category == ALL else item_category)
+        try:
+            rows = self.rows.loc[key, :].reset_index()
+        except KeyError:
+            rows = self.rows.iloc[:0].reset_index()
+        with _lock:
+            self._row_views[selection] = rows
+            while len(self._row_views) > MAX_ROW_VIEWS:
+                self._row_views.popitem(last=False)
+        return rows
+
+
+def sales_cube(df, version):
+    """The cube for this version of the sales_trend result, built on first use."""
+    with _lock:
+        cube = _cubes.get(version)
+    if cube is None:
+        cube = SalesCube(df)
+        with _lock:
+            # Only the current result is worth keeping
+            _cubes.clear()
+            _cubes[version] = cube
+    return cube
@@ -1,13 +1,14 @@
 import streamlit as st
 import pandas as pd
-import boto3
 import plotly.express as px
-from io import StringIO
+from data_access import dataset_version, load_dataset
+from chart_utils import POINT_BUDGET, lttb_indices, render_cached
+from sales_cube import ALL, sales_cube
+from paged_table import paged_table
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.ticker as mticker
 
-s3 = boto3.client('s3')
 
 # Custom y-axis formatter for millions/billions
 def format_revenue(x, pos):
@@ -15,71 +16,80 @@ def format_revenue(x, pos):
         return f'${x/1e9:.1f}B'
     else:
         return f'${x/1e6:.1f}M'
-                        
-def sales_trend_seasonality(bucket):
-    st.set_page_config(page_title="Sales Trends & Seasonality Dashboard", layout="wide")
-    st.title("Sales Trends & Seasonality Dashboard")
-    prefix = "athena-query-results/sales_trend/"
-    date_prefix = "athena-query-results/get_date_detail"
-
-    file = None
-    for f in s3.list_objects_v2(Bucket=bucket, Prefix=prefix).get('Contents', []):
-        if f['Key'].endswith('.csv'):
-              file = f['Key'] 
-              break
+
+
+def revenue_over_time_figure(series, date_df, selected_period, show_holidays):
+    # One point per period, downsampled to the point budget
+    kept = lttb_indices(series.index.values, series.values)
+    series = series.iloc[kept]
+
+    fig1, ax1 = plt.subplots(figsize=(12, 6))
+    ax1.plot(series.index, series.values)
+    ax1.set_title(f"Revenue over Time ({selected_period} Aggregation)")
+    ax1.set_xlabel("Period Start")
+    ax1.set_ylabel("Revenue ($)")
     
-        # Get the object from S3
-    response = s3.get_object(Bucket=bucket, Key=file)
-    df = pd.read_csv(StringIO(response['Body'].read().decode("utf-8")))
-
-    date_file = None
-    for f in s3.list_objects_v2(Bucket=bucket, Prefix=date_prefix).get('Contents', []):
-        if f['Key'].endswith('.csv'):
-              date_file = f['Key'] 
-              break
+    # Dynamic date formatting based on selected period
+    if selected_period == 'Daily':
+        date_formatter = mdates.DateFormatter('%Y-%m-%d')
+    elif selected_period == 'Weekly':
+        date_formatter = mdates.DateFormatter('%Y-%W')
+    else: # Monthly
+        date_formatter = mdates.DateFormatter('%Y-%m')
     
-        # Get the object from S3
-    date_response = s3.get_object(Bucket=bucket, Key=date_file)
-    date_df = pd.read_csv(StringIO(date_response['Body'].read().decode("utf-8")))
-
-    # Convert appropriate columns to the correct data type for plotting
-    # Check if the column is a numeric type that might be a timestamp
-    if pd.api.types.is_numeric_dtype(df['period_start']):
-        # Assuming the timestamp is in seconds, convert it to datetime
-        df['period_start'] = pd.to_datetime(df['period_start'], unit='s')
-    else:
-        # Fallback to a standard conversion
-        df['period_start'] = pd.to_datetime(df['period_start'])
+    # Set a max number of ticks to prevent overcrowding
+    ax1.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=10))
+    ax1.xaxis.set_major_formatter(date_formatter)
+    ax1.tick_params(axis='x', rotation=45)
+    ax1.grid(True)
+    ax1.yaxis.set_major_formatter(mticker.FuncFormatter(format_revenue))
+
+    # Holidays inside the plotted range, selected with one vectorized mask and drawn in one call
+    if show_holidays and not date_df.empty and not series.empty:
+        holiday_dates = pd.to_datetime(date_df.loc[date_df['is_holiday'].astype(bool), 'date_key'])
+        in_range = holiday_dates[(holiday_dates >= series.index.min()) & (holiday_dates <= series.index.max())]
+        if not in_range.empty:
+            ax1.vlines(in_range, 0, 1, transform=ax1.get_xaxis_transform(),
+                       colors='r', linestyles='--', linewidth=1, label='Public Holidays')
+            ax1.legend()
+
+    plt.tight_layout()
+    return fig1
+
+
+def sales_trend_seasonality(bucket):
+    st.title("Sales Trends & Seasonality Dashboard")
+
+    # period_start is typed as a timestamp by the dataset schema; the page only reads the frame
+    df = load_dataset(bucket, "sales_trend", copy=False)
+    # Only the holiday flags of the date dimension are needed
+    date_df = load_dataset(bucket, "get_date_detail", columns=["date_key", "is_holiday"], copy=False)
+    # Pre-aggregated once per published result; every selection below is an index lookup
+    cube = sales_cube(df, dataset_version(bucket, "sales_trend"))
 
     # Main page filter options
     st.header("Filter Options")
     col1, col2, col3 = st.columns(3)
     with col1:
-        selected_period = st.selectbox("Select Time Period", df['period_type'].unique())
+        selected_period = st.selectbox("Select Time Period", cube.period_types)
     with col2:
-        selected_restaurant = st.selectbox("Select Restaurant ID", ['All'] + list(df['restaurant_id'].unique()))
+        selected_restaurant = st.selectbox("Select Restaurant ID", [ALL] + cube.restaurants)
     with col3:
-        selected_category = st.selectbox("Select Item Category", ['All'] + list(df['item_category'].unique()))
+        selected_category = st.selectbox("Select Item Category", [ALL] + cube.categories)
 
-    filtered_df = df[df['period_type'] == selected_period]
-    
-    # Apply restaurant filter if not 'All'
-    if selected_restaurant != 'All':
-        filtered_df = filtered_df[filtered_df['restaurant_id'] == selected_restaurant]
-
-    # Apply item category filter if not 'All'
-    if selected_category != 'All':
-        filtered_df = filtered_df[filtered_df['item_category'] == selected_category]
+    selection = (selected_period, selected_restaurant, selected_category)
+    revenue_by_restaurant = cube.revenue_by_restaurant(*selection)
+    revenue_by_category = cube.revenue_by_category(*selection)
 
     # Display metrics
     st.markdown("### Key Metrics")
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Revenue", f"${filtered_df['revenue'].sum():,.2f}")
+        st.metric("Total Revenue", f"${cube.total_revenue(*selection):,.2f}")
     with col2:
-        st.metric("Number of Restaurants", filtered_df['restaurant_id'].nunique())
+        st.metric("Number of Restaurants", len(revenue_by_restaurant))
     with col3:
-        st.metric("Number of Categories", filtered_df['item_category'].nunique())
+        st.metric("Number of Categories", len(revenue_by_category))
 
      # Holiday filter options
     st.markdown("### Holiday Visualizations")
@@ -92,54 +102,18 @@ def sales_trend_seasonality(bucket):
     
     # Chart 1: Revenue over Time
     st.markdown("#### Revenue over Time")
-    fig1, ax1 = plt.subplots(figsize=(12, 6))
-    
-    # Ensure period_start is a valid datetime before plotting
-    filtered_df = filtered_df.dropna(subset=['period_start'])
-
-    ax1.plot(filtered_df.sort_values('period_start')['period_start'], filtered_df.sort_values('period_start')['revenue'])
-    ax1.set_title(f"Revenue over Time ({selected_period} Aggregation)")
-    ax1.set_xlabel("Period Start")
-    ax1.set_ylabel("Revenue ($)")
-    
-    # Dynamic date formatting based on selected period
-    if selected_period == 'Daily':
-        date_formatter = mdates.DateFormatter('%Y-%m-%d')
-    elif selected_period == 'Weekly':
-        date_formatter = mdates.DateFormatter('%Y-%W')
-    else: # Monthly
-        date_formatter = mdates.DateFormatter('%Y-%m')
-    
-    # Set a max number of ticks to prevent overcrowding
-    ax1.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=10))
-    ax1.xaxis.set_major_formatter(date_formatter)
-    ax1.tick_params(axis='x', rotation=45)
-    ax1.grid(True)
-    ax1.yaxis.set_major_formatter(mticker.FuncFormatter(format_revenue))
-    # Add vertical lines for holidays using the custom DataFrame
-   
-    print(date_df.columns)
-    if show_holidays and not date_df.empty:
-        holiday_dates = pd.to_datetime(date_df[date_df['is_holiday']]['date_key'])
-
-    is_first_holiday = True
-    for holiday_date in holiday_dates:
-        if filtered_df['period_start'].min() <= holiday_date <= filtered_df['period_start'].max():
-            if is_first_holiday:
-                ax1.axvline(x=holiday_date, color='r', linestyle='--', linewidth=1, label='Public Holidays')
-                is_first_holiday = False
-            else:
-                ax1.axvline(x=holiday_date, color='r', linestyle='--', linewidth=1)
-
-    ax1.legend()
-
-    plt.tight_layout()
-    st.pyplot(fig1)
+    chart_key = (
+        dataset_version(bucket, "sales_trend"),
+        dataset_version(bucket, "get_date_detail", columns=["date_key", "is_holiday"]),
+        selected_period, selected_restaurant, selected_category, show_holidays, POINT_BUDGET,
+    )
+    st.image(render_cached(chart_key, lambda: revenue_over_time_figure(cube.revenue_series(*selection), date_df, selected_period, show_holidays)),
+             use_container_width=True)
     
     # Chart 2: Revenue Breakdown by Restaurant
     st.markdown("#### Revenue Breakdown by Restaurant")
     fig2, ax2 = plt.subplots(figsize=(12, 6))
-    revenue_by_restaurant = filtered_df.groupby('restaurant_id')['revenue'].sum().reset_index()
+    revenue_by_restaurant = revenue_by_restaurant.rename('revenue').rename_axis('restaurant_id').reset_index()
     ax2.bar(revenue_by_restaurant['restaurant_id'], revenue_by_restaurant['revenue'])
     ax2.set_title("Revenue Breakdown by Restaurant")
     ax2.set_xlabel("Restaurant ID")
@@ -152,7 +126,8 @@ def sales_trend_seasonality(bucket):
 
     # Chart 3: Revenue Breakdown by Item Category
     st.markdown("#### Revenue Breakdown by Item Category")
-    revenue_by_category = filtered_df.groupby('item_category')['revenue'].sum().reset_index().sort_values('revenue', ascending=False)
+    revenue_by_category = (revenue_by_category.rename('revenue').rename_axis('item_category').reset_index()
+                           .sort_values('revenue', ascending=False))
     # Truncate long category names
     trimmed_categories = [
         (cat[:20] + '...') if len(cat) > 20 else cat
@@ -179,6 +154,10 @@ def sales_trend_seasonality(bucket):
     st.markdown("### Data Tables")
     
     st.markdown(f"#### {selected_period} Revenue")
-    st.dataframe(filtered_df.sort_values('period_start', ascending=False), use_container_width=True)
+    # Paged on the server: only the visible rows are sent, however long the period
+    paged_table(cube.rows_for(*selection), key="sales_trend_rows",
+                data_key=(dataset_version(bucket, "sales_trend"), selection),
+                default_sort='period_start', descending=True,
+                file_name=f"sales_trend_{selected_period.lower()}.csv")
 
     
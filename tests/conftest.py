@@ -0,0 +1,38 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Job scripts import their helper modules as siblings, as Glue ships them with --extra-py-files
+for path in ("glue_jobs/data_ingestion", "glue_jobs/data_transformation", "glue_jobs/athena_queries_runner",
+             "benchmarks", "streamlit_dashboards", "cicd"):
+    sys.path.insert(0, os.path.join(REPO_ROOT, path))
+
+
+def load_script(relative_path, module_name):
+    """Import a job script whose file name is not a valid module name, e.g. athena-query-runner.py."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def spark():
+    if not (os.environ.get("JAVA_HOME") or shutil.which("java")):
+        pytest.skip("Spark needs a Java runtime")
+    pyspark_sql = pytest.importorskip("pyspark.sql")
+    session = (pyspark_sql.SparkSession.builder
+               .master("local[2]")
+               .appName("gp-tests")
+               .config("spark.sql.shuffle.partitions", "4")
+               .config("spark.sql.session.timeZone", "UTC")
+               .config("spark.ui.enabled", "false")
+               .config("spark.jars.packages", "org.xerial:sqlite-jdbc:3.46.0.0")
+               .getOrCreate())
+    yield session
+    session.stop()
@@ -0,0 +1,190 @@
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from conftest import load_script
+
+# The runner creates its boto3 clients at import time; they are never called here
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+runner = load_script("glue_jobs/athena_queries_runner/athena-query-runner.py", "athena_query_runner")
+
+
+class FakeAthena:
+    """Stands in for the Athena client: each query finishes after a fixed number of polls.
+
+    outcomes maps a query's SQL to its final state and the number of polls it stays
+    RUNNING for; throttled_starts makes the first start_query_execution calls fail
+    with TooManyRequestsException.
+    """
+
+    def __init__(self, outcomes, throttled_starts=0):
+        self.outcomes = outcomes
+        self.throttled_starts = throttled_starts
+        self.executions = {}
+        self.started = []
+        self.finished = []
+        self.max_in_flight = 0
+
+    def start_query_execution(self, QueryString, QueryExecutionContext, ResultConfiguration):
+        if self.throttled_starts:
+            self.throttled_starts -= 1
+            raise ClientError({"Error": {"Code": "TooManyRequestsException", "Message": "slow down"}},
+                              "StartQueryExecution")
+        state, polls = self.outcomes[QueryString]
+        execution_id = f"qid-{len(self.executions)}"
+        self.executions[execution_id] = {"sql": QueryString, "state": state, "polls_left": polls}
+        self.started.append(QueryString)
+        in_flight = sum(e["polls_left"] >= 0 for e in self.executions.values())
+        self.max_in_flight = max(self.max_in_flight, in_flight)
+        return {"QueryExecutionId": execution_id}
+
+    def batch_get_query_execution(self, QueryExecutionIds):
+        assert len(QueryExecutionIds) <= runner.BATCH_SIZE
+        executions = []
+        for execution_id in QueryExecutionIds:
+            execution = self.executions[execution_id]
+            execution["polls_left"] -= 1
+            state = "RUNNING" if execution["polls_left"] >= 0 else execution["state"]
+            if state != "RUNNING":
+                self.finished.append(execution["sql"])
+            executions.append({
+                "QueryExecutionId": execution_id,
+                "Status": {"State": state, "StateChangeReason": f"{state.lower()} by the fake"},
+                "Statistics": {"EngineExecutionTimeInMillis": 10, "DataScannedInBytes": 100},
+            })
+        return {"QueryExecutions": executions}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def task(name, depends_on=(), kind="analysis"):
+    return runner.QueryTask(name=name, sql=name, output_folder=f"s3://results/{name}/", kind=kind,
+                            depends_on=list(depends_on))
+
+
+def run(tasks, athena, max_concurrent):
+    clock = FakeClock()
+    runner.run_queries(tasks, max_concurrent=max_concurrent, athena_client=athena, clock=clock, sleep=clock.sleep)
+    return {t.name: t for t in tasks}
+
+
+def test_in_flight_queries_never_exceed_max_concurrent():
+    names = [f"q{i}" for i in range(7)]
+    athena = FakeAthena({name: ("SUCCEEDED", i % 3) for i, name in enumerate(names)})
+    tasks = run([task(name) for name in names], athena, max_concurrent=3)
+
+    assert athena.max_in_flight == 3
+    assert all(t.state == "SUCCEEDED" for t in tasks.values())
+    assert all(t.elapsed_seconds is not None and t.statistics for t in tasks.values())
+
+
+def test_serial_runs_keep_the_input_order():
+    names = ["b", "a", "c"]
+    athena = FakeAthena({name: ("SUCCEEDED", 1) for name in names})
+    run([task(name) for name in names], athena, max_concurrent=1)
+
+    assert athena.max_in_flight == 1
+    assert athena.started == names
+
+
+def test_intermediates_finish_before_their_dependents_start():
+    athena = FakeAthena({
+        "orders_enriched": ("SUCCEEDED", 3),
+        "customer_ltv": ("SUCCEEDED", 0),
+        "rfm": ("SUCCEEDED", 0),
+        "sales_trend": ("SUCCEEDED", 0),
+    })
+    tasks = run([task("rfm", ["orders_enriched", "customer_ltv"]),
+                 task("orders_enriched", kind="intermediate"),
+                 task("customer_ltv", ["orders_enriched"]),
+                 task("sales_trend")], athena, max_concurrent=4)
+
+    assert all(t.state == "SUCCEEDED" for t in tasks.values())
+    # The independent analysis does not wait for the slow intermediate
+    assert athena.finished.index("sales_trend") < athena.finished.index("orders_enriched")
+    for name, t in tasks.items():
+        for dependency in t.depends_on:
+            assert athena.finished.index(dependency) < athena.started.index(name)
+            assert tasks[dependency].finished_at <= t.submitted_at
+
+
+@pytest.mark.parametrize("upstream_state", ["FAILED", "CANCELLED"])
+def test_dependents_of_a_failed_query_are_skipped(upstream_state):
+    athena = FakeAthena({
+        "orders_enriched": (upstream_state, 1),
+        "customer_ltv": ("SUCCEEDED", 0),
+        "rfm": ("SUCCEEDED", 0),
+        "sales_trend": ("SUCCEEDED", 0),
+    })
+    tasks = run([task("orders_enriched", kind="intermediate"),
+                 task("customer_ltv", ["orders_enriched"]),
+                 task("rfm", ["customer_ltv"]),
+                 task("sales_trend")], athena, max_concurrent=2)
+
+    assert tasks["orders_enriched"].state == upstream_state
+    assert tasks["customer_ltv"].state == "SKIPPED"
+    assert tasks["customer_ltv"].reason == f"dependency orders_enriched {upstream_state.lower()}"
+    # Skips cascade to everything further downstream
+    assert tasks["rfm"].state == "SKIPPED"
+    assert tasks["rfm"].reason == "dependency customer_ltv skipped"
+    assert tasks["sales_trend"].state == "SUCCEEDED"
+    assert athena.started == ["orders_enriched", "sales_trend"]
+
+
+def test_throttled_starts_are_retried_with_backoff():
+    athena = FakeAthena({"q": ("SUCCEEDED", 0)}, throttled_starts=3)
+    clock = FakeClock()
+    t = task("q")
+    assert runner.start_query(t, athena, clock=clock, sleep=clock.sleep)
+
+    assert t.state == "QUEUED" and t.query_execution_id == "qid-0"
+    delay = runner.POLL_MIN_SECONDS
+    assert clock.sleeps == [delay, min(delay * 2, runner.POLL_MAX_SECONDS), min(delay * 4, runner.POLL_MAX_SECONDS)]
+
+
+def test_other_start_errors_fail_the_task_and_skip_its_dependents():
+    class RejectingAthena(FakeAthena):
+        def start_query_execution(self, QueryString, **kwargs):
+            if QueryString == "bad":
+                raise ClientError({"Error": {"Code": "InvalidRequestException", "Message": "syntax"}},
+                                  "StartQueryExecution")
+            return super().start_query_execution(QueryString, **kwargs)
+
+    athena = RejectingAthena({"child": ("SUCCEEDED", 0)})
+    tasks = run([task("bad"), task("child", ["bad"])], athena, max_concurrent=2)
+
+    assert tasks["bad"].state == "FAILED" and "syntax" in tasks["bad"].reason
+    assert tasks["child"].state == "SKIPPED"
+    assert athena.started == []
+
+
+def test_csv_manifest_falls_back_to_no_row_count(monkeypatch):
+    class StatisticsExpired:
+        def get_query_results(self, QueryExecutionId, MaxResults):
+            return {"ResultSet": {"ResultSetMetadata": {"ColumnInfo": [{"Name": "order_date", "Type": "date"}]}}}
+
+        def get_query_runtime_statistics(self, QueryExecutionId):
+            raise ClientError({"Error": {"Code": "InvalidRequestException", "Message": "expired"}},
+                              "GetQueryRuntimeStatistics")
+
+    monkeypatch.setattr(runner, "athena", StatisticsExpired())
+    t = task("sales_trend")
+    t.query_execution_id = "qid-0"
+    t.result_location = "s3://results/sales_trend/qid-0.csv"
+    manifest = runner.result_manifest(t)
+
+    assert manifest["format"] == "csv" and manifest["keys"] == ["sales_trend/qid-0.csv"]
+    assert manifest["row_count"] is None
+    assert manifest["schema"] == [{"name": "order_date", "type": "date"}]
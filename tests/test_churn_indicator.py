@@ -0,0 +1,94 @@
+import os
+
+import duckdb
+import polars as pl
+import pyarrow.dataset as ds
+import pytest
+
+import bench_queries
+import bench_transforms
+import parity
+import synthetic_data
+
+# churn_indicator.sql before fact_order_totals: the per-order totals were joined from the item
+# and option facts in the query itself
+OLD_CUSTOMER_ORDERS = """customer_orders AS (
+    SELECT
+        o.user_id,
+        o.order_id,
+        DATE(o.creation_time_utc) AS order_date,
+        COALESCE(i.item_total + op.option_total, 0) AS order_total
+    FROM fact_orders o
+    LEFT JOIN (
+        SELECT order_id, SUM(item_total) AS item_total
+        FROM fact_items
+        GROUP BY order_id
+    ) i ON o.order_id = i.order_id
+    LEFT JOIN (
+        SELECT order_id, SUM(option_total) AS option_total
+        FROM fact_items_options
+        GROUP BY order_id
+    ) op ON o.order_id = op.order_id
+)"""
+
+SCALE = synthetic_data.Scale(users=40, restaurants=3, apps=2, days=60, orders_per_day=15, items_per_order=2,
+                             options_per_item=1, start_date="2024-01-01")
+
+
+def churn_queries():
+    with open(os.path.join(bench_queries.SQL_DIR, "churn_indicator.sql")) as f:
+        new_sql = f.read()
+    start = new_sql.index("customer_orders AS (")
+    end = new_sql.index("),\norders_with_previous") + 1
+    return new_sql[:start] + OLD_CUSTOMER_ORDERS + new_sql[end:], new_sql
+
+
+def write_curated(tables, curated_dir):
+    for table_name, df in tables.items():
+        partition_keys = bench_transforms.CURATED_TABLES[table_name]
+        table = df.to_arrow(compat_level=pl.CompatLevel.oldest())
+        ds.write_dataset(table, os.path.join(curated_dir, table_name), format="parquet",
+                         partitioning=ds.partitioning(table.select(partition_keys).schema, flavor="hive")
+                         if partition_keys else None)
+
+
+def run_both(tables, curated_dir):
+    write_curated(tables, curated_dir)
+    con = duckdb.connect()
+    bench_queries.register_curated(con, curated_dir)
+    old_sql, new_sql = churn_queries()
+    return [pl.from_arrow(con.execute(bench_queries.transpile(sql)).fetch_arrow_table()).sort("user_id")
+            for sql in (old_sql, new_sql)]
+
+
+@pytest.fixture(scope="module")
+def curated_tables(tmp_path_factory):
+    landing_dir = str(tmp_path_factory.mktemp("landing"))
+    synthetic_data.write_landing(synthetic_data.generate(SCALE, seed=11), landing_dir)
+    return parity.polars_tables(landing_dir)
+
+
+def test_old_and_new_queries_agree_on_orders_with_options(curated_tables, tmp_path):
+    with_options = curated_tables["fact_items_options"].get_column("order_id").unique()
+    tables = {name: df.filter(pl.col("order_id").is_in(with_options.implode())) if "order_id" in df.columns else df
+              for name, df in curated_tables.items()}
+
+    old, new = run_both(tables, str(tmp_path))
+    assert old.height == new.height > 0
+    assert parity.differences(old, new) == []
+
+
+def test_orders_without_options_now_count_their_items(curated_tables, tmp_path):
+    # The old COALESCE(item_total + option_total, 0) turned an order without options into a
+    # zero-spend order; fact_order_totals counts its items. Only the month-over-month spend
+    # of users with such an order can change.
+    with_options = curated_tables["fact_items_options"].get_column("order_id").unique()
+    without_options = curated_tables["fact_orders"].filter(~pl.col("order_id").is_in(with_options.implode()))
+    assert without_options.height > 0
+
+    old, new = run_both(curated_tables, str(tmp_path))
+    assert parity.differences(old.drop("pct_change_last_month"), new.drop("pct_change_last_month")) == []
+    changed = old.join(new, on="user_id", suffix="_new").filter(
+        ~pl.col("pct_change_last_month").eq_missing(pl.col("pct_change_last_month_new")))
+    assert changed.height > 0
+    assert set(changed.get_column("user_id")) <= set(without_options.get_column("user_id"))
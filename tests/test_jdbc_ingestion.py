@@ -0,0 +1,277 @@
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import jdbc_ingestion as ji
+import spark_transforms
+
+
+# --------------------------
+# Watermarks and predicates
+# --------------------------
+def test_datetime_watermarks_are_written_with_milliseconds():
+    value = datetime(2024, 5, 1, 10, 11, 12, 123456)
+    assert ji.watermark_text(value) == "2024-05-01T10:11:12.123"
+    assert ji.sql_literal(value) == "'2024-05-01T10:11:12.123'"
+
+
+def test_checkpointed_watermark_takes_the_source_type():
+    source_value = datetime(2024, 5, 1, 10, 11, 12, 123000)
+    # Checkpoints written before watermark_text used str(datetime)
+    assert ji.parse_watermark("2024-05-01 10:11:12.123000", source_value) == source_value
+    assert ji.parse_watermark(ji.watermark_text(source_value), source_value) == source_value
+    assert ji.parse_watermark("42", 7) == 42
+    assert ji.parse_watermark("42.5", Decimal("1.0")) == Decimal("42.5")
+    assert ji.parse_watermark("2024-05-01T10:11:12.123Z", "2024-05-02T00:00:00.000Z") == "2024-05-01T10:11:12.123Z"
+    assert ji.parse_watermark(None, source_value) is None
+
+
+def test_new_rows_compare_at_checkpoint_precision():
+    last = datetime(2024, 5, 1, 10, 0, 0, 123000)
+    assert not ji.has_new_rows(last, datetime(2024, 5, 1, 10, 0, 0, 123400))
+    assert ji.has_new_rows(last, datetime(2024, 5, 1, 10, 0, 0, 124000))
+    assert not ji.has_new_rows("2024-05-01T10:00:00.000Z", "2024-05-01T10:00:00.000Z")
+    assert ji.has_new_rows(None, "2024-05-01T10:00:00.000Z")
+    assert not ji.has_new_rows("2024-05-01T10:00:00.000Z", None)
+
+
+def test_child_window_goes_through_the_parent():
+    config = ji.TABLE_CONFIGS["order_item_options"]
+    predicate = ji.window_predicate(config, "2024-05-01", "2024-05-02", lambda name: f"dbo.{name}")
+    assert predicate == ("EXISTS (SELECT 1 FROM dbo.order_items p WHERE p.order_id = t.order_id AND "
+                         "p.lineitem_id = t.lineitem_id AND p.creation_time_utc > '2024-05-01' AND "
+                         "p.creation_time_utc <= '2024-05-02')")
+    assert ji.window_predicate(ji.TABLE_CONFIGS["date_dim"], "a", "b", str) is None
+
+
+def test_partition_bounds_accept_numbers_dates_and_timestamps():
+    assert ji.partition_bound(Decimal("17")) == "17"
+    assert ji.partition_bound(date(2024, 5, 1)) == "2024-05-01"
+    assert ji.partition_bound(datetime(2024, 5, 1, 10, 0)) == "2024-05-01 10:00:00.000000"
+    assert ji.partition_bound("2024-05-01") == "2024-05-01"
+    with pytest.raises(TypeError):
+        ji.partition_bound(b"\x00")
+
+
+def test_partitioning_overrides_do_not_leak_into_the_defaults():
+    configs = ji.table_configs({"order_items": {"partition_column": "lineitem_id", "num_partitions": 8}})
+    assert configs["order_items"]["num_partitions"] == 8
+    assert ji.TABLE_CONFIGS["order_items"]["num_partitions"] == 4
+
+
+# --------------------------
+# Fingerprints
+# --------------------------
+class RecordingSource(ji.JdbcSource):
+    """JdbcSource that answers aggregate queries from a fixed row and keeps the SQL it was sent."""
+
+    def __init__(self, url, row):
+        super().__init__(None, url, {}, "dbo")
+        self.row = row
+        self.queries = []
+
+    def query_row(self, query):
+        self.queries.append(query)
+        return self.row
+
+
+class FakeFrame:
+    """DataFrame whose Parquet writes are accepted and dropped."""
+
+    @property
+    def write(self):
+        return self
+
+    def mode(self, mode):
+        return self
+
+    def parquet(self, path):
+        pass
+
+
+def test_fingerprints_carry_a_source_checksum():
+    source = RecordingSource("jdbc:postgresql://db:5432/gp", {"row_count": 3, "checksum": "1234567890"})
+    assert source.fingerprint("date_dim") == {"row_count": 3, "checksum": "1234567890"}
+    assert source.queries == [f"SELECT COUNT(*) AS row_count, {ji.CHECKSUM_EXPRESSIONS['postgresql']} AS checksum "
+                              f"FROM dbo.date_dim t"]
+
+
+def test_sources_without_a_checksum_are_always_reloaded(tmp_path):
+    # A row count alone would call a same-count update unchanged
+    source = RecordingSource("jdbc:sqlite:/tmp/gp.db", {"row_count": 1})
+    assert source.fingerprint("date_dim") is None
+    assert source.queries == []
+
+    read = []
+    source.read = lambda table_name, config, predicate: read.append(table_name) or FakeFrame()
+    previous = {"row_count": 1, "checksum": None}
+    assert ji.ingest_table(source, f"{tmp_path}/", "date_dim", ji.TABLE_CONFIGS["date_dim"], None, None,
+                           "2024-05-02", previous) == ("date_dim", None)
+    assert read == ["date_dim"]
+
+
+# --------------------------
+# Landing catalog
+# --------------------------
+class FakeGlue:
+    """The catalog calls LandingCatalog makes, on in-memory tables."""
+
+    class EntityNotFoundException(Exception):
+        pass
+
+    def __init__(self, tables=None):
+        self.exceptions = self
+        self.tables = dict(tables or {})
+        self.partitions = {name: {} for name in self.tables}
+
+    def get_table(self, DatabaseName, Name):
+        if Name not in self.tables:
+            raise self.EntityNotFoundException(Name)
+        # Read-only fields update_table rejects
+        return {"Table": dict(self.tables[Name], DatabaseName=DatabaseName, CreateTime="2024-01-01")}
+
+    def create_table(self, DatabaseName, TableInput):
+        self.tables[TableInput["Name"]] = TableInput
+        self.partitions[TableInput["Name"]] = {}
+
+    def update_table(self, DatabaseName, TableInput):
+        assert set(TableInput) <= set(ji.LandingCatalog.TABLE_INPUT_KEYS)
+        self.tables[TableInput["Name"]] = TableInput
+
+    def batch_create_partition(self, DatabaseName, TableName, PartitionInputList):
+        errors = []
+        for partition in PartitionInputList:
+            values = tuple(partition["Values"])
+            if values in self.partitions[TableName]:
+                errors.append({"PartitionValues": list(values), "ErrorDetail": {"ErrorCode": "AlreadyExistsException"}})
+            else:
+                self.partitions[TableName][values] = partition["StorageDescriptor"]["Location"]
+        return {"Errors": errors}
+
+    def get_paginator(self, operation):
+        assert operation == "get_partitions"
+        return self
+
+    def paginate(self, DatabaseName, TableName):
+        yield {"Partitions": [{"Values": list(values)} for values in self.partitions[TableName]]}
+
+    def batch_delete_partition(self, DatabaseName, TableName, PartitionsToDelete):
+        assert len(PartitionsToDelete) <= 25
+        for partition in PartitionsToDelete:
+            del self.partitions[TableName][tuple(partition["Values"])]
+
+
+COLUMNS = [("order_id", "string"), ("creation_time_utc", "string")]
+LOCATION = "s3://bucket/landing-zone/order_items/"
+
+
+def test_rebuild_switches_a_flat_landing_table_to_ingest_date_partitions():
+    flat = {"Name": "order_items", "TableType": "EXTERNAL_TABLE", "Parameters": {"classification": "parquet"},
+            "PartitionKeys": [], "StorageDescriptor": {"Columns": [{"Name": "order_id", "Type": "string"}],
+                                                       "Location": LOCATION, "SerdeInfo": {"Name": "crawler"}}}
+    glue = FakeGlue({"order_items": flat})
+    catalog = ji.LandingCatalog(glue, "landing_zone_db")
+
+    catalog.register("order_items", LOCATION, COLUMNS + [("ingest_date", "string")], "2024-05-01", rebuilt=True)
+    table = glue.tables["order_items"]
+    assert table["PartitionKeys"] == [{"Name": "ingest_date", "Type": "string"}]
+    assert [c["Name"] for c in table["StorageDescriptor"]["Columns"]] == ["order_id", "creation_time_utc"]
+    # Settings the crawler chose are kept
+    assert table["StorageDescriptor"]["SerdeInfo"] == {"Name": "crawler"}
+    assert glue.partitions["order_items"] == {("2024-05-01",): f"{LOCATION}ingest_date=2024-05-01/"}
+
+
+def test_later_batches_add_their_partition_once():
+    glue = FakeGlue()
+    catalog = ji.LandingCatalog(glue, "landing_zone_db")
+    catalog.register("order_items", LOCATION, COLUMNS, "2024-05-01", rebuilt=True)
+    catalog.register("order_items", LOCATION, COLUMNS, "2024-05-02", rebuilt=False)
+    # A second run on the same day appends files to a partition that is already registered
+    catalog.register("order_items", LOCATION, COLUMNS, "2024-05-02", rebuilt=False)
+    assert sorted(glue.partitions["order_items"]) == [("2024-05-01",), ("2024-05-02",)]
+
+    # A full reload replaces every file, so the old partitions go with them
+    catalog.register("order_items", LOCATION, COLUMNS, "2024-05-03", rebuilt=True)
+    assert list(glue.partitions["order_items"]) == [("2024-05-03",)]
+
+
+# --------------------------
+# Local JDBC stand-in
+# --------------------------
+ORDER_ITEMS = [
+    # order_id, lineitem_id, app_name, restaurant_id, user_id, creation_time_utc
+    ("o1", "l1", "web", "r1", "u1", "2024-05-01T10:00:00.000Z"),
+    ("o1", "l2", "web", "r1", "u1", "2024-05-01T10:00:00.000Z"),
+    ("o2", "l3", "ios", "r2", "u2", "2024-05-01T11:30:00.000Z"),
+]
+LATE_ORDER_ITEMS = [
+    ("o3", "l4", "ios", "r2", "u3", "2024-05-02T08:15:00.000Z"),
+]
+
+
+def create_source(path):
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE order_items (order_id TEXT, lineitem_id TEXT, app_name TEXT, "
+                   "restaurant_id TEXT, user_id TEXT, creation_time_utc TEXT)")
+        db.execute("CREATE TABLE order_item_options (order_id TEXT, lineitem_id TEXT, option_name TEXT)")
+        db.execute("CREATE TABLE date_dim (date_key TEXT, year TEXT)")
+        db.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?, ?, ?)", ORDER_ITEMS)
+        db.executemany("INSERT INTO order_item_options VALUES (?, ?, ?)", [("o1", "l1", "cheese"), ("o2", "l3", "ice")])
+        db.execute("INSERT INTO date_dim VALUES ('01-05-2024', '2024')")
+
+
+def landed_rows(spark, landing_path, table_name):
+    return spark.read.parquet(os.path.join(landing_path, table_name)).count()
+
+
+def catalog_rows(spark, glue, table_name):
+    """Rows of a landing table as a catalog read sees them: the registered partitions only."""
+    locations = list(glue.partitions[table_name].values())
+    return spark.read.option("basePath", glue.tables[table_name]["StorageDescriptor"]["Location"]).parquet(*locations)
+
+
+def test_incremental_runs_against_a_sqlite_source(spark, tmp_path):
+    db_path = tmp_path / "gp.db"
+    create_source(db_path)
+    source = ji.JdbcSource(spark, f"jdbc:sqlite:{db_path}", {"driver": "org.sqlite.JDBC"}, "main")
+    landing_path = f"{tmp_path}/landing/"
+    configs = ji.table_configs({})
+    glue = FakeGlue()
+    catalog = ji.LandingCatalog(glue, "landing_zone_db")
+
+    # First run: no watermark, every table is loaded whole
+    watermark, fingerprints = ji.ingest(source, landing_path, configs, None, {}, "2024-05-01", catalog=catalog)
+    assert watermark == "2024-05-01T11:30:00.000Z"
+    assert landed_rows(spark, landing_path, "order_items") == 3
+    assert landed_rows(spark, landing_path, "order_item_options") == 2
+    # SQLite has no checksum expression, so date_dim is reloaded on every run
+    assert "date_dim" not in fingerprints
+
+    # Nothing new: order tables are skipped
+    assert ji.ingest(source, landing_path, configs, watermark, fingerprints, "2024-05-02",
+                     catalog=catalog) == (watermark, fingerprints)
+
+    with sqlite3.connect(db_path) as db:
+        db.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?, ?, ?)", LATE_ORDER_ITEMS)
+        db.execute("INSERT INTO order_item_options VALUES ('o3', 'l4', 'extra shot')")
+
+    # Only the window past the watermark is appended, under its own ingest_date
+    last_lpt = watermark
+    watermark, _ = ji.ingest(source, landing_path, configs, json.loads(json.dumps(watermark)), fingerprints,
+                             "2024-05-02", catalog=catalog)
+    assert watermark == "2024-05-02T08:15:00.000Z"
+    assert landed_rows(spark, landing_path, "order_items") == 4
+    assert landed_rows(spark, landing_path, "order_item_options") == 3
+    assert os.path.isdir(os.path.join(landing_path, "order_items", "ingest_date=2024-05-02"))
+
+    # The second batch reaches the transformation, which reads landing through the catalog
+    assert sorted(glue.partitions["order_items"]) == [("2024-05-01",), ("2024-05-02",)]
+    order_items = spark_transforms.parse_order_items(catalog_rows(spark, glue, "order_items"))
+    new_items = spark_transforms.new_order_items(order_items, last_lpt.replace("T", " ").rstrip("Z"))
+    assert [row["order_id"] for row in new_items.collect()] == ["o3"]
+    new_options = spark_transforms.options_for_order_items(catalog_rows(spark, glue, "order_item_options"), new_items)
+    assert [row["option_name"] for row in new_options.collect()] == ["extra shot"]
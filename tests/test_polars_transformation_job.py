@@ -0,0 +1,397 @@
+import hashlib
+import io
+import json
+import os
+import runpy
+import sys
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+from pyarrow import fs
+
+import bench_transforms
+import parity
+import synthetic_data
+from conftest import REPO_ROOT
+
+# Runs data-transformation-polars-job on an incremental batch, against the local file system
+# in place of S3 and an in-memory Glue catalog, and checks the curated zone it leaves behind
+# against a full recompute of both batches and, where Spark can run, against spark_transforms.
+
+JOB_SCRIPT = os.path.join(REPO_ROOT, "glue_jobs", "data_transformation", "data-transformation-polars-job.py")
+SIZING_PROFILES = os.path.join(REPO_ROOT, "glue_jobs", "glue_job_configs", "sizing_profiles.json")
+BUCKET = "global-partners-de-project2"
+RUN_ID = "run2"
+
+SCALE = synthetic_data.Scale(users=60, restaurants=4, apps=3, days=6, orders_per_day=25, items_per_order=3,
+                             options_per_item=2, start_date="2024-01-29")
+# The first three days were processed by an earlier run; the next three are the batch
+FIRST_BATCH_ORDERS = 3 * SCALE.orders_per_day
+# Orders of the earlier run landed again with the batch, as an ingestion retry would
+RELANDED_ORDERS = 5
+NEW_APP = "App New"
+
+HIVE_TYPES = {pa.string(): "string", pa.large_string(): "string", pa.int32(): "int", pa.int64(): "bigint",
+              pa.float32(): "float", pa.float64(): "double", pa.bool_(): "boolean", pa.date32(): "date",
+              pa.timestamp("us"): "timestamp"}
+
+
+# --------------------------
+# Stand-ins for S3 and the Glue catalog
+# --------------------------
+class FakeS3:
+    """S3 client over a local directory: s3://bucket/key is root/bucket/key."""
+
+    class NoSuchKey(Exception):
+        pass
+
+    def __init__(self, root):
+        self.root = root
+        self.exceptions = self
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def get_object(self, Bucket, Key):
+        if not os.path.isfile(self._path(Bucket, Key)):
+            raise self.NoSuchKey(Key)
+        with open(self._path(Bucket, Key), "rb") as f:
+            return {"Body": io.BytesIO(f.read())}
+
+    def put_object(self, Bucket, Key, Body):
+        os.makedirs(os.path.dirname(self._path(Bucket, Key)), exist_ok=True)
+        with open(self._path(Bucket, Key), "wb") as f:
+            f.write(Body.encode() if isinstance(Body, str) else Body)
+
+    def delete_object(self, Bucket, Key):
+        os.remove(self._path(Bucket, Key))
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.delete_object(Bucket, obj["Key"])
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        contents = []
+        for directory, _, files in os.walk(os.path.join(self.root, Bucket)):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                key = os.path.relpath(path, os.path.join(self.root, Bucket)).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    with open(path, "rb") as f:
+                        etag = hashlib.md5(f.read()).hexdigest()
+                    contents.append({"Key": key, "Size": os.path.getsize(path), "ETag": etag,
+                                     "LastModified": datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)})
+        yield {"Contents": sorted(contents, key=lambda obj: obj["Key"])}
+
+
+class FakeGlue:
+    """The catalog calls the job makes, for tables created with add_table."""
+
+    def __init__(self):
+        self.tables = {}
+        self.partitions = {}
+        self.job_runs = []
+
+    def add_table(self, table_name, schema, partition_keys):
+        self.tables[table_name] = {
+            "Name": table_name,
+            "PartitionKeys": [{"Name": k, "Type": HIVE_TYPES[schema.field(k).type]} for k in partition_keys],
+            "StorageDescriptor": {
+                "Columns": [{"Name": f.name, "Type": HIVE_TYPES[f.type]} for f in schema if f.name not in partition_keys],
+                "Location": f"s3://{BUCKET}/curated/{table_name}/",
+            },
+        }
+        self.partitions[table_name] = {}
+
+    def get_table(self, DatabaseName, Name):
+        return {"Table": self.tables[Name]}
+
+    def batch_create_partition(self, DatabaseName, TableName, PartitionInputList):
+        errors = []
+        for partition in PartitionInputList:
+            values = tuple(partition["Values"])
+            if values in self.partitions[TableName]:
+                errors.append({"PartitionValues": list(values), "ErrorDetail": {"ErrorCode": "AlreadyExistsException"}})
+            else:
+                self.partitions[TableName][values] = partition["StorageDescriptor"]["Location"]
+        return {"Errors": errors}
+
+    def batch_get_partition(self, DatabaseName, TableName, PartitionsToGet):
+        found = [tuple(p["Values"]) for p in PartitionsToGet if tuple(p["Values"]) in self.partitions[TableName]]
+        return {"Partitions": [{"Values": list(values),
+                                "StorageDescriptor": {"Location": self.partitions[TableName][values]}}
+                               for values in found]}
+
+    def start_job_run(self, JobName, **run_settings):
+        self.job_runs.append({"JobName": JobName, **run_settings})
+        return {"JobRunId": f"jr_{len(self.job_runs)}"}
+
+
+# --------------------------
+# Landing and curated state before the run
+# --------------------------
+def split_batches(tables):
+    """Landing tables of the earlier run, of the batch as landed and of the batch without the re-landed rows."""
+    items, options = tables["order_items"], tables["order_item_options"]
+    first = pc.less(items.column("order_id"), FIRST_BATCH_ORDERS)
+    # A few batch orders come from an app that has no id yet
+    new_app = pc.and_(pc.invert(first), pc.equal(pc.bit_wise_and(items.column("order_id"), 7), 0))
+    items = items.set_column(items.schema.get_field_index("app_name"), "app_name",
+                             pc.if_else(new_app, NEW_APP, items.column("app_name")))
+
+    # The first batch order lands 1 ms after the checkpoint the earlier run wrote
+    last_landed = datetime.strptime(pc.max(items.filter(first).column("creation_time_utc")).as_py(),
+                                    "%Y-%m-%dT%H:%M:%S.%fZ")
+    boundary = (last_landed + timedelta(milliseconds=1)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    at_boundary = pc.equal(items.column("order_id"), FIRST_BATCH_ORDERS)
+    items = items.set_column(items.schema.get_field_index("creation_time_utc"), "creation_time_utc",
+                             pc.if_else(at_boundary, boundary, items.column("creation_time_utc")))
+
+    first_items = items.filter(first)
+    batch_items = items.filter(pc.invert(first))
+    relanded = pc.greater_equal(first_items.column("order_id"), FIRST_BATCH_ORDERS - RELANDED_ORDERS)
+
+    def options_of(item_table):
+        return options.filter(pc.is_in(options.column("lineitem_id"), item_table.column("lineitem_id")))
+
+    landed_items = pa.concat_tables([first_items.filter(relanded), batch_items])
+    return (
+        {"order_items": first_items, "order_item_options": options_of(first_items)},
+        {"order_items": landed_items, "order_item_options": options_of(landed_items)},
+        {"order_items": batch_items, "order_item_options": options_of(batch_items)},
+    )
+
+
+def write_landing(root, table_name, table, ingest_date=None):
+    directory = os.path.join(root, BUCKET, "landing-zone", table_name)
+    if ingest_date:
+        directory = os.path.join(directory, f"ingest_date={ingest_date}")
+    os.makedirs(directory, exist_ok=True)
+    pq.write_table(table, os.path.join(directory, "part-00000.parquet"))
+
+
+def seed_curated(root, glue, tables):
+    """Curated zone and catalog as a run over tables would have left them."""
+    for table_name, df in tables.items():
+        partition_keys = bench_transforms.CURATED_TABLES[table_name]
+        table = df.to_arrow(compat_level=pl.CompatLevel.oldest())
+        directory = os.path.join(root, BUCKET, "curated", table_name)
+        if partition_keys:
+            ds.write_dataset(table, directory, format="parquet", basename_template="seed-{i}.parquet",
+                             partitioning=ds.partitioning(table.select(partition_keys).schema, flavor="hive"))
+            glue.add_table(table_name, table.schema, partition_keys)
+            for row in df.select(partition_keys).unique().rows():
+                values = tuple(str(v) for v in row)
+                spec = "/".join(f"{k}={v}" for k, v in zip(partition_keys, values))
+                glue.partitions[table_name][values] = f"s3://{BUCKET}/curated/{table_name}/{spec}/"
+        else:
+            os.makedirs(directory, exist_ok=True)
+            pq.write_table(table, os.path.join(directory, "seed.parquet"))
+            glue.add_table(table_name, table.schema, [])
+
+
+def run_job(root, s3, glue, monkeypatch):
+    """Run the job script against the stand-ins and return its globals."""
+    monkeypatch.setattr(boto3, "client", lambda service, *args, **kwargs: {"s3": s3, "glue": glue}.get(service))
+    monkeypatch.setattr(fs, "S3FileSystem", lambda **kwargs: fs.SubTreeFileSystem(root, fs.LocalFileSystem()))
+    monkeypatch.setattr(sys, "argv", [JOB_SCRIPT, "--JOB_RUN_ID", RUN_ID, "--SIZING_PROFILES", SIZING_PROFILES])
+    # Imported by the first run and kept in sys.modules; point it at this test's stand-ins
+    if "glue_job_sizing" in sys.modules:
+        monkeypatch.setattr(sys.modules["glue_job_sizing"], "s3", s3)
+        monkeypatch.setattr(sys.modules["glue_job_sizing"], "glue", glue)
+    return runpy.run_path(JOB_SCRIPT, run_name="__main__")
+
+
+def stage_incremental(tmp_path):
+    """Landing, curated zone and checkpoints of an earlier run, with the next batch landed."""
+    root = str(tmp_path / "s3")
+    tables = synthetic_data.generate(SCALE, seed=7)
+    first, landed, batch = split_batches(tables)
+
+    # What the earlier run processed, transformed by polars_transforms as a first run would
+    first_landing = str(tmp_path / "first-landing")
+    synthetic_data.write_landing({"date_dim": tables["date_dim"], **first}, first_landing)
+    seeded = parity.polars_tables(first_landing)
+    last_lpt = str(seeded["fact_orders"].get_column("creation_time_utc").max())
+
+    # Both batches landed once each, the reference for the curated zone after the run
+    expected_landing = str(tmp_path / "expected-landing")
+    synthetic_data.write_landing({"date_dim": tables["date_dim"], **{
+        name: pa.concat_tables([first[name], batch[name]]) for name in first}}, expected_landing)
+
+    s3, glue = FakeS3(root), FakeGlue()
+    write_landing(root, "date_dim", tables["date_dim"])
+    for table_name in ("order_items", "order_item_options"):
+        write_landing(root, table_name, first[table_name], "2024-02-01")
+        write_landing(root, table_name, landed[table_name], "2024-02-04")
+    seed_curated(root, glue, seeded)
+    s3.put_object(Bucket=BUCKET, Key="checkpoints/fact_orders_lpt.json",
+                  Body=f'{{"last_processed_timestamp": "{last_lpt}"}}')
+    # Fingerprints of some earlier landing state: not a first run, and every landing table changed
+    s3.put_object(Bucket=BUCKET, Key="checkpoints/transformation_fingerprints.json", Body='{"order_items": {}}')
+    return {"root": root, "glue": glue, "s3": s3, "last_lpt": last_lpt, "landed": landed,
+            "expected": parity.polars_tables(expected_landing), "seeded": seeded}
+
+
+@pytest.fixture
+def incremental_run(tmp_path, monkeypatch):
+    run = stage_incremental(tmp_path)
+    run["job"] = run_job(run["root"], run["s3"], run["glue"], monkeypatch)
+    return run
+
+
+def curated_dir(run):
+    return os.path.join(run["root"], BUCKET, "curated")
+
+
+def run_files(run, table_name):
+    """Files the run wrote for a table, relative to the table directory."""
+    table_dir = os.path.join(curated_dir(run), table_name)
+    return sorted(os.path.relpath(os.path.join(d, f), table_dir)
+                  for d, _, files in os.walk(table_dir) for f in files if f.startswith(RUN_ID))
+
+
+# --------------------------
+# Polars engine
+# --------------------------
+def test_incremental_batch_matches_a_full_recompute(incremental_run):
+    run = incremental_run
+    assert run["glue"].job_runs == [], "a small incremental batch stays on Polars"
+
+    for table_name, expected_df in run["expected"].items():
+        problems = parity.differences(parity.read_curated(curated_dir(run), table_name), expected_df)
+        assert problems == [], f"{table_name}: {problems}"
+
+    checkpoint = run["s3"].get_object(Bucket=BUCKET, Key="checkpoints/fact_orders_lpt.json")["Body"].read()
+    assert str(run["expected"]["fact_orders"].get_column("creation_time_utc").max()) in checkpoint.decode()
+
+
+def test_rows_up_to_the_checkpoint_are_not_processed_again(incremental_run):
+    run = incremental_run
+    batch_orders = parity.read_curated(curated_dir(run), "fact_orders", run_files(run, "fact_orders"))
+    relanded_ids = set(range(FIRST_BATCH_ORDERS - RELANDED_ORDERS, FIRST_BATCH_ORDERS))
+
+    assert relanded_ids <= set(run["landed"]["order_items"].column("order_id").to_pylist())
+    assert batch_orders.get_column("order_id").min() == FIRST_BATCH_ORDERS
+    assert batch_orders.get_column("creation_time_utc").min() > datetime.fromisoformat(run["last_lpt"])
+
+
+def test_string_pushdown_keeps_the_order_1ms_after_the_checkpoint(incremental_run):
+    run = incremental_run
+    new_order_item_df = run["job"]["new_order_item_df"]
+    boundary_items = new_order_item_df.filter(pl.col("order_id") == FIRST_BATCH_ORDERS)
+
+    assert boundary_items.height > 0
+    assert boundary_items.get_column("creation_time_utc").min() == (datetime.fromisoformat(run["last_lpt"])
+                                                                    + timedelta(milliseconds=1))
+    assert new_order_item_df.height == run["expected"]["fact_items"].height - run["seeded"]["fact_items"].height
+
+
+def test_new_app_names_are_appended_to_dim_app(incremental_run):
+    run = incremental_run
+    seeded_ids = run["seeded"]["dim_app"].height
+    appended = pl.read_parquet(os.path.join(curated_dir(run), "dim_app", f"{RUN_ID}.parquet"))
+
+    assert appended.rows() == [(seeded_ids + 1, NEW_APP)]
+    assert os.path.isfile(os.path.join(curated_dir(run), "dim_app", "seed.parquet"))
+
+
+def test_dim_app_ids_shared_by_several_apps_stop_the_run(tmp_path, monkeypatch):
+    run = stage_incremental(tmp_path)
+    # An id the baseline's per-batch numbering issued again, to another app
+    pq.write_table(pa.table({"app_id": pa.array([1], pa.int32()), "app_name": ["App Reused"]}),
+                   os.path.join(curated_dir(run), "dim_app", "baseline.parquet"))
+
+    with pytest.raises(RuntimeError, match=r"dim_app ids \[1\] belong to more than one app_name"):
+        run_job(run["root"], run["s3"], run["glue"], monkeypatch)
+    assert run_files(run, "fact_orders") == []
+
+
+def test_written_partitions_are_registered_in_the_catalog(incremental_run):
+    run = incremental_run
+    batch_days = {(str(d.year), str(d.month), str(d.day))
+                  for d in run["expected"]["fact_orders"].get_column("order_date").unique().to_list()
+                  if d >= datetime.fromisoformat(run["last_lpt"]).date()}
+
+    for table_name in ("fact_orders", "fact_items", "fact_items_options", "fact_order_totals", "agg_revenue_daily"):
+        registered = run["glue"].partitions[table_name]
+        assert batch_days <= set(registered), table_name
+        for year, month, day in batch_days:
+            assert registered[(year, month, day)] == f"s3://{BUCKET}/curated/{table_name}/year={year}/month={month}/day={day}/"
+        # Every file the run wrote is in a registered partition
+        for path in run_files(run, table_name):
+            assert tuple(part.split("=")[1] for part in os.path.dirname(path).split(os.sep)) in registered
+
+    assert ("2024-01-29",) in run["glue"].partitions["agg_revenue_weekly"]
+    assert ("2024-02-01",) in run["glue"].partitions["agg_revenue_monthly"]
+
+
+def test_reading_no_partitions_returns_an_empty_frame_with_the_catalog_types(incremental_run):
+    read_partitions = incremental_run["job"]["read_partitions"]
+    df = read_partitions("fact_items_options", ["year", "month", "day"], [(1999, 1, 1)],
+                         ["order_id", "option_price", "option_total"])
+
+    assert df.height == 0
+    assert df.schema == pl.Schema({"order_id": pl.Int64, "option_price": pl.Float32, "option_total": pl.Float32,
+                                   "year": pl.Int32, "month": pl.Int32, "day": pl.Int32})
+
+
+def test_first_run_is_dispatched_to_a_sized_spark_run(tmp_path, monkeypatch):
+    root = str(tmp_path / "s3")
+    tables = synthetic_data.generate(SCALE, seed=7)
+    for table_name, table in tables.items():
+        write_landing(root, table_name, table, None if table_name == "date_dim" else "2024-02-04")
+    s3, glue = FakeS3(root), FakeGlue()
+
+    with pytest.raises(SystemExit) as exit_info:
+        run_job(root, s3, glue, monkeypatch)
+
+    assert exit_info.value.code == 0
+    [job_run] = glue.job_runs
+    with open(SIZING_PROFILES) as f:
+        smallest = json.load(f)["data-transformation-job"]["profiles"][0]
+    assert job_run["JobName"] == "data-transformation-job"
+    assert (job_run["WorkerType"], job_run["NumberOfWorkers"]) == (smallest["WorkerType"], smallest["NumberOfWorkers"])
+    assert json.loads(job_run["Arguments"]["--SPARK_CONF"]) == smallest["spark_conf"]
+    assert os.listdir(os.path.join(root, BUCKET, "sizing-decisions", "data-transformation-job"))
+
+
+# --------------------------
+# Spark engine on the same batch
+# --------------------------
+def test_spark_transforms_produce_the_same_batch(incremental_run, spark, tmp_path):
+    import spark_transforms as st
+
+    run = incremental_run
+    landing = os.path.join(run["root"], BUCKET, "landing-zone")
+    order_item_df = st.new_order_items(st.parse_order_items(spark.read.parquet(f"{landing}/order_items")),
+                                       run["last_lpt"]).cache()
+    order_item_options_df = st.options_for_order_items(spark.read.parquet(f"{landing}/order_item_options"),
+                                                       order_item_df)
+    existing_dim_app_df = st.dedupe_dim_app(spark.read.parquet(os.path.join(curated_dir(run), "dim_app", "seed.parquet")))
+    max_app_id = existing_dim_app_df.agg({"app_id": "max"}).collect()[0][0]
+    new_dim_app_df = st.number_new_apps(spark, st.unseen_app_names(order_item_df, existing_dim_app_df), max_app_id)
+
+    spark_dir = str(tmp_path / "spark-curated")
+    spark_batch = {
+        "dim_app": new_dim_app_df,
+        "fact_orders": st.build_fact_orders(order_item_df, existing_dim_app_df.unionByName(new_dim_app_df)),
+        "fact_items": st.build_fact_items(order_item_df),
+        "fact_items_options": st.build_fact_item_options(order_item_options_df),
+    }
+    for table_name, df in spark_batch.items():
+        bench_transforms.write(df, spark_dir, table_name)
+        polars_df = parity.read_curated(curated_dir(run), table_name, run_files(run, table_name))
+        problems = parity.differences(parity.read_curated(spark_dir, table_name), polars_df)
+        assert problems == [], f"{table_name}: {problems}"
+    order_item_df.unpersist()
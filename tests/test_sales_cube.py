@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from sales_cube import ALL, SalesCube
+
+
+def sales_trend(restaurant_ids):
+    return pd.DataFrame({
+        "period_type": ["Daily"] * 5,
+        "period_start": pd.to_datetime(["2024-01-01"] * 5),
+        "restaurant_id": restaurant_ids,
+        "item_category": pd.Series(["Sides", "Pizza", "Drinks", "Pizza", "Pizza"], dtype="category"),
+        "revenue": [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+
+@pytest.mark.parametrize("restaurant_ids", [
+    [100, 2, 10, 1, 2],
+    # As data_access loads them: a dictionary-encoded category of strings
+    pd.Series(["100", "2", "10", "1", "2"], dtype="category"),
+])
+def test_filter_lists_sort_restaurant_ids_as_numbers(restaurant_ids):
+    cube = SalesCube(sales_trend(restaurant_ids))
+
+    assert cube.restaurants == ["1", "2", "10", "100"]
+    assert cube.categories == ["Drinks", "Pizza", "Sides"]
+    # The lists are the keys the cube answers selections with
+    assert cube.total_revenue("Daily", "10") == 3.0
+    assert cube.total_revenue("Daily", "2", "Pizza") == 7.0
+    assert cube.total_revenue("Daily", ALL, "Pizza") == 11.0